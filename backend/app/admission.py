@@ -0,0 +1,200 @@
+"""Admission control: per-route-group concurrency limits with load shedding.
+
+Requests are classified into groups (``auth``, ``read``, ``write``). Each
+group admits up to ``limit`` requests at a time and parks the rest in a
+bounded FIFO queue. A request is rejected immediately with ``503`` and a
+``Retry-After`` header when the queue is full or when its expected wait
+(queue position times the group's average service time) would exceed the
+queue deadline; a queued request that is still waiting at the deadline is
+shed the same way. Because every group has its own slots, a storm of
+bcrypt-bound logins cannot starve ``GET /posts/``.
+"""
+
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import structlog
+
+from .config import Settings
+from .utils import format_error
+
+log = structlog.get_logger()
+
+AUTH_PATH_PREFIXES: Tuple[str, ...] = ("/login", "/signup", "/refresh", "/logout", "/auth/", "/mfa/")
+# The live feed holds its connection open, so it must not occupy a read slot;
+# health probes must answer even when the worker is saturated.
+EXEMPT_PATH_PREFIXES: Tuple[str, ...] = (
+    "/metrics", "/docs", "/redoc", "/openapi.json", "/feed/", "/livez", "/readyz",
+)
+READ_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+class AdmissionGroup:
+    """Concurrency limit plus bounded wait queue for one group of routes."""
+
+    def __init__(self, name: str, limit: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.limit = limit
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = 0
+        # Exponentially weighted average of request service time (seconds).
+        self.avg_service_time = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._waiters)
+
+    def expected_wait(self, position: Optional[int] = None) -> float:
+        """Estimated seconds until a request at ``position`` gets a slot."""
+        if position is None:
+            position = len(self._waiters) + 1
+        return position / max(self.limit, 1) * self.avg_service_time
+
+    async def acquire(self) -> bool:
+        """Wait for a slot; return ``False`` if the request should be shed."""
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+        if len(self._waiters) >= self.queue_size or self.expected_wait() > self.queue_timeout:
+            self.shed += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except asyncio.TimeoutError:
+            # A slot handed over just as the deadline passed is passed on
+            # (Python 3.12+ ``wait_for`` can time out a completed future).
+            self._discard(waiter)
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            self.shed += 1
+            return False
+        except BaseException:
+            # Client went away while queued; hand back a slot we may have
+            # been given at the same moment.
+            self._discard(waiter)
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        self.admitted += 1
+        return True
+
+    def release(self, service_time: Optional[float] = None) -> None:
+        """Free a slot, passing it directly to the oldest live waiter."""
+        if service_time is not None:
+            if self.avg_service_time:
+                self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * service_time
+            else:
+                self.avg_service_time = service_time
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def retry_after(self) -> int:
+        """Seconds a shed client should wait before retrying."""
+        return max(1, math.ceil(max(self.expected_wait(), self.queue_timeout)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "queue_size": self.queue_size,
+            "admitted": self.admitted,
+            "shed": self.shed,
+            "avg_service_ms": round(self.avg_service_time * 1000, 3),
+        }
+
+
+class AdmissionController:
+    """Maps requests to their :class:`AdmissionGroup`."""
+
+    def __init__(self, groups: Dict[str, AdmissionGroup]):
+        self.groups = groups
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "AdmissionController":
+        size = settings.ADMISSION_QUEUE_SIZE
+        timeout = settings.ADMISSION_QUEUE_TIMEOUT
+        return cls(
+            {
+                "auth": AdmissionGroup("auth", settings.ADMISSION_AUTH_CONCURRENCY, size, timeout),
+                "read": AdmissionGroup("read", settings.ADMISSION_READ_CONCURRENCY, size, timeout),
+                "write": AdmissionGroup("write", settings.ADMISSION_WRITE_CONCURRENCY, size, timeout),
+            }
+        )
+
+    def classify(self, method: str, path: str) -> Optional[AdmissionGroup]:
+        if path.startswith(EXEMPT_PATH_PREFIXES):
+            return None
+        if path.startswith(AUTH_PATH_PREFIXES):
+            return self.groups["auth"]
+        if method in READ_METHODS:
+            return self.groups["read"]
+        return self.groups["write"]
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: group.stats() for name, group in self.groups.items()}
+
+
+class AdmissionControlMiddleware:
+    """ASGI middleware applying an :class:`AdmissionController`."""
+
+    def __init__(self, app: Any, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        group = self.controller.classify(scope["method"], scope["path"])
+        if group is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not await group.acquire():
+            log.warning("Request shed", group=group.name, path=scope["path"])
+            await self._reject(send, group.retry_after())
+            return
+        started = time.monotonic()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            group.release(time.monotonic() - started)
+
+    @staticmethod
+    async def _reject(send, retry_after: int) -> None:
+        body = json.dumps(format_error("Server is overloaded, retry later")).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(retry_after).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,234 @@
+"""Archival of old posts into compressed cold storage.
+
+``python -m app.archive run`` moves posts whose ``created_at`` is older than
+``ARCHIVE_AFTER_DAYS`` from ``posts`` into ``post_archive`` in batches of
+``ARCHIVE_BATCH_SIZE``. Each archive row keeps the id, owner and timestamps
+as columns and title plus content as one zlib-compressed JSON document, so
+the hot table and its indexes only hold recent posts. Every batch is copied
+and deleted in one transaction on the database holding the posts (the
+primary one, or each shard), so an interrupted run loses nothing and a
+re-run continues with the next batch. Posts that have attachments stay hot.
+
+Reads go through transparently: ``crud.get_post`` and ``crud.get_post_row``
+fall back to the archive when the id is not in ``posts``, so
+``GET /posts/{post_id}`` still answers for archived posts. Listings
+(``GET /posts/``) only cover hot posts. Adding an attachment to an archived
+post restores it first; deleting it removes the archive row.
+
+The run prints the bytes saved by compression and the hot-table row count,
+size (PostgreSQL only) and query latency before and after, see
+:func:`hot_table_report`.
+"""
+
+import argparse
+import json
+import statistics
+import time
+import zlib
+from collections import namedtuple
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import structlog
+from sqlalchemy import delete, exists, func, insert, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import models
+
+log = structlog.get_logger()
+
+COMPRESSION_LEVEL = 6
+
+# Same fields, in the same order, as the rows of ``crud.get_post_row``.
+ArchivedPost = namedtuple("ArchivedPost", "id title content owner_id")
+
+_posts = models.Post.__table__
+_archive = models.PostArchive.__table__
+_attachments = models.Attachment.__table__
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def pack(title: str, content: str) -> bytes:
+    document = json.dumps({"title": title, "content": content}, separators=(",", ":"))
+    return zlib.compress(document.encode(), COMPRESSION_LEVEL)
+
+
+def unpack(payload: bytes) -> Dict[str, str]:
+    return json.loads(zlib.decompress(payload))
+
+
+def archived_rows(db: Session, post_ids: List[int]) -> Dict[int, ArchivedPost]:
+    rows = db.execute(
+        select(_archive.c.id, _archive.c.owner_id, _archive.c.payload).where(_archive.c.id.in_(post_ids))
+    )
+    return {
+        row.id: ArchivedPost(row.id, document["title"], document["content"], row.owner_id)
+        for row in rows
+        for document in (unpack(row.payload),)
+    }
+
+
+def archived_post(db: Session, post_id: int) -> Optional[models.Post]:
+    """The archived post as a transient ``Post``, not attached to ``db``."""
+    row = db.execute(select(_archive).where(_archive.c.id == post_id)).first()
+    if row is None:
+        return None
+    return models.Post(id=row.id, owner_id=row.owner_id, created_at=row.created_at, **unpack(row.payload))
+
+
+def restore_post(db: Session, post_id: int) -> bool:
+    """Move an archived post back into ``posts``; the caller commits."""
+    row = db.execute(select(_archive).where(_archive.c.id == post_id)).first()
+    if row is None:
+        return False
+    if db.execute(select(_posts.c.id).where(_posts.c.id == post_id)).first() is not None:
+        # Already hot (a move interrupted mid-way); the hot row wins.
+        return False
+    db.execute(
+        insert(_posts).values(id=row.id, owner_id=row.owner_id, created_at=row.created_at, **unpack(row.payload))
+    )
+    db.execute(delete(_archive).where(_archive.c.id == post_id))
+    return True
+
+
+@dataclass
+class ArchiveResult:
+    archived: int = 0
+    batches: int = 0
+    raw_bytes: int = 0
+    stored_bytes: int = 0
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.raw_bytes - self.stored_bytes
+
+
+def archive_batch(engine: Engine, cutoff: datetime, batch_size: int, result: ArchiveResult) -> int:
+    """Archive up to ``batch_size`` posts created before ``cutoff``; return how many."""
+    query = (
+        select(_posts.c.id, _posts.c.title, _posts.c.content, _posts.c.owner_id, _posts.c.created_at)
+        .where(_posts.c.created_at < cutoff)
+        .where(~exists().where(_attachments.c.post_id == _posts.c.id))
+        .order_by(_posts.c.id)
+        .limit(batch_size)
+        # Lock the batch so a concurrent delete or attachment upload waits
+        # for (or skips) it; SQLite ignores this and serializes writers anyway.
+        .with_for_update(skip_locked=True)
+    )
+    archived_at = _utcnow()
+    with engine.begin() as conn:
+        rows = conn.execute(query).all()
+        if not rows:
+            return 0
+        archive_rows: List[Dict[str, Any]] = []
+        for row in rows:
+            payload = pack(row.title, row.content)
+            result.raw_bytes += len(row.title.encode()) + len(row.content.encode())
+            result.stored_bytes += len(payload)
+            archive_rows.append(
+                {
+                    "id": row.id,
+                    "owner_id": row.owner_id,
+                    "created_at": row.created_at,
+                    "archived_at": archived_at,
+                    "payload": payload,
+                }
+            )
+        conn.execute(insert(_archive), archive_rows)
+        conn.execute(delete(_posts).where(_posts.c.id.in_([row.id for row in rows])))
+    result.archived += len(rows)
+    result.batches += 1
+    log.info("Archived post batch", rows=len(rows), last_id=rows[-1].id)
+    return len(rows)
+
+
+def archive_posts(
+    engine: Engine, cutoff: datetime, batch_size: int = 500, limit: Optional[int] = None
+) -> ArchiveResult:
+    """Archive every eligible post on ``engine``, ``batch_size`` rows per transaction."""
+    result = ArchiveResult()
+    while limit is None or result.archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - result.archived)
+        if archive_batch(engine, cutoff, size, result) < size:
+            break
+    return result
+
+
+def _median_ms(engine: Engine, statement, rounds: int) -> float:
+    timings = []
+    with engine.connect() as conn:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            conn.execute(statement).all()
+            timings.append(time.perf_counter() - started)
+    return round(statistics.median(timings) * 1000, 3)
+
+
+def hot_table_report(engine: Engine, rounds: int = 5) -> Dict[str, Any]:
+    """Row count, on-disk size and query latency of the hot ``posts`` table."""
+    with engine.connect() as conn:
+        rows = conn.execute(select(func.count()).select_from(_posts)).scalar()
+        size = None
+        if engine.dialect.name == "postgresql":
+            size = conn.execute(text("SELECT pg_total_relation_size('posts')")).scalar()
+    page = select(_posts.c.id, _posts.c.title, _posts.c.content, _posts.c.owner_id).order_by(_posts.c.id)
+    return {
+        "rows": rows,
+        "bytes": size,
+        "count_ms": _median_ms(engine, select(func.count()).select_from(_posts), rounds),
+        # The last page of GET /posts/: the offset walks the whole table.
+        "last_page_ms": _median_ms(engine, page.offset(max(rows - 100, 0)).limit(100), rounds),
+    }
+
+
+def _engines() -> List[Engine]:
+    from . import database
+
+    if database.post_shards is not None:
+        return list(database.post_shards.engines)
+    return [database.engine]
+
+
+def _print_report(label: str, report: Dict[str, Any]) -> None:
+    size = f"{report['bytes']} bytes" if report["bytes"] is not None else "size n/a"
+    print(f"  {label}: {report['rows']} rows, {size}, count {report['count_ms']} ms, last page {report['last_page_ms']} ms")
+
+
+def main(argv: Optional[list] = None) -> None:
+    from .config import get_settings
+
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Post archival")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="move old posts into the archive")
+    run.add_argument("--older-than-days", type=float, default=settings.ARCHIVE_AFTER_DAYS)
+    run.add_argument("--batch-size", type=int, default=settings.ARCHIVE_BATCH_SIZE)
+    run.add_argument("--limit", type=int, default=None, help="stop after this many posts per database")
+    sub.add_parser("report", help="show hot table size and latency")
+    args = parser.parse_args(argv)
+
+    for index, engine in enumerate(_engines()):
+        print(f"database {index}:")
+        before = hot_table_report(engine)
+        _print_report("hot table", before)
+        if args.command == "report":
+            continue
+        cutoff = _utcnow() - timedelta(days=args.older_than_days)
+        result = archive_posts(engine, cutoff, args.batch_size, args.limit)
+        ratio = result.stored_bytes / result.raw_bytes if result.raw_bytes else 1.0
+        print(
+            f"  archived {result.archived} posts in {result.batches} batches: "
+            f"{result.raw_bytes} -> {result.stored_bytes} bytes ({ratio:.0%}), saved {result.saved_bytes}"
+        )
+        _print_report("hot table after", hot_table_report(engine))
+        if engine.dialect.name == "postgresql":
+            print("  run VACUUM (or wait for autovacuum) so the freed space is reused")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""HTTP helpers for serving attachment blobs.
+
+Full downloads use Starlette's ``FileResponse``, which hands the path to
+the server (``http.response.pathsend``) when it supports zero-copy sends.
+Starlette 0.37 has no Range support, so single byte ranges are served here
+with ``206 Partial Content``; multi-range requests get the full body, which
+RFC 9110 allows. The blob's SHA-256 is the strong ``ETag``, which also makes
+``If-None-Match`` and ``If-Range`` cheap to evaluate.
+
+Every response is sent as a download (``Content-Disposition: attachment``)
+with ``X-Content-Type-Options: nosniff``: the content type is whatever the
+uploader declared, so it must never be rendered inline on the API origin.
+"""
+
+import os
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+from urllib.parse import quote
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Return an inclusive ``(start, end)`` for a single byte range.
+
+    Returns ``None`` when the header is absent, malformed or asks for several
+    ranges (the caller then sends the whole file) and raises ``ValueError``
+    when the range cannot be satisfied.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, sep, end_text = header[len("bytes="):].strip().partition("-")
+    if not sep or not all(part == "" or part.isdigit() for part in (start_text, end_text)):
+        return None
+    if start_text == "":
+        if end_text == "":
+            return None
+        # Suffix range: the last N bytes.
+        length = int(end_text)
+        if length == 0 or size == 0:
+            raise ValueError("unsatisfiable range")
+        return max(size - length, 0), size - 1
+    start = int(start_text)
+    end = int(end_text) if end_text else size - 1
+    if end_text and end < start:
+        return None
+    if start >= size:
+        raise ValueError("unsatisfiable range")
+    return start, min(end, size - 1)
+
+
+def content_disposition(filename: str) -> str:
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"attachment; filename*=utf-8''{quoted}"
+    return f'attachment; filename="{filename}"'
+
+
+def _read_range(path: Path, start: int, end: int) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def attachment_response(
+    request: Request, path: Path, *, sha256: str, media_type: str, filename: str
+) -> Response:
+    """Serve a blob with ETag, conditional request and Range support."""
+    etag = f'"{sha256}"'
+    headers = {
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=31536000, immutable",
+        "Content-Disposition": content_disposition(filename),
+        "X-Content-Type-Options": "nosniff",
+    }
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    size = os.stat(path).st_size
+    if_range = request.headers.get("if-range")
+    try:
+        byte_range = parse_range(request.headers.get("range"), size)
+    except ValueError:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None or (if_range is not None and if_range != etag):
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    start, end = byte_range
+    headers.update(
+        {
+            "Content-Range": f"bytes {start}-{end}/{size}",
+            "Content-Length": str(end - start + 1),
+        }
+    )
+    return StreamingResponse(
+        _read_range(path, start, end), status_code=206, media_type=media_type, headers=headers
+    )
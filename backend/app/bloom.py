@@ -0,0 +1,58 @@
+"""A compact Bloom filter for set-membership pre-checks.
+
+``might_contain`` never returns ``False`` for an added item; it returns
+``True`` for an item that was not added with probability close to the
+``error_rate`` the filter was sized for, as long as no more than
+``capacity`` items are added. The filter needs ``-ln(p) / ln(2)**2`` bits
+per item: about 1.2 MB per million items at 1%, 1.8 MB at 0.1%.
+"""
+
+import hashlib
+import math
+from typing import Dict, Iterable
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        if capacity <= 0 or not 0 < error_rate < 1:
+            raise ValueError("capacity must be positive and error_rate in (0, 1)")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        # Double hashing (Kirsch-Mitzenmacher): k positions from one digest.
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, item: str) -> None:
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def update(self, items: Iterable[str]) -> None:
+        for item in items:
+            self.add(item)
+
+    def might_contain(self, item: str) -> bool:
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+    __contains__ = might_contain
+
+    def expected_error_rate(self) -> float:
+        """False-positive rate predicted for the current number of items."""
+        return (1 - math.exp(-self.num_hashes * self.count / self.num_bits)) ** self.num_hashes
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "items": self.count,
+            "capacity": self.capacity,
+            "bytes": len(self._bits),
+            "hashes": self.num_hashes,
+            "expected_error_rate": round(self.expected_error_rate(), 6),
+        }
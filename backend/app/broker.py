@@ -0,0 +1,228 @@
+"""Publish/subscribe between worker processes.
+
+Every message published on a channel gets a sequence number that is unique
+and increasing per channel, so subscribers can order messages and notice
+when they missed some (e.g. while reconnecting). ``RedisBroker`` assigns
+the number and publishes in one Lua script, which keeps sequence order and
+delivery order identical across publishers. ``InMemoryBroker`` does the same
+inside one process and is used by tests and single-worker setups.
+
+``publish`` is blocking so it can be called from crud functions, which run
+in the threadpool; ``subscribe`` is used from the event loop.
+"""
+
+import asyncio
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple, Type
+
+import structlog
+
+from .config import get_settings
+
+log = structlog.get_logger()
+
+Message = Tuple[int, str]
+
+# After a failed publish, try_publish skips the broker for this long instead
+# of making every write wait for a connection timeout.
+PUBLISH_RETRY_SECONDS = 5.0
+
+_publish_suspended_until = 0.0
+
+_PUBLISH_SCRIPT = """
+local seq = redis.call('INCR', KEYS[1])
+redis.call('PUBLISH', ARGV[1], seq .. ' ' .. ARGV[2])
+return seq
+"""
+
+
+class Broker(ABC):
+    """Interface every broker backend implements."""
+
+    @abstractmethod
+    def publish(self, channel: str, data: str) -> int:
+        """Publish ``data`` on ``channel`` and return its sequence number."""
+
+    @abstractmethod
+    async def subscribe(self, channel: str) -> AsyncIterator[Message]:
+        """Subscribe to ``channel``; the returned iterator yields ``(seq, data)``.
+
+        The subscription is active once the coroutine returns, so messages
+        published afterwards are not lost.
+        """
+
+    @abstractmethod
+    async def latest_seq(self, channel: str) -> int:
+        """The sequence number of the last message published on ``channel``."""
+
+
+class RedisBroker(Broker):
+    def publish(self, channel: str, data: str) -> int:
+        from .redis_client import get_sync_redis
+
+        return int(get_sync_redis().eval(_PUBLISH_SCRIPT, 1, f"{channel}:seq", channel, data))
+
+    async def subscribe(self, channel: str) -> AsyncIterator[Message]:
+        from .redis_client import get_redis
+
+        pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+        await pubsub.subscribe(channel)
+        return self._listen(pubsub)
+
+    async def latest_seq(self, channel: str) -> int:
+        from .redis_client import get_redis
+
+        return int(await get_redis().get(f"{channel}:seq") or 0)
+
+    @staticmethod
+    async def _listen(pubsub) -> AsyncIterator[Message]:
+        try:
+            async for message in pubsub.listen():
+                seq, _, data = message["data"].partition(" ")
+                yield int(seq), data
+        finally:
+            await pubsub.close()
+
+
+class InMemoryBroker(Broker):
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sequences: Dict[str, int] = {}
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    def publish(self, channel: str, data: str) -> int:
+        with self._lock:
+            seq = self._sequences[channel] = self._sequences.get(channel, 0) + 1
+            for loop, queue in self._subscribers.get(channel, []):
+                loop.call_soon_threadsafe(queue.put_nowait, (seq, data))
+        return seq
+
+    async def subscribe(self, channel: str) -> AsyncIterator[Message]:
+        entry = (asyncio.get_running_loop(), asyncio.Queue())
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(entry)
+        return self._listen(channel, entry)
+
+    async def latest_seq(self, channel: str) -> int:
+        with self._lock:
+            return self._sequences.get(channel, 0)
+
+    async def _listen(self, channel: str, entry) -> AsyncIterator[Message]:
+        try:
+            while True:
+                yield await entry[1].get()
+        finally:
+            with self._lock:
+                self._subscribers[channel].remove(entry)
+
+
+BROKER_BACKENDS: Dict[str, Type[Broker]] = {"redis": RedisBroker, "memory": InMemoryBroker}
+
+_broker: Optional[Broker] = None
+
+
+def get_broker() -> Broker:
+    """Return the configured broker (``BROKER_BACKEND``)."""
+    global _broker
+    if _broker is None:
+        _broker = BROKER_BACKENDS[get_settings().BROKER_BACKEND]()
+    return _broker
+
+
+def set_broker(broker: Optional[Broker]) -> None:
+    """Replace the process broker, e.g. with an ``InMemoryBroker`` in tests."""
+    global _broker
+    _broker = broker
+
+
+def try_publish(channel: str, data: str) -> Optional[int]:
+    """Publish without raising; returns ``None`` if the broker is unavailable.
+
+    For notifications whose loss subscribers tolerate (they detect it from
+    the sequence gap), so a broker outage never fails the caller's write.
+    """
+    global _publish_suspended_until
+    if time.monotonic() < _publish_suspended_until:
+        return None
+    try:
+        return get_broker().publish(channel, data)
+    except Exception as exc:
+        _publish_suspended_until = time.monotonic() + PUBLISH_RETRY_SECONDS
+        log.warning("Broker publish failed", channel=channel, error=str(exc))
+        return None
+
+
+class Subscriber:
+    """Keeps one subscription to ``channel`` alive for the current worker.
+
+    Each message is passed to ``handler(seq, data)`` on the event loop.
+    The subscription is re-established with backoff when it fails, and
+    ``on_gap`` is called whenever messages may have been missed: after a
+    re-subscribe and when the sequence number skips.
+    """
+
+    def __init__(
+        self,
+        channel: str,
+        handler: Callable[[int, str], None],
+        *,
+        on_gap: Optional[Callable[[], None]] = None,
+        broker: Optional[Broker] = None,
+    ):
+        self.channel = channel
+        self.handler = handler
+        self.on_gap = on_gap
+        self._broker = broker
+        self.last_seq = 0
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def broker(self) -> Broker:
+        return self._broker or get_broker()
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        try:
+            stream = await self.broker.subscribe(self.channel)
+        except Exception as exc:
+            log.warning("Broker subscribe failed, retrying in background", channel=self.channel, error=str(exc))
+            stream = None
+        self._task = asyncio.create_task(self._run(stream))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self, stream: Optional[AsyncIterator[Message]]) -> None:
+        backoff = 0.5
+        while True:
+            try:
+                if stream is None:
+                    stream = await self.broker.subscribe(self.channel)
+                    self._gap()
+                async for seq, data in stream:
+                    backoff = 0.5
+                    if self.last_seq and seq != self.last_seq + 1:
+                        log.warning("Broker gap detected", channel=self.channel, expected=self.last_seq + 1, received=seq)
+                        self._gap()
+                    self.last_seq = seq
+                    self.handler(seq, data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                log.warning("Broker subscription lost", channel=self.channel, error=str(exc), retry_in=backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            stream = None
+
+    def _gap(self) -> None:
+        if self.on_gap is not None:
+            self.on_gap()
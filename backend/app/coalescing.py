@@ -0,0 +1,219 @@
+"""Coalescing of concurrent identical lookups.
+
+Endpoints run in the threadpool, so a popular post or a user with many open
+tabs means many threads running the same query at once. Two tools collapse
+them:
+
+* :class:`SingleFlight` lets the first caller for a key run the lookup while
+  concurrent callers for the same key wait and share its result.
+  ``crud.get_post`` and ``crud.get_user_by_username`` use it through
+  :class:`OrmSingleFlight`, which never hands one ORM instance to two
+  sessions. The leader keeps its own instance. Followers get a copy built
+  from the leader's column values and merged into their session with
+  ``load=False``, so the copy costs no query.
+* :class:`BatchLoader` collects the single-id fetches that arrive within
+  ``COALESCE_BATCH_WINDOW_MS`` and answers them with one
+  ``WHERE id IN (...)`` query, up to ``COALESCE_BATCH_MAX`` ids per query.
+  ``crud.get_post_row`` (``GET /posts/{post_id}``) uses it. Rows are
+  immutable tuples, so they are shared as they are.
+
+A follower can receive a result read just before a write that committed
+while it waited, the same as if it had run its own query a moment earlier.
+The counters behind ``/metrics`` show ``calls`` against ``queries``; their
+ratio is the coalescing factor.
+"""
+
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "queries": 0, "shared": 0}
+
+    @classmethod
+    def from_settings(cls, settings) -> "SingleFlight":
+        return cls(settings.COALESCE_ENABLED)
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """Return ``fn()``'s result and whether it came from another caller's run."""
+        if not self.enabled:
+            self.stats["calls"] += 1
+            self.stats["queries"] += 1
+            return fn(), False
+        with self._lock:
+            self.stats["calls"] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.stats["queries"] += 1
+            else:
+                self.stats["shared"] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "in_flight": len(self._calls)}
+
+
+def _columns(obj) -> Dict[str, Any]:
+    mapper = inspect(obj).mapper
+    return {attr.key: getattr(obj, attr.key) for attr in mapper.column_attrs}
+
+
+class OrmSingleFlight:
+    """Single-flight for lookups returning one ORM instance (or ``None``)."""
+
+    def __init__(self, flight: SingleFlight):
+        self.flight = flight
+
+    def snapshot(self) -> Dict[str, Any]:
+        return self.flight.snapshot()
+
+    def load(self, db: Session, key: Hashable, fn: Callable[[], Any]) -> Any:
+        def run():
+            obj = fn()
+            if obj is None:
+                return obj, None, None
+            # Read the values while the leader's session is still usable.
+            state = inspect(obj)
+            kind = "transient" if state.transient else "persistent" if state.persistent else "detached"
+            return obj, _columns(obj), kind
+
+        (obj, values, kind), shared = self.flight.do(key, run)
+        if not shared or obj is None:
+            return obj
+        copy = type(obj)(**values)
+        if kind == "transient":
+            return copy
+        make_transient_to_detached(copy)
+        # Persistent results come from the caller's own database: attach the
+        # copy (or the instance already in its identity map) without a query.
+        return db.merge(copy, load=False) if kind == "persistent" else copy
+
+
+class _Batch:
+    def __init__(self):
+        self.ids: List[Hashable] = []
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.results: Dict[Hashable, Any] = {}
+        self.error: Optional[BaseException] = None
+
+
+class BatchLoader:
+    """Collapses concurrent single-id fetches into one multi-id fetch.
+
+    ``fetch(db, ids)`` must return a mapping of id to result; ids missing
+    from it load as ``None``. The first caller of a window owns the batch:
+    it waits up to ``window`` seconds (less if ``max_batch`` ids arrive),
+    runs ``fetch`` on its own session and hands out the results.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[Session, List[Hashable]], Dict[Hashable, Any]],
+        *,
+        window: float = 0.002,
+        max_batch: int = 100,
+        enabled: bool = True,
+    ):
+        self.fetch = fetch
+        self.window = window
+        self.max_batch = max_batch
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._open: Optional[_Batch] = None
+        self.stats = {"calls": 0, "queries": 0, "max_batch": 0}
+
+    @classmethod
+    def from_settings(cls, settings, fetch) -> "BatchLoader":
+        return cls(
+            fetch,
+            window=settings.COALESCE_BATCH_WINDOW_MS / 1000,
+            max_batch=settings.COALESCE_BATCH_MAX,
+            enabled=settings.COALESCE_ENABLED and settings.COALESCE_BATCH_WINDOW_MS > 0,
+        )
+
+    def load(self, db: Session, key: Hashable) -> Any:
+        if not self.enabled:
+            self.stats["calls"] += 1
+            self.stats["queries"] += 1
+            return self.fetch(db, [key]).get(key)
+        with self._lock:
+            self.stats["calls"] += 1
+            batch = self._open
+            owner = batch is None
+            if owner:
+                batch = self._open = _Batch()
+            if key not in batch.ids:
+                batch.ids.append(key)
+            if len(batch.ids) >= self.max_batch:
+                # Full: later callers start a new batch.
+                self._open = None
+                batch.full.set()
+        if owner:
+            self._run(db, batch)
+        else:
+            batch.done.wait()
+        if batch.error is not None:
+            raise batch.error
+        return batch.results.get(key)
+
+    def _run(self, db: Session, batch: _Batch) -> None:
+        batch.full.wait(self.window)
+        with self._lock:
+            if self._open is batch:
+                self._open = None
+            ids = list(batch.ids)
+            self.stats["queries"] += 1
+            self.stats["max_batch"] = max(self.stats["max_batch"], len(ids))
+        try:
+            batch.results = self.fetch(db, ids)
+        except BaseException as exc:
+            batch.error = exc
+        finally:
+            batch.done.set()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return dict(self.stats)
+
+
+def _ratio(stats: Dict[str, Any]) -> float:
+    return round(stats["calls"] / stats["queries"], 2) if stats["queries"] else 1.0
+
+
+def stats(**sources) -> Dict[str, Any]:
+    """``/metrics`` section: per lookup counters plus ``calls / queries``."""
+    report = {}
+    for name, source in sources.items():
+        snapshot = source.snapshot()
+        report[name] = {**snapshot, "coalescing_ratio": _ratio(snapshot)}
+    return report
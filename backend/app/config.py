@@ -10,8 +10,101 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     REFRESH_TOKEN_EXPIRE_DAYS: int = 7
     SQLALCHEMY_DATABASE_URL: str = "sqlite:///./test.db"
+    # Comma-separated database URLs; when set, posts are sharded by owner_id.
+    POST_SHARD_URLS: str = ""
     GOOGLE_CLIENT_ID: str = "your_google_client_id.apps.googleusercontent.com"
     CSRF_SECRET_KEY: str = "another_super_secret_key_for_csrf"
+    # bcrypt cost; pick a value with `python -m app.passwords calibrate`.
+    PASSWORD_HASH_ROUNDS: int = 12
+    REDIS_URL: str = "redis://redis:6379/0"
+
+    # Production server (see app.server). 0 workers means "size to CPU count".
+    SERVER_BIND: str = "0.0.0.0:8000"
+    SERVER_WORKERS: int = 0
+    SERVER_PRELOAD: bool = False
+    SERVER_TIMEOUT: int = 60
+    SERVER_GRACEFUL_TIMEOUT: int = 30
+    SERVER_KEEPALIVE: int = 5
+    SERVER_MAX_REQUESTS: int = 0
+
+    # Admission control (see app.admission); limits are per worker process.
+    ADMISSION_CONTROL_ENABLED: bool = True
+    ADMISSION_AUTH_CONCURRENCY: int = 4
+    ADMISSION_READ_CONCURRENCY: int = 32
+    ADMISSION_WRITE_CONCURRENCY: int = 8
+    ADMISSION_QUEUE_SIZE: int = 64
+    ADMISSION_QUEUE_TIMEOUT: float = 2.0
+
+    # Response compression for negotiated read endpoints (see app.negotiation).
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSED_CACHE_ENTRIES: int = 256
+
+    # Post attachments (see app.storage).
+    ATTACHMENT_STORAGE_BACKEND: str = "local"
+    ATTACHMENT_STORAGE_DIR: str = "./attachments"
+    ATTACHMENT_MAX_BYTES: int = 25 * 1024 * 1024
+
+    # Live post feed (see app.feed); "redis" or "memory" (single process only).
+    BROKER_BACKEND: str = "redis"
+    FEED_CLIENT_QUEUE_SIZE: int = 100
+    FEED_HISTORY_SIZE: int = 1000
+    FEED_HEARTBEAT_SECONDS: float = 15.0
+
+    # Username availability filter (see app.usernames); it is resized to
+    # twice the user count if that is larger. Memory is about 1.8 MB per
+    # million names at 0.1% false positives.
+    USERNAME_FILTER_CAPACITY: int = 1_000_000
+    USERNAME_FILTER_ERROR_RATE: float = 0.001
+    USERNAME_FILTER_CHECK_SECONDS: float = 60.0
+
+    # Query budgets (see app.querybudget): log requests over budget or with
+    # repeated statements. Meant for staging; tests capture explicitly.
+    QUERY_BUDGET_ENABLED: bool = False
+    QUERY_BUDGET_DEFAULT: int = 20
+    QUERY_REPEAT_THRESHOLD: int = 3
+
+    # Idempotency-Key support on POST routes (see app.idempotency).
+    IDEMPOTENCY_ENABLED: bool = True
+    IDEMPOTENCY_BACKEND: str = "redis"
+    IDEMPOTENCY_TTL: int = 24 * 3600
+    IDEMPOTENCY_LOCK_TTL: int = 60
+    IDEMPOTENCY_WAIT_TIMEOUT: float = 10.0
+    IDEMPOTENCY_MAX_BODY: int = 64 * 1024
+    IDEMPOTENCY_MAX_RESPONSE: int = 1024 * 1024
+
+    # Per-worker cache of encoded GET /posts/{id} responses (see app.postcache); 0 disables.
+    POST_CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    POST_CACHE_TTL: float = 300.0
+    POST_CACHE_VERSION_CHECK_SECONDS: float = 1.0
+
+    # Largest ``skip`` and page size GET /posts/ accept; deeper pages use ``after_id``.
+    POSTS_MAX_SKIP: int = 10_000
+    POSTS_MAX_LIMIT: int = 1000
+
+    # Worker warm-up before /readyz reports ready (see app.warmup).
+    WARMUP_DB_CONNECTIONS: int = 5
+    WARMUP_RETRY_SECONDS: float = 5.0
+    WARMUP_STEP_TIMEOUT_SECONDS: float = 2.0
+
+    # Post archival (python -m app.archive run): posts older than this many
+    # days move to the compressed post_archive table, this many per batch.
+    ARCHIVE_AFTER_DAYS: float = 365.0
+    ARCHIVE_BATCH_SIZE: int = 500
+
+    # Request coalescing (see app.coalescing). A batch window of 0 keeps
+    # single-flight but sends each post id in its own query.
+    COALESCE_ENABLED: bool = True
+    COALESCE_BATCH_WINDOW_MS: float = 2.0
+    COALESCE_BATCH_MAX: int = 100
+
+    # Outbound HTTP client pools (see app.utils.api_helpers), per worker.
+    HTTP_TIMEOUT: float = 10.0
+    HTTP_CONNECT_TIMEOUT: float = 3.0
+    HTTP_MAX_CONNECTIONS: int = 100
+    HTTP_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY: float = 30.0
+    HTTP_RETRIES: int = 2
+    HTTP_RETRY_BACKOFF: float = 0.1
 
     class Config:
         env_file = ".env"
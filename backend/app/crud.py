@@ -1,14 +1,36 @@
-from typing import Optional
+import heapq
+from contextlib import contextmanager
+from itertools import islice
+from typing import Iterator, Optional, Set
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from passlib.context import CryptContext
 
-from . import models, schemas
+from . import archive, database, models, schemas
+from .coalescing import BatchLoader, OrmSingleFlight, SingleFlight
+from .feed import publish_post_event
+from .postcache import post_cache
+from .usernames import username_index
+from .config import get_settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes made with a different cost report needs_update() and are upgraded
+# (or downgraded) on the user's next successful login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=get_settings().PASSWORD_HASH_ROUNDS,
+)
+
+
+# Concurrent lookups of the same user or post share one query (see app.coalescing).
+user_lookups = OrmSingleFlight(SingleFlight.from_settings(get_settings()))
+post_lookups = OrmSingleFlight(SingleFlight.from_settings(get_settings()))
 
 
 def get_user_by_username(db: Session, username: str):
-    return db.query(models.User).filter(models.User.username == username).first()
+    return user_lookups.load(
+        db, username, lambda: db.query(models.User).filter(models.User.username == username).first()
+    )
 
 
 def create_user(db: Session, user: schemas.UserCreate):
@@ -21,32 +43,233 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    username_index.record_new_user(db_user.username)
     return db_user
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def get_posts(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Post).offset(skip).limit(limit).all()
 
+def password_needs_rehash(hashed_password: str) -> bool:
+    return pwd_context.needs_update(hashed_password)
+
+
+def rehash_user_password(db: Session, user_id: int, plain_password: str, old_hash: str) -> bool:
+    """Store a hash at the current cost if the password has not changed meanwhile."""
+    new_hash = pwd_context.hash(plain_password)
+    updated = (
+        db.query(models.User)
+        .filter(models.User.id == user_id, models.User.hashed_password == old_hash)
+        .update({models.User.hashed_password: new_hash}, synchronize_session=False)
+    )
+    db.commit()
+    return bool(updated)
+
+# Pages are in id order. ``after_id`` is a keyset cursor (the last id of the
+# previous page): each database reads only the page itself, where ``skip``
+# makes every shard read ``skip + limit`` rows.
+def get_posts(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    shards = database.post_shards
+    if shards is not None:
+        return _get_posts_sharded(shards, skip, limit, after_id)
+    query = db.query(models.Post)
+    if after_id is not None:
+        query = query.filter(models.Post.id > after_id)
+    return query.order_by(models.Post.id).offset(skip).limit(limit).all()
+
+# Single-post reads fall back to the archive (see app.archive); an archived
+# post comes back as a transient Post instance.
 def get_post(db: Session, post_id: int):
-    return db.query(models.Post).filter(models.Post.id == post_id).first()
+    return post_lookups.load(db, post_id, lambda: _get_post(db, post_id))
+
+def _get_post(db: Session, post_id: int):
+    shards = database.post_shards
+    if shards is not None:
+        found = shards.scatter(
+            lambda shard_db: shard_db.get(models.Post, post_id) or archive.archived_post(shard_db, post_id)
+        )
+        return next((post for post in found if post is not None), None)
+    post = db.query(models.Post).filter(models.Post.id == post_id).first()
+    return post if post is not None else archive.archived_post(db, post_id)
+
+# Read-only path: Core selects of the public columns return plain Row tuples
+# (attribute access, ``_asdict()``) with no ORM instances, identity map
+# entries or change tracking. Use it where the result is only serialized.
+_posts = models.Post.__table__
+_POST_ROW_QUERY = select(_posts.c.id, _posts.c.title, _posts.c.content, _posts.c.owner_id)
+
+def get_post_rows(db: Session, skip: int = 0, limit: int = 100, after_id: Optional[int] = None):
+    query = _POST_ROW_QUERY.order_by(_posts.c.id)
+    if after_id is not None:
+        query = query.where(_posts.c.id > after_id)
+    shards = database.post_shards
+    if shards is not None:
+        pages = shards.scatter(lambda shard_db: shard_db.execute(query.limit(skip + limit)).all())
+        merged = heapq.merge(*pages, key=lambda row: row.id)
+        return list(islice(_unique_by_id(merged), skip, skip + limit))
+    return db.execute(query.offset(skip).limit(limit)).all()
+
+def get_post_row(db: Session, post_id: int):
+    return post_row_loader.load(db, post_id)
+
+def _get_post_rows_by_id(db: Session, post_ids):
+    """Hot rows for ``post_ids``, then archived ones for the ids not found."""
+    query = _POST_ROW_QUERY.where(_posts.c.id.in_(post_ids))
+
+    def fetch(session: Session):
+        found = {row.id: row for row in session.execute(query)}
+        missing = [post_id for post_id in post_ids if post_id not in found]
+        if missing:
+            found.update(archive.archived_rows(session, missing))
+        return found
+
+    shards = database.post_shards
+    if shards is None:
+        return fetch(db)
+    merged = {}
+    for found in shards.scatter(fetch):
+        merged.update(found)
+    return merged
+
+# Concurrent GET /posts/{post_id} reads within a short window share one IN query.
+post_row_loader = BatchLoader.from_settings(get_settings(), _get_post_rows_by_id)
 
 def create_user_post(db: Session, post: schemas.PostCreate, user_id: int):
-    db_post = models.Post(**post.dict(), owner_id=user_id)
-    db.add(db_post)
-    db.commit()
-    db.refresh(db_post)
+    shards = database.post_shards
+    if shards is not None:
+        post_id = _allocate_id(db)
+        shard_db = shards.session(shards.shard_for(user_id))
+        try:
+            db_post = models.Post(**post.dict(), id=post_id, owner_id=user_id)
+            shard_db.add(db_post)
+            shard_db.commit()
+            shard_db.refresh(db_post)
+        finally:
+            shard_db.close()
+    else:
+        db_post = models.Post(**post.dict(), owner_id=user_id)
+        db.add(db_post)
+        db.commit()
+        db.refresh(db_post)
+    publish_post_event("post_created", db_post.id, db_post)
     return db_post
 
 def delete_post(db: Session, post_id: int):
-    db_post = db.query(models.Post).filter(models.Post.id == post_id).first()
-    if db_post:
-        db.delete(db_post)
+    shards = database.post_shards
+    if shards is not None:
+        # Delete everywhere: mid-rebalance a post can briefly exist twice.
+        deleted = any(shards.scatter(lambda shard_db: _delete_post_row(shard_db, post_id)))
+    else:
+        db_post = db.query(models.Post).filter(models.Post.id == post_id).first()
+        if db_post is not None:
+            # Attachment rows go in the same transaction; their blobs are
+            # reclaimed by `python -m app.storage gc`.
+            db.query(models.Attachment).filter(models.Attachment.post_id == post_id).delete(synchronize_session=False)
+            db.delete(db_post)
+        archived = db.query(models.PostArchive).filter(models.PostArchive.id == post_id).delete(synchronize_session=False)
+        deleted = db_post is not None or bool(archived)
         db.commit()
-        return True
-    return False
+    if deleted:
+        post_cache.invalidate_everywhere(post_id)
+        publish_post_event("post_deleted", post_id)
+    return deleted
+
+def _delete_post_row(db: Session, post_id: int) -> bool:
+    db.query(models.Attachment).filter(models.Attachment.post_id == post_id).delete(synchronize_session=False)
+    deleted = db.query(models.Post).filter(models.Post.id == post_id).delete(synchronize_session=False)
+    archived = db.query(models.PostArchive).filter(models.PostArchive.id == post_id).delete(synchronize_session=False)
+    db.commit()
+    return bool(deleted or archived)
+
+def _allocate_id(db: Session) -> int:
+    """Take the next globally unique post/attachment id from the primary database."""
+    ticket = models.PostIdTicket()
+    db.add(ticket)
+    db.flush()
+    post_id = ticket.id
+    # Only the newest ticket is needed to keep the sequence moving.
+    db.query(models.PostIdTicket).filter(models.PostIdTicket.id < post_id).delete(synchronize_session=False)
+    db.commit()
+    return post_id
+
+def _get_posts_sharded(shards, skip: int, limit: int, after_id: Optional[int] = None):
+    """Scatter-gather a page in id order across all shards."""
+    def page(shard_db: Session):
+        query = shard_db.query(models.Post)
+        if after_id is not None:
+            query = query.filter(models.Post.id > after_id)
+        return query.order_by(models.Post.id).limit(skip + limit).all()
+
+    pages = shards.scatter(page)
+    merged = heapq.merge(*pages, key=lambda post: post.id)
+    return list(islice(_unique_by_id(merged), skip, skip + limit))
+
+def _unique_by_id(posts):
+    # Merged input is id-ordered, so duplicates (mid-rebalance) are adjacent.
+    last_id = None
+    for post in posts:
+        if post.id != last_id:
+            yield post
+        last_id = post.id
+
+@contextmanager
+def _post_session(db: Session, owner_id: int) -> Iterator[Session]:
+    """Yield the session holding ``owner_id``'s posts: ``db`` or its shard."""
+    shards = database.post_shards
+    if shards is None:
+        yield db
+        return
+    shard_db = shards.session(shards.shard_for(owner_id))
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
+
+def create_attachment(db: Session, post: models.Post, *, filename: str, content_type: str, size: int, sha256: str):
+    attachment_id = _allocate_id(db) if database.post_shards is not None else None
+    with _post_session(db, post.owner_id) as post_db:
+        # Archived posts carry no attachments; bring the post back first.
+        archive.restore_post(post_db, post.id)
+        db_attachment = models.Attachment(
+            id=attachment_id,
+            post_id=post.id,
+            filename=filename,
+            content_type=content_type,
+            size=size,
+            sha256=sha256,
+        )
+        post_db.add(db_attachment)
+        post_db.commit()
+        post_db.refresh(db_attachment)
+        return db_attachment
+
+def get_attachments(db: Session, post: models.Post):
+    with _post_session(db, post.owner_id) as post_db:
+        return (
+            post_db.query(models.Attachment)
+            .filter(models.Attachment.post_id == post.id)
+            .order_by(models.Attachment.id)
+            .all()
+        )
+
+def get_attachment(db: Session, post: models.Post, attachment_id: int):
+    with _post_session(db, post.owner_id) as post_db:
+        return (
+            post_db.query(models.Attachment)
+            .filter(models.Attachment.post_id == post.id, models.Attachment.id == attachment_id)
+            .first()
+        )
+
+def get_attachment_hashes(db: Session) -> Set[str]:
+    """Every blob hash referenced by an attachment row, across all shards."""
+    def hashes(session: Session) -> Set[str]:
+        return {sha256 for (sha256,) in session.query(models.Attachment.sha256).distinct()}
+
+    shards = database.post_shards
+    if shards is None:
+        return hashes(db)
+    return set().union(*shards.scatter(hashes))
 
 def update_user_mfa_secret(db: Session, user: models.User, secret: Optional[str]):
     user.mfa_secret = secret  # type: ignore
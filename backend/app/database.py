@@ -4,6 +4,7 @@ from sqlalchemy.orm import sessionmaker
 
 import os
 from .config import get_settings
+from .sharding import ShardSet
 
 settings = get_settings()
 
@@ -13,17 +14,40 @@ SQLALCHEMY_DATABASE_URL = os.getenv(
     "SQLALCHEMY_DATABASE_URL", settings.SQLALCHEMY_DATABASE_URL
 )
 
-# Only pass check_same_thread for SQLite URLs
-if SQLALCHEMY_DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-    )
-else:
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+def make_engine(url: str):
+    # Only pass check_same_thread for SQLite URLs
+    if url.startswith("sqlite"):
+        return create_engine(url, connect_args={"check_same_thread": False})
+    return create_engine(url)
+
+
+engine = make_engine(SQLALCHEMY_DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+# Optional post shards (see app.sharding); None keeps posts on `engine`.
+POST_SHARD_URLS = [
+    url.strip()
+    for url in os.getenv("POST_SHARD_URLS", settings.POST_SHARD_URLS).split(",")
+    if url.strip()
+]
+post_shards = (
+    ShardSet([make_engine(url) for url in POST_SHARD_URLS]) if POST_SHARD_URLS else None
+)
+
+def reset_engine_after_fork() -> None:
+    """Drop pooled connections inherited from the parent process.
+
+    ``close=False`` leaves the parent's sockets untouched while giving the
+    forked worker an empty pool of its own.
+    """
+    engine.dispose(close=False)
+    if post_shards is not None:
+        post_shards.dispose_after_fork()
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -0,0 +1,167 @@
+"""Live post feed pushed to clients over SSE and WebSocket.
+
+``crud`` publishes ``post_created``/``post_deleted`` events through the
+broker (Redis pub/sub in production). Each worker runs one :class:`FeedHub`
+holding a single subscription, and fans events out to its connected clients
+through bounded per-client queues. A client that falls ``FEED_CLIENT_QUEUE_SIZE``
+events behind is disconnected rather than buffered without limit; it
+reconnects with the last event id it saw (``Last-Event-ID`` for SSE,
+``?last_event_id=`` for WebSocket) and the hub replays what it missed from
+its recent history. If that history no longer reaches back far enough, the
+client gets a ``reset`` event and should re-fetch ``GET /posts/``.
+"""
+
+import asyncio
+import json
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Deque, Dict, Optional, Set
+
+from .broker import Broker, Subscriber, try_publish
+
+CHANNEL = "posts:feed"
+
+
+@dataclass(frozen=True)
+class FeedEvent:
+    id: int
+    type: str
+    data: Dict[str, Any]
+
+    def to_sse(self) -> str:
+        return f"id: {self.id}\nevent: {self.type}\ndata: {json.dumps(self.data)}\n\n"
+
+    def to_json(self) -> str:
+        return json.dumps({"id": self.id, "type": self.type, "data": self.data})
+
+
+def publish_post_event(event_type: str, post_id: int, post: Any = None) -> None:
+    """Publish a post event; failures are logged and never fail the write."""
+    data: Dict[str, Any] = {"id": post_id}
+    if post is not None:
+        data.update(title=post.title, content=post.content, owner_id=post.owner_id)
+    try_publish(CHANNEL, json.dumps({"type": event_type, "data": data}))
+
+
+class _Client:
+    def __init__(self, queue_size: int):
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.dropped = False
+
+    def offer(self, event: FeedEvent) -> bool:
+        try:
+            self.queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            self.dropped = True
+            self.close()
+            return False
+
+    def close(self) -> None:
+        # Drop the backlog and leave only the sentinel that ends the stream.
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+
+class FeedHub:
+    """Per-worker subscription to the feed channel and its connected clients."""
+
+    def __init__(
+        self,
+        broker: Optional[Broker] = None,
+        *,
+        channel: str = CHANNEL,
+        queue_size: int = 100,
+        history_size: int = 1000,
+        heartbeat: float = 15.0,
+    ):
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._history: Deque[FeedEvent] = deque(maxlen=history_size)
+        self._clients: Set[_Client] = set()
+        self._last_id = 0
+        self._subscriber = Subscriber(channel, self._dispatch, on_gap=self._history.clear, broker=broker)
+        self.events_received = 0
+        self.slow_disconnects = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "FeedHub":
+        return cls(
+            queue_size=settings.FEED_CLIENT_QUEUE_SIZE,
+            history_size=settings.FEED_HISTORY_SIZE,
+            heartbeat=settings.FEED_HEARTBEAT_SECONDS,
+        )
+
+    async def start(self) -> None:
+        await self._subscriber.start()
+
+    async def stop(self) -> None:
+        await self._subscriber.stop()
+        for client in list(self._clients):
+            client.close()
+
+    def _dispatch(self, seq: int, data: str) -> None:
+        message = json.loads(data)
+        event = FeedEvent(seq, message["type"], message["data"])
+        # After a gap the history was cleared, so it never replays across one.
+        self._last_id = seq
+        self._history.append(event)
+        self.events_received += 1
+        for client in list(self._clients):
+            if not client.offer(event):
+                self._clients.discard(client)
+                self.slow_disconnects += 1
+
+    def _backlog(self, last_event_id: int) -> list:
+        # A hub that has seen nothing yet cannot tell whether the client missed events.
+        if self._last_id and last_event_id >= self._last_id:
+            return []
+        if self._history and self._history[0].id <= last_event_id + 1:
+            return [event for event in self._history if event.id > last_event_id]
+        return [FeedEvent(self._last_id, "reset", {})]
+
+    async def events(self, last_event_id: Optional[int] = None) -> AsyncIterator[Optional[FeedEvent]]:
+        """Yield events for one client; ``None`` means "send a heartbeat".
+
+        The iterator ends when the client is dropped as a slow consumer or
+        the hub stops.
+        """
+        client = _Client(self.queue_size)
+        self._clients.add(client)
+        try:
+            sent = self._last_id
+            backlog = [] if last_event_id is None else self._backlog(last_event_id)
+            for event in backlog:
+                sent = event.id
+                yield event
+            while True:
+                try:
+                    event = await asyncio.wait_for(client.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if event is None:
+                    return
+                if event.id > sent:
+                    sent = event.id
+                    yield event
+        finally:
+            self._clients.discard(client)
+
+    async def sse(self, last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+        yield f"retry: {int(self.heartbeat * 1000)}\n\n"
+        async for event in self.events(last_event_id):
+            yield ": ping\n\n" if event is None else event.to_sse()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "clients": len(self._clients),
+            "last_event_id": self._last_id,
+            "events_received": self.events_received,
+            "slow_disconnects": self.slow_disconnects,
+        }
+
+
+def parse_event_id(value: Optional[str]) -> Optional[int]:
+    return int(value) if value and value.isdigit() else None
@@ -0,0 +1,343 @@
+"""``Idempotency-Key`` support for POST endpoints.
+
+The first request with a given key runs normally. Its response is stored
+for ``IDEMPOTENCY_TTL`` seconds, and retries with the same key are answered
+from the store with an ``Idempotent-Replayed: true`` header, without running
+the endpoint again. A duplicate that arrives while the first request is
+still running waits for its result (up to ``IDEMPOTENCY_WAIT_TIMEOUT``,
+then ``409``).
+
+Details:
+
+* Keys are scoped by method, path and the caller's credentials, so two
+  users cannot read each other's stored responses.
+* A retry whose body differs from the original gets ``422``.
+* Only request bodies up to ``IDEMPOTENCY_MAX_BODY`` are fingerprinted.
+  Larger or chunked uploads (attachments) pass through untouched.
+* Only successful (``2xx``) responses up to ``IDEMPOTENCY_MAX_RESPONSE``
+  bytes are stored. After anything else (say a ``403`` for a stale CSRF
+  token, or a ``500``) the key is released and the next retry runs again.
+* ``Set-Cookie`` is never stored or replayed. Session endpoints (login,
+  refresh, MFA) are excluded altogether.
+
+Redis holds the records so duplicates are caught across workers.
+``InMemoryIdempotencyStore`` is the local stand-in for tests and single
+workers. If the store is unreachable, requests run without idempotency
+rather than failing.
+"""
+
+import asyncio
+import base64
+import hashlib
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple, Type
+
+import structlog
+
+from .admission import AUTH_PATH_PREFIXES
+
+log = structlog.get_logger()
+
+HEADER = b"idempotency-key"
+# Endpoints that mint or revoke credentials must never be replayed.
+EXCLUDED_PATH_PREFIXES: Tuple[str, ...] = tuple(p for p in AUTH_PATH_PREFIXES if p != "/signup")
+KEY_PREFIX = "idem:"
+PENDING = "pending"
+
+stats: Dict[str, int] = {"executed": 0, "replayed": 0, "waited": 0, "conflicts": 0, "bypassed": 0}
+
+
+class IdempotencyStore(ABC):
+    """Records are JSON strings: ``{"state": "pending"|"done", "fp": ..., ...}``."""
+
+    @abstractmethod
+    async def reserve(self, key: str, record: str, ttl: float) -> bool:
+        """Store ``record`` only if ``key`` is absent; return whether it was stored."""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[str]:
+        ...
+
+    @abstractmethod
+    async def set(self, key: str, record: str, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        ...
+
+    async def wait(self, key: str, timeout: float) -> Optional[str]:
+        """Poll until the record leaves the pending state or ``timeout`` passes."""
+        deadline = time.monotonic() + timeout
+        delay = 0.01
+        while True:
+            record = await self.get(key)
+            if record is None or json.loads(record)["state"] != PENDING:
+                return record
+            if time.monotonic() >= deadline:
+                return record
+            await asyncio.sleep(min(delay, max(deadline - time.monotonic(), 0)))
+            delay = min(delay * 2, 0.25)
+
+
+class RedisIdempotencyStore(IdempotencyStore):
+    async def reserve(self, key: str, record: str, ttl: float) -> bool:
+        from .redis_client import get_redis
+
+        return bool(await get_redis().set(key, record, nx=True, px=int(ttl * 1000)))
+
+    async def get(self, key: str) -> Optional[str]:
+        from .redis_client import get_redis
+
+        return await get_redis().get(key)
+
+    async def set(self, key: str, record: str, ttl: float) -> None:
+        from .redis_client import get_redis
+
+        await get_redis().set(key, record, px=int(ttl * 1000))
+
+    async def delete(self, key: str) -> None:
+        from .redis_client import get_redis
+
+        await get_redis().delete(key)
+
+
+class InMemoryIdempotencyStore(IdempotencyStore):
+    def __init__(self):
+        self._records: Dict[str, Tuple[str, float]] = {}
+        self._changed: Dict[str, asyncio.Event] = {}
+
+    async def reserve(self, key: str, record: str, ttl: float) -> bool:
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, record, ttl)
+        return True
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._records.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= time.monotonic():
+            del self._records[key]
+            return None
+        return entry[0]
+
+    async def set(self, key: str, record: str, ttl: float) -> None:
+        self._records[key] = (record, time.monotonic() + ttl)
+        self._notify(key)
+
+    async def delete(self, key: str) -> None:
+        self._records.pop(key, None)
+        self._notify(key)
+
+    def _notify(self, key: str) -> None:
+        event = self._changed.pop(key, None)
+        if event is not None:
+            event.set()
+
+    async def wait(self, key: str, timeout: float) -> Optional[str]:
+        # Same process: wake up on the change instead of polling.
+        deadline = time.monotonic() + timeout
+        while True:
+            record = await self.get(key)
+            remaining = deadline - time.monotonic()
+            if record is None or json.loads(record)["state"] != PENDING or remaining <= 0:
+                return record
+            event = self._changed.setdefault(key, asyncio.Event())
+            try:
+                await asyncio.wait_for(event.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+
+IDEMPOTENCY_BACKENDS: Dict[str, Type[IdempotencyStore]] = {
+    "redis": RedisIdempotencyStore,
+    "memory": InMemoryIdempotencyStore,
+}
+
+
+def _header(scope, name: bytes) -> Optional[bytes]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value
+    return None
+
+
+def _credentials(scope) -> bytes:
+    authorization = _header(scope, b"authorization")
+    if authorization is not None:
+        return authorization
+    # Only the access token identifies the caller; other cookies vary freely.
+    for part in (_header(scope, b"cookie") or b"").split(b";"):
+        if part.strip().startswith(b"access_token="):
+            return part.strip()
+    return b""
+
+
+def _scoped_key(scope, idempotency_key: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in (scope["method"].encode(), scope["path"].encode(), _credentials(scope), idempotency_key):
+        digest.update(part)
+        digest.update(b"\0")
+    return KEY_PREFIX + digest.hexdigest()
+
+
+class IdempotencyMiddleware:
+    def __init__(
+        self,
+        app,
+        store: IdempotencyStore,
+        *,
+        ttl: float = 86400,
+        lock_ttl: float = 60,
+        wait_timeout: float = 10,
+        max_body: int = 64 * 1024,
+        max_response: int = 1024 * 1024,
+    ):
+        self.app = app
+        self.store = store
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.wait_timeout = wait_timeout
+        self.max_body = max_body
+        self.max_response = max_response
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            await self.app(scope, receive, send)
+            return
+        idempotency_key = _header(scope, HEADER)
+        length = _header(scope, b"content-length")
+        if (
+            idempotency_key is None
+            or scope["path"].startswith(EXCLUDED_PATH_PREFIXES)
+            or length is None
+            or not length.isdigit()
+            or int(length) > self.max_body
+        ):
+            if idempotency_key is not None:
+                stats["bypassed"] += 1
+            await self.app(scope, receive, send)
+            return
+
+        body, disconnected = await self._read_body(receive)
+        if disconnected:
+            return
+        key = _scoped_key(scope, idempotency_key)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        pending = json.dumps({"state": PENDING, "fp": fingerprint})
+        try:
+            reserved = await self.store.reserve(key, pending, self.lock_ttl)
+            if not reserved:
+                record = await self.store.get(key)
+                if record is not None and json.loads(record)["state"] == PENDING:
+                    stats["waited"] += 1
+                    record = await self.store.wait(key, self.wait_timeout)
+                # None: the first attempt failed and released the key; take it over.
+                reserved = record is None and await self.store.reserve(key, pending, self.lock_ttl)
+        except Exception as exc:
+            log.warning("Idempotency store unavailable", error=str(exc))
+            await self.app(scope, _replay_body(body, receive), send)
+            return
+
+        if reserved:
+            await self._execute(scope, _replay_body(body, receive), send, key, fingerprint)
+        elif record is None:
+            stats["conflicts"] += 1
+            await self._send_json(send, 409, "A request with this Idempotency-Key is in progress")
+        else:
+            await self._answer_from_record(json.loads(record), fingerprint, send)
+
+    async def _read_body(self, receive) -> Tuple[bytes, bool]:
+        chunks: List[bytes] = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return b"", True
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                return b"".join(chunks), False
+
+    async def _execute(self, scope, receive, send, key: str, fingerprint: str) -> None:
+        stats["executed"] += 1
+        start: Dict = {}
+        chunks: List[bytes] = []
+        size = 0
+        storable = True
+
+        async def capture(message):
+            nonlocal size, storable
+            if message["type"] == "http.response.start":
+                start.update(message)
+                storable = 200 <= message["status"] < 300
+            elif message["type"] == "http.response.body" and storable:
+                size += len(message.get("body", b""))
+                if size > self.max_response:
+                    storable = False
+                    chunks.clear()
+                else:
+                    chunks.append(message.get("body", b""))
+            await send(message)
+
+        completed = False
+        try:
+            await self.app(scope, receive, capture)
+            completed = True
+        finally:
+            try:
+                if completed and storable and start:
+                    headers = [
+                        [name.decode("latin-1"), value.decode("latin-1")]
+                        for name, value in start.get("headers", [])
+                        if name.lower() not in (b"set-cookie", b"content-length")
+                    ]
+                    record = {
+                        "state": "done",
+                        "fp": fingerprint,
+                        "status": start["status"],
+                        "headers": headers,
+                        "body": base64.b64encode(b"".join(chunks)).decode(),
+                    }
+                    await self.store.set(key, json.dumps(record), self.ttl)
+                else:
+                    await self.store.delete(key)
+            except Exception as exc:
+                log.warning("Idempotency store unavailable", error=str(exc))
+
+    async def _answer_from_record(self, record: Dict, fingerprint: str, send) -> None:
+        if record["fp"] != fingerprint:
+            stats["conflicts"] += 1
+            await self._send_json(send, 422, "Idempotency-Key was already used with a different request body")
+            return
+        if record["state"] == PENDING:
+            stats["conflicts"] += 1
+            await self._send_json(send, 409, "A request with this Idempotency-Key is in progress")
+            return
+        stats["replayed"] += 1
+        body = base64.b64decode(record["body"])
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in record["headers"]]
+        headers += [(b"content-length", str(len(body)).encode()), (b"idempotent-replayed", b"true")]
+        await send({"type": "http.response.start", "status": record["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    async def _send_json(send, status: int, detail: str) -> None:
+        body = json.dumps({"detail": detail}).encode()
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def _replay_body(body: bytes, receive):
+    sent = False
+
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+
+    return replay
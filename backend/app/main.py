@@ -1,9 +1,9 @@
-from fastapi import Depends, FastAPI, HTTPException, Request, status, Response
-from fastapi.responses import JSONResponse
+from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException, Query, Request, status, Response, WebSocket
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 from datetime import timedelta
-from redis.asyncio import Redis
 from fastapi_limiter import FastAPILimiter
 from fastapi_limiter.depends import RateLimiter
 from fastapi_csrf_protect import CsrfProtect
@@ -13,11 +13,17 @@ from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 import pyotp
 import qrcode
+import asyncio
 import io
+import os
 from base64 import b64encode
 import structlog
 
 from . import crud, models, schemas
+from .admission import AdmissionControlMiddleware, AdmissionController
+from .attachments import attachment_response
+from . import negotiation
+from .negotiation import encode_payload, encoded_response, negotiate, negotiated_response
 from .auth import (
     create_access_token,
     create_refresh_token,
@@ -25,15 +31,25 @@ from .auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     REFRESH_TOKEN_EXPIRE_DAYS,
 )
-from .database import engine, get_db
+from . import coalescing, database
+from .database import get_db
+from .feed import FeedHub, parse_event_id
+from . import idempotency
+from .idempotency import IDEMPOTENCY_BACKENDS, IdempotencyMiddleware
 from .logging_config import setup_logging
-from .utils import format_error
+from .utils import format_error, http_clients
 from .config import get_settings
+from .passwords import rehash_in_background
+from .postcache import post_cache
+from .profiling import ProfileTarget, ProfilingMiddleware, SamplingProfiler
+from .querybudget import QueryBudgetMiddleware, QueryMonitor
+from .redis_client import close_redis, get_redis
+from .storage import AttachmentTooLarge, get_storage
+from .usernames import username_index
+from .warmup import start_warmup, stop_warmup, warmup_state
 
 log = structlog.get_logger()
 
-models.Base.metadata.create_all(bind=engine)
-
 setup_logging()
 
 app = FastAPI(
@@ -42,6 +58,34 @@ app = FastAPI(
     version="0.1.0",
 )
 
+admission = AdmissionController.from_settings(get_settings())
+if get_settings().ADMISSION_CONTROL_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware, controller=admission)
+
+# Outside admission control, so replays and waiting duplicates take no slot.
+if get_settings().IDEMPOTENCY_ENABLED:
+    app.add_middleware(
+        IdempotencyMiddleware,
+        store=IDEMPOTENCY_BACKENDS[get_settings().IDEMPOTENCY_BACKEND](),
+        ttl=get_settings().IDEMPOTENCY_TTL,
+        lock_ttl=get_settings().IDEMPOTENCY_LOCK_TTL,
+        wait_timeout=get_settings().IDEMPOTENCY_WAIT_TIMEOUT,
+        max_body=get_settings().IDEMPOTENCY_MAX_BODY,
+        max_response=get_settings().IDEMPOTENCY_MAX_RESPONSE,
+    )
+
+query_monitor = QueryMonitor.from_settings(get_settings())
+query_monitor.install(database.engine)
+if database.post_shards is not None:
+    for shard_engine in database.post_shards.engines:
+        query_monitor.install(shard_engine)
+app.add_middleware(QueryBudgetMiddleware, monitor=query_monitor)
+
+profiler = SamplingProfiler()
+app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+feed_hub = FeedHub.from_settings(get_settings())
+
 # CSRF Settings
 class CsrfSettings(BaseModel):
     secret_key: str
@@ -55,8 +99,21 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/login")
 
 @app.on_event("startup")
 async def startup():
-    redis = Redis(host="redis", port=6379, db=0, encoding="utf-8", decode_responses=True)
-    await FastAPILimiter.init(redis)
+    await FastAPILimiter.init(get_redis())
+    await feed_hub.start()
+    await username_index.start()
+    await post_cache.start()
+    start_warmup(get_settings())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    await stop_warmup()
+    await feed_hub.stop()
+    await username_index.stop()
+    await post_cache.stop()
+    await close_redis()
+    await http_clients.aclose()
 
 
 @app.exception_handler(Exception)
@@ -71,6 +128,40 @@ def csrf_protect_exception_handler(request: Request, exc: CsrfProtectError):
     return JSONResponse(status_code=exc.status_code, content={"detail": exc.message})
 
 
+# Health checks are async so they answer on the event loop even when the
+# threadpool is saturated by slow requests.
+@app.get("/livez")
+async def livez():
+    """The worker process is up and its event loop answers."""
+    return {"status": "alive"}
+
+
+@app.get("/readyz")
+async def readyz():
+    """Ready for traffic only once warm-up has finished."""
+    report = warmup_state.report()
+    return JSONResponse(status_code=200 if warmup_state.ready else 503, content=report)
+
+
+@app.get("/metrics")
+def metrics():
+    """Per-worker runtime counters for dashboards and alerting."""
+    return {
+        "admission": admission.stats(),
+        "compressed_cache": dict(negotiation.cache_stats),
+        "feed": feed_hub.stats(),
+        "usernames": username_index.stats(),
+        "queries": query_monitor.stats(),
+        "idempotency": dict(idempotency.stats),
+        "post_cache": post_cache.snapshot(),
+        "coalescing": coalescing.stats(
+            get_post=crud.post_lookups,
+            get_user_by_username=crud.user_lookups,
+            get_post_row=crud.post_row_loader,
+        ),
+    }
+
+
 @app.post("/signup", response_model=schemas.UserOut)
 def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
     db_user = crud.get_user_by_username(db, user.username)
@@ -79,7 +170,15 @@ def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
     return crud.create_user(db, user)
 
 
-async def get_current_user_from_cookie(request: Request, db: Session = Depends(get_db)):
+@app.get("/users/available")
+def username_available(username: str = Query(..., min_length=3, max_length=50), db: Session = Depends(get_db)):
+    """Cheap pre-signup check; ``/signup`` still enforces uniqueness."""
+    return {"username": username, "available": username_index.is_available(db, username)}
+
+
+# Sync so it runs in the threadpool: the user lookup blocks on the database
+# and, with many tabs open, coalesces with the same user's other requests.
+def get_current_user_from_cookie(request: Request, db: Session = Depends(get_db)):
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
@@ -128,15 +227,66 @@ def refresh_token(request: Request, response: Response, db: Session = Depends(ge
     return {"message": "Token refreshed successfully"}
 
 
+def require_admin(current_user: models.User = Depends(get_current_user_from_cookie)) -> models.User:
+    if current_user.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough privileges")
+    return current_user
+
+
 @app.get("/admin")
 def admin_endpoint(
-    current_user: models.User = Depends(get_current_user_from_cookie),
+    current_user: models.User = Depends(require_admin),
 ):
-    if current_user.role != "admin":
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough privileges")
     return {"msg": "Welcome admin!"}
 
 
+# Profiling Endpoints (per worker, see app.profiling)
+@app.post("/admin/profile")
+def arm_profiler(
+    profile: schemas.ProfileRequest,
+    request: Request,
+    current_user: models.User = Depends(require_admin),
+    csrf_protect: CsrfProtect = Depends()
+):
+    csrf_protect.validate_csrf(request)
+    profiler.arm(
+        ProfileTarget(
+            requests=profile.requests,
+            path_prefix=profile.path_prefix,
+            header_name=profile.header_name,
+            header_value=profile.header_value,
+            interval=profile.interval_ms / 1000,
+        )
+    )
+    log.info("Profiler armed", user_id=current_user.id, **profile.dict())
+    return profiler.status()
+
+
+@app.get("/admin/profile")
+def profiler_status(current_user: models.User = Depends(require_admin)):
+    return profiler.status()
+
+
+@app.get("/admin/profile/collapsed")
+def download_profile(current_user: models.User = Depends(require_admin)):
+    return Response(
+        profiler.collapsed(),
+        media_type="text/plain",
+        headers={"Content-Disposition": 'attachment; filename="profile.collapsed"'},
+    )
+
+
+@app.delete("/admin/profile")
+def disarm_profiler(
+    request: Request,
+    current_user: models.User = Depends(require_admin),
+    csrf_protect: CsrfProtect = Depends()
+):
+    csrf_protect.validate_csrf(request)
+    profiler.disarm()
+    return profiler.status()
+
+
 @app.get("/error")
 def raise_error():
     """Endpoint used in tests to trigger error handling."""
@@ -159,18 +309,33 @@ def create_post_for_user(
     return crud.create_user_post(db=db, post=post, user_id=user_id)
 
 
+# Post reads negotiate JSON/MessagePack and gzip/Brotli (see app.negotiation).
+# Deep pages use the ``after_id`` cursor; ``skip`` and ``limit`` are capped
+# because every shard has to read ``skip + limit`` rows for a page.
 @app.get("/posts/", response_model=list[schemas.Post])
-def read_posts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    posts = crud.get_posts(db, skip=skip, limit=limit)
-    return posts
+def read_posts(
+    request: Request,
+    skip: int = Query(0, ge=0, le=get_settings().POSTS_MAX_SKIP),
+    limit: int = Query(100, ge=1, le=get_settings().POSTS_MAX_LIMIT),
+    after_id: int | None = None,
+    db: Session = Depends(get_db),
+):
+    rows = crud.get_post_rows(db, skip=skip, limit=limit, after_id=after_id)
+    return negotiated_response(request, [row._asdict() for row in rows], cacheable=True)
 
 
 @app.get("/posts/{post_id}", response_model=schemas.Post)
-def read_post(post_id: int, db: Session = Depends(get_db)):
-    db_post = crud.get_post(db, post_id=post_id)
-    if db_post is None:
-        raise HTTPException(status_code=404, detail="Post not found")
-    return db_post
+def read_post(post_id: int, request: Request, db: Session = Depends(get_db)):
+    variant = negotiate(request)
+    encoded = post_cache.get(post_id, variant)
+    if encoded is None:
+        generation = post_cache.generation
+        row = crud.get_post_row(db, post_id=post_id)
+        if row is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+        encoded = encode_payload(row._asdict(), *variant, etag=True)
+        post_cache.put(post_id, variant, encoded, generation)
+    return encoded_response(request, encoded)
 
 
 @app.delete("/posts/{post_id}")
@@ -194,6 +359,111 @@ def delete_post_by_id(
     raise HTTPException(status_code=500, detail="Failed to delete post")
 
 
+# Live Feed Endpoints
+@app.get("/feed/posts")
+async def stream_posts(request: Request, last_event_id: str | None = None):
+    """Server-sent events for created and deleted posts."""
+    resume_from = parse_event_id(request.headers.get("last-event-id") or last_event_id)
+    return StreamingResponse(
+        feed_hub.sse(resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.websocket("/feed/posts/ws")
+async def stream_posts_ws(websocket: WebSocket):
+    """The same feed as ``/feed/posts`` as JSON WebSocket messages."""
+    await websocket.accept()
+    resume_from = parse_event_id(websocket.query_params.get("last_event_id"))
+
+    async def send_events():
+        async for event in feed_hub.events(resume_from):
+            if event is not None:
+                await websocket.send_text(event.to_json())
+
+    async def wait_for_disconnect():
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    sender = asyncio.create_task(send_events())
+    receiver = asyncio.create_task(wait_for_disconnect())
+    done, pending = await asyncio.wait({sender, receiver}, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    if sender in done:
+        # Dropped as a slow consumer (or shutting down): ask the client to reconnect.
+        await websocket.close(code=1013)
+
+
+# Attachment Endpoints
+@app.post("/posts/{post_id}/attachments", response_model=schemas.Attachment)
+async def upload_attachment(
+    post_id: int,
+    filename: str,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user_from_cookie),
+    csrf_protect: CsrfProtect = Depends()
+):
+    """Store the raw request body as an attachment of the post.
+
+    The body is streamed to storage chunk by chunk and hashed on the way, so
+    uploads are never held in memory.
+    """
+    csrf_protect.validate_csrf(request)
+    db_post = await run_in_threadpool(crud.get_post, db, post_id)
+    if db_post is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    if db_post.owner_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to add attachments to this post")
+
+    max_size = get_settings().ATTACHMENT_MAX_BYTES
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > max_size:
+        raise HTTPException(status_code=413, detail="Attachment too large")
+    try:
+        blob = await get_storage().save(request.stream(), max_size=max_size)
+    except AttachmentTooLarge:
+        raise HTTPException(status_code=413, detail="Attachment too large")
+
+    return await run_in_threadpool(
+        crud.create_attachment,
+        db,
+        db_post,
+        filename=os.path.basename(filename) or "attachment",
+        content_type=request.headers.get("content-type", "application/octet-stream"),
+        size=blob.size,
+        sha256=blob.sha256,
+    )
+
+
+@app.get("/posts/{post_id}/attachments", response_model=list[schemas.Attachment])
+def read_attachments(post_id: int, db: Session = Depends(get_db)):
+    db_post = crud.get_post(db, post_id=post_id)
+    if db_post is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    return crud.get_attachments(db, db_post)
+
+
+@app.get("/posts/{post_id}/attachments/{attachment_id}")
+def download_attachment(post_id: int, attachment_id: int, request: Request, db: Session = Depends(get_db)):
+    db_post = crud.get_post(db, post_id=post_id)
+    if db_post is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    attachment = crud.get_attachment(db, db_post, attachment_id)
+    path = get_storage().local_path(attachment.sha256) if attachment else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    return attachment_response(
+        request,
+        path,
+        sha256=attachment.sha256,
+        media_type=attachment.content_type,
+        filename=attachment.filename,
+    )
+
+
 @app.post("/logout")
 def logout(response: Response, request: Request, csrf_protect: CsrfProtect = Depends()):
     csrf_protect.validate_csrf(request)
@@ -314,11 +584,15 @@ async def disable_mfa(
 
 # Modify login endpoint to require MFA if enabled
 @app.post("/login", dependencies=[Depends(RateLimiter(times=5, seconds=60))])
-def login(form_data: schemas.UserLogin, response: Response, db: Session = Depends(get_db), csrf_protect: CsrfProtect = Depends()):
+def login(form_data: schemas.UserLogin, response: Response, background_tasks: BackgroundTasks, db: Session = Depends(get_db), csrf_protect: CsrfProtect = Depends()):
     user = crud.get_user_by_username(db, form_data.username)
     if not user or not crud.verify_password(form_data.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
+    if crud.password_needs_rehash(user.hashed_password):
+        # Move the hash to the configured cost without delaying the response.
+        background_tasks.add_task(rehash_in_background, user.id, form_data.password, user.hashed_password)
+
     if user.mfa_enabled:
         # If MFA is enabled, require a TOTP code for full login
         if not form_data.mfa_code:
@@ -0,0 +1,194 @@
+"""Schema migration and index-coverage commands.
+
+Usage::
+
+    python -m app.migrate upgrade            # apply all pending migrations
+    python -m app.migrate downgrade 0001     # roll back to a revision
+    python -m app.migrate current            # show the applied revision
+    python -m app.migrate stamp 0001         # adopt a database made by create_all
+    python -m app.migrate check-plans        # EXPLAIN the queries crud.py issues
+
+``check-plans`` runs each probe in :data:`PLAN_PROBES` against the configured
+database, captures the SQL it emits and prints its query plan. Sequential
+scans over tables with at least ``--min-rows`` rows are reported and make the
+command exit non-zero, so it can gate CI against a production-sized copy.
+"""
+
+import argparse
+import sys
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import archive, crud
+from .database import SQLALCHEMY_DATABASE_URL, engine as default_engine
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+# Queries issued by crud.py, each run with representative arguments. The
+# lean row queries serve GET /posts/ and GET /posts/{post_id}; ids that are
+# not hot fall through to the archive lookups.
+PLAN_PROBES: List[Tuple[str, Callable[[Session], Any]]] = [
+    ("get_user_by_username", lambda db: crud.get_user_by_username(db, "plan-probe")),
+    ("get_posts", lambda db: crud.get_posts(db, skip=0, limit=100)),
+    ("get_post", lambda db: crud.get_post(db, post_id=1)),
+    ("get_post_rows", lambda db: crud.get_post_rows(db, skip=0, limit=100)),
+    ("get_post_rows_after_id", lambda db: crud.get_post_rows(db, limit=100, after_id=1)),
+    ("get_post_rows_by_id", lambda db: crud._get_post_rows_by_id(db, [-1, -2])),
+    ("archived_post", lambda db: archive.archived_post(db, -1)),
+]
+
+
+def alembic_config(url: Optional[str] = None) -> Config:
+    """Return an Alembic config pointing at the bundled migrations."""
+    cfg = Config()
+    cfg.set_main_option("script_location", str(MIGRATIONS_DIR))
+    cfg.set_main_option("sqlalchemy.url", url or SQLALCHEMY_DATABASE_URL)
+    return cfg
+
+
+def upgrade(revision: str = "head", url: Optional[str] = None) -> None:
+    command.upgrade(alembic_config(url), revision)
+
+
+def downgrade(revision: str, url: Optional[str] = None) -> None:
+    command.downgrade(alembic_config(url), revision)
+
+
+@dataclass
+class QueryPlan:
+    probe: str
+    statement: str
+    plan: List[str]
+    seq_scans: List[str] = field(default_factory=list)
+
+
+def _capture_statements(engine: Engine, probe: Callable[[Session], Any]) -> List[Tuple[str, Any]]:
+    captured: List[Tuple[str, Any]] = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    db = Session(bind=engine)
+    try:
+        probe(db)
+    finally:
+        db.rollback()
+        db.close()
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return captured
+
+
+def _explain(engine: Engine, statement: str, parameters: Any) -> Tuple[List[str], List[str]]:
+    """Return the plan lines and the tables read by a full sequential scan."""
+    with engine.connect() as conn:
+        if engine.dialect.name == "sqlite":
+            rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            lines = [row[-1] for row in rows]
+            # "SCAN posts" is a full scan; "SEARCH ..." and covering index
+            # scans mention the index they use.
+            scans = [
+                line.split()[1]
+                for line in lines
+                if line.startswith("SCAN ") and " USING " not in line
+            ]
+            if scans and _is_ordered_walk(statement, lines):
+                # Unfiltered ``ORDER BY id LIMIT n``: the rowid walk stops
+                # after n rows (plus the offset) instead of reading the table.
+                scans = scans[1:]
+        else:
+            rows = conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).all()
+            lines = [row[0] for row in rows]
+            scans = [
+                line.split("Seq Scan on ", 1)[1].split()[0]
+                for line in lines
+                if "Seq Scan on " in line
+            ]
+    return lines, scans
+
+
+def _is_ordered_walk(statement: str, lines: List[str]) -> bool:
+    sql = " ".join(statement.upper().split())
+    return (
+        " WHERE " not in sql
+        and " ORDER BY " in sql
+        and " LIMIT " in sql
+        and not any("TEMP B-TREE" in line for line in lines)
+    )
+
+
+def _table_rows(engine: Engine, table: str) -> int:
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            # Planner estimate: avoids a full count on large tables.
+            estimate = conn.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE relname = :t"),
+                {"t": table},
+            ).scalar()
+            return max(int(estimate or 0), 0)
+        return int(conn.execute(text(f'SELECT count(*) FROM "{table}"')).scalar() or 0)
+
+
+def check_query_plans(
+    engine: Engine = default_engine,
+    *,
+    min_rows: int = 10_000,
+    probes: Sequence[Tuple[str, Callable[[Session], Any]]] = PLAN_PROBES,
+) -> List[QueryPlan]:
+    """EXPLAIN every probe's SQL and flag sequential scans on large tables."""
+    plans = []
+    for name, probe in probes:
+        for statement, parameters in _capture_statements(engine, probe):
+            lines, scans = _explain(engine, statement, parameters)
+            flagged = [table for table in scans if _table_rows(engine, table) >= min_rows]
+            plans.append(QueryPlan(name, statement, lines, flagged))
+    return plans
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Database migrations")
+    sub = parser.add_subparsers(dest="command", required=True)
+    up = sub.add_parser("upgrade", help="apply migrations")
+    up.add_argument("revision", nargs="?", default="head")
+    down = sub.add_parser("downgrade", help="revert migrations")
+    down.add_argument("revision")
+    sub.add_parser("current", help="show the applied revision")
+    sub.add_parser("history", help="list revisions")
+    stamp = sub.add_parser("stamp", help="record a revision without running it")
+    stamp.add_argument("revision")
+    plans = sub.add_parser("check-plans", help="EXPLAIN crud queries")
+    plans.add_argument("--min-rows", type=int, default=10_000)
+    args = parser.parse_args(argv)
+
+    cfg = alembic_config()
+    if args.command == "upgrade":
+        upgrade(args.revision)
+    elif args.command == "downgrade":
+        downgrade(args.revision)
+    elif args.command == "current":
+        command.current(cfg, verbose=True)
+    elif args.command == "history":
+        command.history(cfg)
+    elif args.command == "stamp":
+        command.stamp(cfg, args.revision)
+    else:
+        failed = False
+        for plan in check_query_plans(min_rows=args.min_rows):
+            status = "SEQ SCAN " + ", ".join(plan.seq_scans) if plan.seq_scans else "ok"
+            print(f"[{status}] {plan.probe}: {' '.join(plan.statement.split())}")
+            for line in plan.plan:
+                print(f"    {line}")
+            failed = failed or bool(plan.seq_scans)
+        return 1 if failed else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+"""Post creation time and the post archive table.
+
+Existing posts get the migration time as ``created_at``, so they only become
+eligible for archival once that time is older than the archival threshold.
+
+On SQLite ``posts`` is rebuilt with AUTOINCREMENT so that archiving the
+newest posts cannot hand their ids to new ones.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, Sequence[str], None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("posts", sa.Column("created_at", sa.DateTime(), nullable=True))
+    op.execute("UPDATE posts SET created_at = CURRENT_TIMESTAMP")
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    with op.batch_alter_table(
+        "posts",
+        recreate="always" if sqlite else "auto",
+        table_kwargs={"sqlite_autoincrement": True},
+    ) as batch_op:
+        batch_op.alter_column("created_at", existing_type=sa.DateTime(), nullable=False)
+    op.create_index("ix_posts_created_at", "posts", ["created_at"])
+
+    op.create_table(
+        "post_archive",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("owner_id", sa.Integer(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("archived_at", sa.DateTime(), nullable=False),
+        sa.Column("payload", sa.LargeBinary(), nullable=False),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_post_archive_owner_id", "post_archive", ["owner_id"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_post_archive_owner_id", table_name="post_archive")
+    op.drop_table("post_archive")
+    op.drop_index("ix_posts_created_at", table_name="posts")
+    with op.batch_alter_table("posts") as batch_op:
+        batch_op.drop_column("created_at")
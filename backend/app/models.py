@@ -1,4 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Boolean
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, Column, DateTime, Integer, LargeBinary, String, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -22,5 +24,44 @@ class Post(Base):
     title = Column(String, index=True, nullable=False)
     content = Column(String, nullable=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    created_at = Column(
+        DateTime,
+        nullable=False,
+        index=True,
+        default=lambda: datetime.now(timezone.utc).replace(tzinfo=None),
+    )
 
     owner = relationship("User", back_populates="posts")
+
+    # AUTOINCREMENT on SQLite: ids of archived (or deleted) posts are never reused.
+    __table_args__ = (Index("ix_posts_owner_id_id", "owner_id", "id"), {"sqlite_autoincrement": True})
+
+class Attachment(Base):
+    __tablename__ = 'attachments'
+
+    id = Column(Integer, primary_key=True, index=True)
+    post_id = Column(Integer, ForeignKey("posts.id"), index=True, nullable=False)
+    filename = Column(String, nullable=False)
+    content_type = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    # Blob key in app.storage; identical uploads share one blob.
+    sha256 = Column(String(64), index=True, nullable=False)
+
+# Cold storage for old posts (see app.archive). Title and content are kept as
+# one zlib-compressed JSON document; rows are only ever inserted or deleted.
+class PostArchive(Base):
+    __tablename__ = 'post_archive'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    owner_id = Column(Integer, ForeignKey("users.id"), index=True)
+    created_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, nullable=False)
+    payload = Column(LargeBinary, nullable=False)
+
+# Ticket table on the primary database that hands out globally unique post
+# ids when posts are sharded across databases (see app.sharding).
+class PostIdTicket(Base):
+    __tablename__ = 'post_id_tickets'
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
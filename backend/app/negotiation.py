@@ -0,0 +1,201 @@
+"""Content negotiation and compression for read endpoints.
+
+``negotiated_response`` encodes a payload as JSON or MessagePack depending on
+the ``Accept`` header and compresses it with Brotli or gzip according to
+``Accept-Encoding`` once it is larger than ``COMPRESSION_MIN_SIZE`` bytes.
+For cacheable payloads the compressed body is kept in a small LRU keyed by
+the digest of the encoded body, so identical pages are compressed only once,
+and the digest doubles as a weak ``ETag`` (weak because the same entity is
+served under several content codings).
+
+Callers that keep responses themselves (``app.postcache``) use the two
+halves directly: ``encode_payload`` returns an :class:`EncodedBody` with the
+final bytes and ETag, and ``encoded_response`` serves one.
+"""
+
+import gzip
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import Request, Response
+
+from .config import get_settings
+
+try:
+    import msgpack  # type: ignore
+except ModuleNotFoundError:  # pragma: no cover - optional dependency
+    msgpack = None  # type: ignore
+
+try:
+    import brotli  # type: ignore
+except ModuleNotFoundError:  # pragma: no cover - optional dependency
+    brotli = None  # type: ignore
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+settings = get_settings()
+
+_compressed_cache: "OrderedDict[Tuple[bytes, str], bytes]" = OrderedDict()
+cache_stats = {"hits": 0, "misses": 0}
+
+
+def post_payload(post: Any) -> Dict[str, Any]:
+    """Return the public fields of a post as a plain dict."""
+    return {
+        "id": post.id,
+        "title": post.title,
+        "content": post.content,
+        "owner_id": post.owner_id,
+    }
+
+
+def _parse_header(value: str) -> List[Tuple[str, float]]:
+    """Split an ``Accept``-style header into ``(token, q)`` pairs."""
+    items = []
+    for part in value.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            name, _, raw = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = min(max(float(raw.strip()), 0.0), 1.0)
+                except ValueError:
+                    q = 0.0
+        if token:
+            items.append((token.strip().lower(), q))
+    return items
+
+
+def choose_media_type(accept: Optional[str]) -> str:
+    """Return MessagePack if the client prefers it and it is available."""
+    if not accept or msgpack is None:
+        return JSON_MEDIA_TYPE
+    best_json = best_msgpack = 0.0
+    for token, q in _parse_header(accept):
+        if token in MSGPACK_MEDIA_TYPES:
+            best_msgpack = max(best_msgpack, q)
+        elif token in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            best_json = max(best_json, q)
+    if best_msgpack > 0 and best_msgpack >= best_json:
+        return MSGPACK_MEDIA_TYPES[0]
+    return JSON_MEDIA_TYPE
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Return ``"br"``, ``"gzip"`` or ``None`` for an ``Accept-Encoding`` value.
+
+    The coding with the highest q-value wins, Brotli on a tie; ``q=0``
+    refuses a coding, and ``*`` stands for the codings not listed.
+    """
+    if not accept_encoding:
+        return None
+    listed: Dict[str, float] = {}
+    for token, q in _parse_header(accept_encoding):
+        listed[token] = max(q, listed.get(token, 0.0))
+    wildcard = listed.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in ("br", "gzip") if brotli is not None else ("gzip",):
+        q = listed.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of ``etag`` against an ``If-None-Match`` list."""
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+def encode_body(payload: Any, media_type: str) -> bytes:
+    if media_type == JSON_MEDIA_TYPE:
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def _cached_compress(digest: bytes, body: bytes, encoding: str) -> bytes:
+    key = (digest, encoding)
+    compressed = _compressed_cache.get(key)
+    if compressed is not None:
+        _compressed_cache.move_to_end(key)
+        cache_stats["hits"] += 1
+        return compressed
+    cache_stats["misses"] += 1
+    compressed = compress(body, encoding)
+    _compressed_cache[key] = compressed
+    if len(_compressed_cache) > settings.COMPRESSED_CACHE_ENTRIES:
+        _compressed_cache.popitem(last=False)
+    return compressed
+
+
+@dataclass(frozen=True)
+class EncodedBody:
+    content: bytes
+    media_type: str
+    encoding: Optional[str]  # the Content-Encoding applied, None if sent as is
+    etag: Optional[str] = None
+
+
+def negotiate(request: Request) -> Tuple[str, Optional[str]]:
+    """The media type and content coding the request asks for."""
+    return choose_media_type(request.headers.get("accept")), choose_encoding(request.headers.get("accept-encoding"))
+
+
+def encode_payload(
+    payload: Any,
+    media_type: str,
+    encoding: Optional[str],
+    *,
+    etag: bool = False,
+    reuse_compressed: bool = False,
+) -> EncodedBody:
+    """Encode ``payload`` and compress it with ``encoding`` if it is large enough.
+
+    ``reuse_compressed`` looks the compressed body up in the shared LRU
+    first; callers that keep the result themselves leave it off.
+    """
+    body = encode_body(payload, media_type)
+    digest = hashlib.blake2b(body, digest_size=16).digest() if etag or reuse_compressed else None
+    tag = f'W/"{digest.hex()}"' if etag else None
+    if not encoding or len(body) < settings.COMPRESSION_MIN_SIZE:
+        return EncodedBody(body, media_type, None, tag)
+    body = _cached_compress(digest, body, encoding) if reuse_compressed else compress(body, encoding)
+    return EncodedBody(body, media_type, encoding, tag)
+
+
+def encoded_response(request: Request, encoded: EncodedBody) -> Response:
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if encoded.etag is not None:
+        headers["ETag"] = encoded.etag
+        if _etag_matches(request.headers.get("if-none-match", ""), encoded.etag):
+            return Response(status_code=304, headers=headers)
+    if encoded.encoding is not None:
+        headers["Content-Encoding"] = encoded.encoding
+    return Response(content=encoded.content, media_type=encoded.media_type, headers=headers)
+
+
+def negotiated_response(request: Request, payload: Any, *, cacheable: bool = False) -> Response:
+    """Encode and compress ``payload`` according to the request headers."""
+    media_type, encoding = negotiate(request)
+    encoded = encode_payload(payload, media_type, encoding, etag=cacheable, reuse_compressed=cacheable)
+    return encoded_response(request, encoded)
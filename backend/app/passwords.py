@@ -0,0 +1,104 @@
+"""Password hash cost calibration and background rehashing.
+
+``python -m app.passwords calibrate --target-ms 250`` measures bcrypt on
+the current machine and prints the highest ``PASSWORD_HASH_ROUNDS`` whose
+hash time stays within the latency budget. After the setting changes, each
+user's hash is brought to the new cost by :func:`rehash_in_background` the
+next time they log in, so the cost can move in either direction without
+forcing password resets.
+"""
+
+import argparse
+import math
+import statistics
+import time
+from typing import Callable, Optional
+
+import structlog
+from passlib.hash import bcrypt
+
+from . import crud
+from .database import SessionLocal
+
+log = structlog.get_logger()
+
+# bcrypt's cost is a power of two; below 10 it is too cheap to be useful.
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+
+
+def measure_hash_seconds(rounds: int, samples: int = 3) -> float:
+    """Median wall time of hashing a password at ``rounds``."""
+    hasher = bcrypt.using(rounds=rounds)
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        hasher.hash("calibration-password")
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+
+def calibrate_rounds(
+    target_ms: float,
+    *,
+    min_rounds: int = MIN_ROUNDS,
+    max_rounds: int = MAX_ROUNDS,
+    measure: Callable[[int], float] = measure_hash_seconds,
+) -> int:
+    """Return the highest cost whose hash time fits within ``target_ms``.
+
+    Each extra round doubles the work, so one measurement at ``min_rounds``
+    predicts the rest; the prediction is then verified and stepped down
+    while it overshoots. ``min_rounds`` is returned even if it is over budget.
+    """
+    target = target_ms / 1000
+    base = measure(min_rounds)
+    rounds = min_rounds
+    if base < target:
+        rounds = min(max_rounds, min_rounds + int(math.floor(math.log2(target / base))))
+    while rounds > min_rounds and measure(rounds) > target:
+        rounds -= 1
+    return rounds
+
+
+def rehash_in_background(user_id: int, plain_password: str, old_hash: str) -> None:
+    """Re-hash a password at the configured cost after a successful login.
+
+    Runs as a FastAPI background task with its own session, after the login
+    response has been sent.
+    """
+    db = SessionLocal()
+    try:
+        if crud.rehash_user_password(db, user_id, plain_password, old_hash):
+            log.info("Password rehashed", user_id=user_id)
+    except Exception as exc:
+        log.exception("Password rehash failed", user_id=user_id, exc_info=exc)
+    finally:
+        db.close()
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Password hashing tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    calibrate = sub.add_parser("calibrate", help="pick bcrypt rounds for a latency budget")
+    calibrate.add_argument("--target-ms", type=float, default=250.0)
+    calibrate.add_argument("--min-rounds", type=int, default=MIN_ROUNDS)
+    calibrate.add_argument("--max-rounds", type=int, default=MAX_ROUNDS)
+    args = parser.parse_args(argv)
+
+    measured = {}
+
+    def measure(rounds: int) -> float:
+        measured[rounds] = measure_hash_seconds(rounds)
+        return measured[rounds]
+
+    rounds = calibrate_rounds(
+        args.target_ms, min_rounds=args.min_rounds, max_rounds=args.max_rounds, measure=measure
+    )
+    for r, seconds in sorted(measured.items()):
+        print(f"rounds={r:<3} {seconds * 1000:8.1f} ms")
+    print(f"PASSWORD_HASH_ROUNDS={rounds}")
+
+
+if __name__ == "__main__":
+    main()
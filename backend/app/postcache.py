@@ -0,0 +1,186 @@
+"""Per-worker cache of encoded responses for ``GET /posts/{post_id}``.
+
+Entries are the final response bodies (``negotiation.EncodedBody``: encoded
+and, when large enough, compressed, with their ETag), one per post and
+variant, the negotiated ``(media type, content coding)`` pair. They are kept
+in LRU order and bounded by ``POST_CACHE_MAX_BYTES``, counting the body and
+ETag bytes plus a fixed per-entry overhead, so a hit needs no query, no
+encoding and no compression.
+
+``crud.delete_post`` invalidates the entry locally and publishes the id on
+the ``posts:invalidate`` broker channel so every worker drops it. Missed
+messages are covered in layers: a sequence gap or re-subscribe clears the
+whole cache; every ``POST_CACHE_VERSION_CHECK_SECONDS`` the worker compares
+its last seen sequence number with the channel's latest one (the version)
+and clears the cache if it fell behind; and entries expire after
+``POST_CACHE_TTL`` seconds in case the broker was unreachable when the
+delete was published.
+"""
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Set, Tuple
+
+import structlog
+
+from .broker import Broker, Subscriber, get_broker, try_publish
+from .config import get_settings
+from .negotiation import EncodedBody
+
+log = structlog.get_logger()
+
+CHANNEL = "posts:invalidate"
+ENTRY_OVERHEAD = 240  # key, EncodedBody and bookkeeping, roughly, per entry
+
+Variant = Tuple[str, Optional[str]]  # negotiated media type and content coding
+Key = Tuple[int, str, Optional[str]]
+
+
+class PostCache:
+    def __init__(
+        self,
+        max_bytes: int = 16 * 1024 * 1024,
+        *,
+        ttl: float = 300.0,
+        version_check_interval: float = 1.0,
+        broker: Optional[Broker] = None,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self._broker = broker
+        self._entries: "OrderedDict[Key, Tuple[EncodedBody, int, float]]" = OrderedDict()
+        self._variants: Dict[int, Set[Key]] = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        # Bumped on every invalidation; a read that started before one must not fill.
+        self.generation = 0
+        self._subscriber = Subscriber(CHANNEL, self._on_message, on_gap=self.clear, broker=broker)
+        self._checked_seq = 0
+        self._version_task: Optional[asyncio.Task] = None
+        self._version_check_failing = False
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0, "expired": 0, "clears": 0}
+
+    @classmethod
+    def from_settings(cls, settings) -> "PostCache":
+        return cls(
+            settings.POST_CACHE_MAX_BYTES,
+            ttl=settings.POST_CACHE_TTL,
+            version_check_interval=settings.POST_CACHE_VERSION_CHECK_SECONDS,
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    async def start(self) -> None:
+        if not self.enabled:
+            return
+        await self._subscriber.start()
+        if self._version_task is None:
+            self._version_task = asyncio.create_task(self._check_versions())
+
+    async def stop(self) -> None:
+        await self._subscriber.stop()
+        if self._version_task is not None:
+            self._version_task.cancel()
+            try:
+                await self._version_task
+            except asyncio.CancelledError:
+                pass
+            self._version_task = None
+
+    def get(self, post_id: int, variant: Variant) -> Optional[EncodedBody]:
+        key = (post_id, *variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            encoded, size, expires = entry
+            if expires <= time.monotonic():
+                self._remove(key)
+                self.stats["expired"] += 1
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return encoded
+
+    def put(self, post_id: int, variant: Variant, encoded: EncodedBody, generation: int) -> None:
+        """Cache ``encoded`` unless an invalidation happened since ``generation`` was read."""
+        if not self.enabled:
+            return
+        size = len(encoded.content) + len(encoded.etag or "") + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return
+        key = (post_id, *variant)
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._remove(key)
+            self._entries[key] = (encoded, size, time.monotonic() + self.ttl)
+            self._variants.setdefault(post_id, set()).add(key)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def _remove(self, key: Key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._bytes -= entry[1]
+        variants = self._variants[key[0]]
+        variants.discard(key)
+        if not variants:
+            del self._variants[key[0]]
+
+    def invalidate(self, post_id: int) -> None:
+        with self._lock:
+            self.generation += 1
+            for key in list(self._variants.get(post_id, ())):
+                self._remove(key)
+            self.stats["invalidations"] += 1
+
+    def invalidate_everywhere(self, post_id: int) -> None:
+        """Drop the post here and publish the invalidation to the other workers."""
+        self.invalidate(post_id)
+        try_publish(CHANNEL, str(post_id))
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._variants.clear()
+            self._bytes = 0
+            self.stats["clears"] += 1
+
+    def _on_message(self, seq: int, data: str) -> None:
+        self.invalidate(int(data))
+
+    async def _check_versions(self) -> None:
+        broker = self._broker or get_broker()
+        while True:
+            await asyncio.sleep(self.version_check_interval)
+            try:
+                latest = await broker.latest_seq(CHANNEL)
+            except Exception as exc:
+                if not self._version_check_failing:
+                    log.warning("Post cache version check failed", error=str(exc))
+                self._version_check_failing = True
+                continue
+            self._version_check_failing = False
+            if latest > max(self._subscriber.last_seq, self._checked_seq):
+                log.warning("Post cache behind invalidations, clearing", latest=latest, seen=self._subscriber.last_seq)
+                self.clear()
+            self._checked_seq = latest
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.stats, "entries": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes}
+
+
+post_cache = PostCache.from_settings(get_settings())
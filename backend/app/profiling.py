@@ -0,0 +1,209 @@
+"""On-demand sampling profiler for production requests.
+
+An admin arms the profiler for the next N requests whose path starts with a
+prefix and/or that carry a header. While at least one such request is in
+flight, a background thread samples stacks with ``sys._current_frames()``
+and counts those of the claimed requests only; when none is in flight the
+thread exits. A claimed request is recognised on the event loop thread by
+its middleware frame being on the stack, and on threadpool threads (sync
+endpoints and dependencies) by the claim stored in the context the worker
+runs the call in, so concurrent unprofiled requests stay out of the
+profile. The counts are served in the collapsed-stack format
+(``frame;frame;frame count``) that ``flamegraph.pl``, speedscope and inferno
+read, plus a per-function summary.
+
+When the profiler is not armed, :class:`ProfilingMiddleware` only checks a
+boolean and no thread runs. Arming is per worker process; to profile
+across workers, arm each one or route the probe requests to one worker.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import Context, ContextVar
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+Stack = Tuple[str, ...]
+
+
+class _Claim:
+    """One profiled request: its middleware frame on the event loop thread."""
+
+    def __init__(self, frame):
+        self.frame = frame
+
+
+_claim: ContextVar[Optional[_Claim]] = ContextVar("profiler_claim", default=None)
+
+
+@dataclass
+class ProfileTarget:
+    requests: int
+    path_prefix: Optional[str] = None
+    header_name: Optional[str] = None
+    header_value: Optional[str] = None
+    interval: float = 0.005
+
+    def matches(self, scope: Dict[str, Any]) -> bool:
+        if self.path_prefix is not None and not scope["path"].startswith(self.path_prefix):
+            return False
+        if self.header_name is not None:
+            wanted = self.header_name.lower().encode()
+            values = [value for name, value in scope["headers"] if name == wanted]
+            if not values:
+                return False
+            if self.header_value is not None and self.header_value.encode() not in values:
+                return False
+        return True
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _claimed(frame, claims: List[_Claim]) -> bool:
+    """Whether the stack ending in ``frame`` runs one of ``claims``."""
+    frames = {id(claim.frame) for claim in claims}
+    while frame is not None:
+        if id(frame) in frames:
+            return True
+        # Threadpool workers (anyio) run each call as ``context.run(...)``
+        # with the request's copied context in a local named ``context``.
+        if "context" in frame.f_code.co_varnames:
+            context = frame.f_locals.get("context")
+            if isinstance(context, Context):
+                return context.get(_claim) in claims
+        frame = frame.f_back
+    return False
+
+
+def _stack(frame) -> Stack:
+    labels: List[str] = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    return tuple(reversed(labels))
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.armed = False
+        self._target: Optional[ProfileTarget] = None
+        self._lock = threading.Lock()
+        self._claims: List[_Claim] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stacks: Counter = Counter()
+        self.samples = 0
+        self.profiled_requests = 0
+
+    def arm(self, target: ProfileTarget) -> None:
+        """Start a new session; samples from the previous one are discarded."""
+        with self._lock:
+            self._target = target
+            self._stacks = Counter()
+            self.samples = 0
+            self.profiled_requests = 0
+            self.armed = target.requests > 0
+
+    def disarm(self) -> None:
+        with self._lock:
+            self.armed = False
+
+    def claim(self, scope: Dict[str, Any], frame) -> Optional[_Claim]:
+        """Count the request against the armed budget if it matches.
+
+        ``frame`` is the caller's frame; stacks through it are sampled.
+        """
+        with self._lock:
+            target = self._target
+            if not self.armed or target is None or not target.matches(scope):
+                return None
+            target.requests -= 1
+            self.armed = target.requests > 0
+            self.profiled_requests += 1
+            claim = _Claim(frame)
+            self._claims.append(claim)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._sample_loop, args=(target.interval,), name="profiler", daemon=True
+                )
+                self._thread.start()
+            return claim
+
+    def release(self, claim: _Claim) -> None:
+        with self._lock:
+            self._claims.remove(claim)
+
+    def _sample_loop(self, interval: float) -> None:
+        own_id = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._claims:
+                    self._thread = None
+                    return
+                claims = list(self._claims)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id and _claimed(frame, claims):
+                    self._stacks[_stack(frame)] += 1
+            self.samples += 1
+            time.sleep(interval)
+
+    def collapsed(self) -> str:
+        """Folded stacks, one ``frame;...;frame count`` line each."""
+        # dict() takes an atomic snapshot while the sampler may still be adding.
+        stacks = dict(self._stacks)
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in sorted(stacks.items()))
+
+    def summary(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """Hottest functions: ``self_ms`` at the top of the stack, ``total_ms`` anywhere in it."""
+        interval = self._target.interval if self._target else 0.0
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in dict(self._stacks).items():
+            own[stack[-1]] += count
+            for label in set(stack):
+                total[label] += count
+        return [
+            {
+                "function": label,
+                "self_ms": round(own[label] * interval * 1000, 1),
+                "total_ms": round(total[label] * interval * 1000, 1),
+            }
+            for label in sorted(total, key=lambda label: (own[label], total[label]), reverse=True)[:limit]
+        ]
+
+    def status(self) -> Dict[str, Any]:
+        target = self._target
+        return {
+            "armed": self.armed,
+            "remaining_requests": target.requests if target else 0,
+            "profiled_requests": self.profiled_requests,
+            "samples": self.samples,
+            "top_functions": self.summary(),
+        }
+
+
+class ProfilingMiddleware:
+    """Runs matching requests under the profiler while it is armed."""
+
+    def __init__(self, app, profiler: SamplingProfiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        claim = None
+        if self.profiler.armed and scope["type"] == "http":
+            claim = self.profiler.claim(scope, sys._getframe())
+        if claim is None:
+            await self.app(scope, receive, send)
+            return
+        # Calls the request hands to the threadpool carry the claim along.
+        token = _claim.set(claim)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _claim.reset(token)
+            self.profiler.release(claim)
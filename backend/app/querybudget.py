@@ -0,0 +1,197 @@
+"""Per-request SQL query counting, budgets and N+1 detection.
+
+``QueryMonitor.install`` hooks ``before_cursor_execute`` on an engine. While
+a :class:`QueryRecorder` is active in the current context (a request handled
+by :class:`QueryBudgetMiddleware`, or a ``with monitor.record()`` block),
+every statement is appended to it; otherwise the hook returns immediately.
+
+Requests are recorded when ``QUERY_BUDGET_ENABLED`` is set (staging) or while
+a test holds ``monitor.capture()``. A request that issues more statements
+than its endpoint's budget, or repeats the same parameterized statement
+``QUERY_REPEAT_THRESHOLD`` times (the N+1 shape), is logged together with the
+application stack locations that issued the statements. Tests assert on the
+captured :class:`RequestQueries` instead.
+"""
+
+import os
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import structlog
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+log = structlog.get_logger()
+
+# Statement budgets for endpoints, keyed by "METHOD /path/template".
+ENDPOINT_BUDGETS: Dict[str, int] = {
+    "GET /users/me": 1,
+    "GET /posts/": 1,
+    "GET /posts/{post_id}": 1,
+}
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_recorder: ContextVar[Optional["QueryRecorder"]] = ContextVar("query_recorder", default=None)
+
+
+@dataclass
+class RecordedQuery:
+    statement: str
+    location: Tuple[str, ...] = ()
+
+
+@dataclass
+class QueryRecorder:
+    capture_stacks: bool = False
+    queries: List[RecordedQuery] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.queries)
+
+    def repeated(self, threshold: int) -> Dict[str, int]:
+        """Statements issued at least ``threshold`` times."""
+        counts = Counter(query.statement for query in self.queries)
+        return {statement: n for statement, n in counts.items() if n >= threshold}
+
+
+@dataclass
+class RequestQueries:
+    endpoint: str
+    recorder: QueryRecorder
+    budget: int
+
+    @property
+    def count(self) -> int:
+        return self.recorder.count
+
+
+def _app_stack() -> Tuple[str, ...]:
+    frames = [
+        f"{os.path.relpath(frame.filename, _APP_DIR)}:{frame.lineno} in {frame.name}"
+        for frame in traceback.extract_stack()
+        if frame.filename.startswith(_APP_DIR) and frame.filename != __file__
+    ]
+    return tuple(frames[-4:])
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    recorder = _recorder.get()
+    if recorder is None:
+        return
+    location = _app_stack() if recorder.capture_stacks else ()
+    recorder.queries.append(RecordedQuery(statement, location))
+
+
+class QueryMonitor:
+    def __init__(self, *, enabled: bool = False, default_budget: int = 20, repeat_threshold: int = 3):
+        self.enabled = enabled
+        self.default_budget = default_budget
+        self.repeat_threshold = repeat_threshold
+        self._captures: List[List[RequestQueries]] = []
+        self._endpoints: Dict[Any, str] = {}
+        self.violations = 0
+
+    @classmethod
+    def from_settings(cls, settings) -> "QueryMonitor":
+        return cls(
+            enabled=settings.QUERY_BUDGET_ENABLED,
+            default_budget=settings.QUERY_BUDGET_DEFAULT,
+            repeat_threshold=settings.QUERY_REPEAT_THRESHOLD,
+        )
+
+    @staticmethod
+    def install(engine: Engine) -> None:
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+
+    @property
+    def active(self) -> bool:
+        return self.enabled or bool(self._captures)
+
+    @contextmanager
+    def record(self, capture_stacks: bool = False) -> Iterator[QueryRecorder]:
+        recorder = QueryRecorder(capture_stacks)
+        token = _recorder.set(recorder)
+        try:
+            yield recorder
+        finally:
+            _recorder.reset(token)
+
+    @contextmanager
+    def capture(self) -> Iterator[List[RequestQueries]]:
+        """Collect the queries of every request handled inside the block."""
+        results: List[RequestQueries] = []
+        self._captures.append(results)
+        try:
+            yield results
+        finally:
+            self._captures.remove(results)
+
+    def endpoint_name(self, scope: Dict[str, Any]) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            # Unrouted (404) or rejected before routing: the raw path, not
+            # cached, so arbitrary paths cannot grow the table.
+            return f"{scope['method']} {scope['path']}"
+        if endpoint not in self._endpoints:
+            path = next(
+                (route.path for route in scope["app"].routes if getattr(route, "endpoint", None) is endpoint),
+                scope["path"],
+            )
+            self._endpoints[endpoint] = path
+        return f"{scope['method']} {self._endpoints[endpoint]}"
+
+    def finish(self, scope: Dict[str, Any], recorder: QueryRecorder) -> None:
+        endpoint = self.endpoint_name(scope)
+        result = RequestQueries(endpoint, recorder, ENDPOINT_BUDGETS.get(endpoint, self.default_budget))
+        for results in self._captures:
+            results.append(result)
+        if self.enabled:
+            self._report(result)
+
+    def _report(self, result: RequestQueries) -> None:
+        recorder = result.recorder
+        if recorder.count > result.budget:
+            self.violations += 1
+            log.warning(
+                "Query budget exceeded",
+                endpoint=result.endpoint,
+                queries=recorder.count,
+                budget=result.budget,
+                locations=sorted({q.location[-1] for q in recorder.queries if q.location}),
+            )
+        for statement, n in recorder.repeated(self.repeat_threshold).items():
+            self.violations += 1
+            log.warning(
+                "Repeated query, possible N+1",
+                endpoint=result.endpoint,
+                statement=statement,
+                times=n,
+                locations=sorted({q.location for q in recorder.queries if q.statement == statement}),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "violations": self.violations}
+
+
+class QueryBudgetMiddleware:
+    """Records the statements of each HTTP request while the monitor is active."""
+
+    def __init__(self, app, monitor: QueryMonitor):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.monitor.active:
+            await self.app(scope, receive, send)
+            return
+        with self.monitor.record(capture_stacks=self.monitor.enabled) as recorder:
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.monitor.finish(scope, recorder)
@@ -0,0 +1,54 @@
+"""Process-wide Redis clients shared by the rate limiter and other features."""
+
+from typing import Optional
+
+import redis
+from redis.asyncio import Redis
+
+from .config import get_settings
+
+_redis: Optional[Redis] = None
+_sync_redis: Optional[redis.Redis] = None
+
+
+def get_redis() -> Redis:
+    """Return the Redis client for this process, creating it on first use."""
+    global _redis
+    if _redis is None:
+        _redis = Redis.from_url(
+            get_settings().REDIS_URL, encoding="utf-8", decode_responses=True
+        )
+    return _redis
+
+
+def get_sync_redis() -> redis.Redis:
+    """Return a blocking client for code that runs in worker threads (e.g. crud)."""
+    global _sync_redis
+    if _sync_redis is None:
+        _sync_redis = redis.Redis.from_url(
+            get_settings().REDIS_URL, encoding="utf-8", decode_responses=True
+        )
+    return _sync_redis
+
+
+async def close_redis() -> None:
+    """Close the client's connection pool, e.g. on application shutdown."""
+    global _redis, _sync_redis
+    if _redis is not None:
+        await _redis.close()
+        _redis = None
+    if _sync_redis is not None:
+        _sync_redis.close()
+        _sync_redis = None
+
+
+def reset_redis() -> None:
+    """Forget the client inherited from a parent process after ``fork()``.
+
+    Sockets opened by the parent must not be shared with the child, so the
+    reference is dropped without closing it; the next ``get_redis()`` call
+    opens fresh connections in the worker.
+    """
+    global _redis, _sync_redis
+    _redis = None
+    _sync_redis = None
@@ -24,6 +24,17 @@ class Post(PostBase):
     class Config:
         orm_mode = True
 
+class Attachment(BaseModel):
+    id: int
+    post_id: int
+    filename: str
+    content_type: str
+    size: int
+    sha256: str
+
+    class Config:
+        orm_mode = True
+
 class GoogleIdToken(BaseModel):
     id_token_str: str
 
@@ -41,3 +52,10 @@ class UserOut(BaseModel):
 
     class Config:
         orm_mode = True
+
+class ProfileRequest(BaseModel):
+    requests: int = Field(10, ge=1, le=1000)
+    path_prefix: str | None = None
+    header_name: str | None = None
+    header_value: str | None = None
+    interval_ms: float = Field(5.0, ge=1, le=100)
@@ -0,0 +1,120 @@
+"""Production server entry point: Gunicorn managing Uvicorn workers.
+
+Run with ``python -m app.server``. Defaults come from the ``SERVER_*``
+settings and can be overridden on the command line.
+
+* ``SERVER_WORKERS=0`` sizes the worker count to the CPUs available to the
+  process.
+* ``SERVER_PRELOAD`` imports the application once in the master before
+  forking so workers share its memory copy-on-write. Per-process resources
+  (database pool, Redis client) are reset in every worker after the fork.
+* ``kill -HUP <master pid>`` starts fresh workers and lets the old ones
+  drain for up to ``SERVER_GRACEFUL_TIMEOUT`` seconds, so a reload drops no
+  requests. With preload enabled the code is already loaded in the master,
+  so picking up a new release needs ``kill -USR2`` (binary upgrade) instead.
+"""
+
+import argparse
+import os
+from typing import Any, Dict, Optional
+
+import structlog
+from gunicorn.app.base import BaseApplication
+
+from .config import get_settings
+
+log = structlog.get_logger()
+
+APP_MODULE = "app.main:app"
+WORKER_CLASS = "uvicorn.workers.UvicornWorker"
+
+
+def available_cpus() -> int:
+    """Return the number of CPUs this process may run on."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # pragma: no cover - not available on macOS/Windows
+        return os.cpu_count() or 1
+
+
+def resolve_workers(requested: int) -> int:
+    """Return ``requested`` if positive, otherwise one worker per CPU."""
+    if requested > 0:
+        return requested
+    return max(available_cpus(), 1)
+
+
+def post_fork(server: Any, worker: Any) -> None:
+    """Give each worker its own connections instead of the master's."""
+    from .database import reset_engine_after_fork
+    from .redis_client import reset_redis
+
+    reset_engine_after_fork()
+    reset_redis()
+    log.info("Worker resources reset after fork", pid=worker.pid)
+
+
+def build_options(
+    *,
+    bind: Optional[str] = None,
+    workers: Optional[int] = None,
+    preload: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """Translate settings (and optional overrides) into Gunicorn options."""
+    settings = get_settings()
+    options: Dict[str, Any] = {
+        "bind": bind or settings.SERVER_BIND,
+        "workers": resolve_workers(
+            settings.SERVER_WORKERS if workers is None else workers
+        ),
+        "worker_class": WORKER_CLASS,
+        "preload_app": settings.SERVER_PRELOAD if preload is None else preload,
+        "timeout": settings.SERVER_TIMEOUT,
+        "graceful_timeout": settings.SERVER_GRACEFUL_TIMEOUT,
+        "keepalive": settings.SERVER_KEEPALIVE,
+        "post_fork": post_fork,
+        "accesslog": "-",
+        "errorlog": "-",
+    }
+    if settings.SERVER_MAX_REQUESTS > 0:
+        # Recycle workers periodically; jitter keeps them from restarting
+        # all at once.
+        options["max_requests"] = settings.SERVER_MAX_REQUESTS
+        options["max_requests_jitter"] = max(settings.SERVER_MAX_REQUESTS // 10, 1)
+    return options
+
+
+class Server(BaseApplication):
+    """Embedded Gunicorn application serving :data:`APP_MODULE`."""
+
+    def __init__(self, options: Dict[str, Any]):
+        self.options = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+    def load(self) -> Any:
+        from .main import app
+
+        return app
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Run the API with Gunicorn")
+    parser.add_argument("--bind", help="address to listen on, e.g. 0.0.0.0:8000")
+    parser.add_argument("--workers", type=int, help="worker processes (0 = one per CPU)")
+    parser.add_argument(
+        "--preload",
+        action=argparse.BooleanOptionalAction,
+        default=None,
+        help="import the app in the master before forking workers",
+    )
+    args = parser.parse_args(argv)
+    Server(build_options(bind=args.bind, workers=args.workers, preload=args.preload)).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""Horizontal sharding of posts by ``owner_id``.
+
+When ``POST_SHARD_URLS`` lists one or more database URLs, ``Post`` rows live
+on those databases instead of the primary one. Each owner is mapped to a
+shard with a consistent-hash ring, so adding a shard only moves the owners
+whose ring segment changed. Post ids stay globally unique because they are
+allocated from a ticket table on the primary database before the insert.
+
+Users and id tickets stay on the primary database. Shard databases hold
+copies of the post, attachment and post archive tables without foreign keys
+(their targets live elsewhere); create them with ``python -m app.sharding
+init-schema``. Attachment ids come from the same ticket table, so they
+survive a move between shards.
+
+``python -m app.sharding rebalance --user-id N`` moves one owner's posts to
+the shard the ring currently assigns, in batches; ``--all`` does so for every
+owner found on the wrong shard.
+"""
+
+import argparse
+import bisect
+import contextvars
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import structlog
+from sqlalchemy import Column, Index, MetaData, Table, delete, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+log = structlog.get_logger()
+
+VIRTUAL_NODES = 64
+# Starlette's default threadpool size, the most requests that scatter at once.
+SCATTER_THREADS_PER_SHARD = 40
+
+
+def _ring_hash(value: str) -> int:
+    # md5 is stable across processes, unlike hash(); it is not used for security.
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent-hash ring mapping integer keys to shard indexes."""
+
+    def __init__(self, shard_count: int, vnodes: int = VIRTUAL_NODES):
+        points = sorted(
+            (_ring_hash(f"shard-{shard}-{vnode}"), shard)
+            for shard in range(shard_count)
+            for vnode in range(vnodes)
+        )
+        self._hashes = [h for h, _ in points]
+        self._shards = [s for _, s in points]
+
+    def shard_for(self, key: int) -> int:
+        index = bisect.bisect(self._hashes, _ring_hash(str(key))) % len(self._hashes)
+        return self._shards[index]
+
+
+def _without_foreign_keys(table: Table, metadata: MetaData) -> Table:
+    copy = Table(
+        table.name,
+        metadata,
+        *(
+            Column(
+                col.name,
+                col.type,
+                primary_key=col.primary_key,
+                nullable=col.nullable,
+                autoincrement=col.autoincrement,
+            )
+            for col in table.columns
+        ),
+    )
+    for index in table.indexes:
+        Index(index.name, *(copy.c[col.name] for col in index.columns), unique=index.unique)
+    return copy
+
+
+class ShardSet:
+    """The post shard engines plus the ring that routes owners to them."""
+
+    # Tables stored on shards, in dependency order.
+    TABLES = ("posts", "attachments", "post_archive")
+
+    def __init__(self, engines: List[Engine], max_workers: Optional[int] = None):
+        if not engines:
+            raise ValueError("ShardSet needs at least one engine")
+        self.engines = engines
+        self.ring = HashRing(len(engines))
+        self._sessionmakers = [
+            sessionmaker(autocommit=False, autoflush=False, bind=engine) for engine in engines
+        ]
+        # Every request thread may scatter at once: give each of them a thread
+        # per shard (threads are only started when needed).
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers or len(engines) * SCATTER_THREADS_PER_SHARD, thread_name_prefix="shard"
+        )
+
+    def __len__(self) -> int:
+        return len(self.engines)
+
+    def shard_for(self, owner_id: int) -> int:
+        return self.ring.shard_for(owner_id)
+
+    def session(self, index: int) -> Session:
+        return self._sessionmakers[index]()
+
+    def scatter(self, fn: Callable[[Session], Any]) -> List[Any]:
+        """Run ``fn`` with a session on every shard concurrently; results in shard order."""
+
+        def run(index: int) -> Any:
+            db = self.session(index)
+            try:
+                return fn(db)
+            finally:
+                db.close()
+
+        # Each worker thread runs in a copy of the caller's context, so
+        # per-request state (e.g. the query recorder) follows the call.
+        contexts = [contextvars.copy_context() for _ in self.engines]
+        return list(
+            self._executor.map(lambda index: contexts[index].run(run, index), range(len(self.engines)))
+        )
+
+    def create_schema(self) -> None:
+        from . import models
+
+        metadata = MetaData()
+        for name in self.TABLES:
+            _without_foreign_keys(models.Base.metadata.tables[name], metadata)
+        for engine in self.engines:
+            metadata.create_all(bind=engine)
+
+    def dispose_after_fork(self) -> None:
+        for engine in self.engines:
+            engine.dispose(close=False)
+
+
+def move_user_posts(
+    shards: ShardSet, owner_id: int, source: int, target: int, batch_size: int = 500
+) -> int:
+    """Copy ``owner_id``'s posts (with attachments and archived posts) from ``source`` to ``target``.
+
+    Each batch is committed on the target before it is deleted from the
+    source, so a crash leaves at most one batch on both shards (readers
+    de-duplicate by id) and re-running the move resumes where it stopped.
+    """
+    from . import models
+
+    posts = models.Post.__table__
+    attachments = models.Attachment.__table__
+    archive = models.PostArchive.__table__
+    moved = 0
+    while True:
+        with shards.engines[source].connect() as src:
+            rows = [
+                dict(row._mapping)
+                for row in src.execute(
+                    select(posts)
+                    .where(posts.c.owner_id == owner_id)
+                    .order_by(posts.c.id)
+                    .limit(batch_size)
+                )
+            ]
+            ids = [row["id"] for row in rows]
+            attachment_rows = [
+                dict(row._mapping)
+                for row in src.execute(select(attachments).where(attachments.c.post_id.in_(ids)))
+            ]
+            archived_rows = [
+                dict(row._mapping)
+                for row in src.execute(
+                    select(archive)
+                    .where(archive.c.owner_id == owner_id)
+                    .order_by(archive.c.id)
+                    .limit(batch_size)
+                )
+            ]
+            archived_ids = [row["id"] for row in archived_rows]
+        if not rows and not archived_rows:
+            return moved
+        with shards.engines[target].begin() as dst:
+            _insert_missing(dst, posts, rows)
+            _insert_missing(dst, attachments, attachment_rows)
+            _insert_missing(dst, archive, archived_rows)
+        with shards.engines[source].begin() as src:
+            src.execute(delete(attachments).where(attachments.c.post_id.in_(ids)))
+            src.execute(delete(posts).where(posts.c.id.in_(ids)))
+            src.execute(delete(archive).where(archive.c.id.in_(archived_ids)))
+        moved += len(rows) + len(archived_rows)
+        log.info("Moved post batch", owner_id=owner_id, source=source, target=target, rows=len(rows))
+
+
+def _insert_missing(conn: Any, table: Table, rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    present = set(
+        conn.execute(select(table.c.id).where(table.c.id.in_([row["id"] for row in rows]))).scalars()
+    )
+    missing = [row for row in rows if row["id"] not in present]
+    if missing:
+        conn.execute(insert(table), missing)
+
+
+def rebalance_user(shards: ShardSet, owner_id: int, batch_size: int = 500) -> int:
+    """Move the owner's posts from every other shard to its ring shard."""
+    target = shards.shard_for(owner_id)
+    return sum(
+        move_user_posts(shards, owner_id, source, target, batch_size)
+        for source in range(len(shards))
+        if source != target
+    )
+
+
+def misplaced_owners(shards: ShardSet) -> Iterable[Tuple[int, int]]:
+    """Yield ``(owner_id, shard)`` pairs whose posts sit on the wrong shard."""
+    from . import models
+
+    posts = models.Post.__table__
+    archive = models.PostArchive.__table__
+    for index, engine in enumerate(shards.engines):
+        with engine.connect() as conn:
+            owners = conn.execute(
+                select(posts.c.owner_id).union(select(archive.c.owner_id))
+            ).scalars().all()
+        for owner_id in owners:
+            if owner_id is not None and shards.shard_for(owner_id) != index:
+                yield owner_id, index
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Post shard maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("init-schema", help="create post tables on every shard")
+    rebalance = sub.add_parser("rebalance", help="move posts to their ring shard")
+    who = rebalance.add_mutually_exclusive_group(required=True)
+    who.add_argument("--user-id", type=int)
+    who.add_argument("--all", action="store_true")
+    rebalance.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    from .database import post_shards
+
+    if post_shards is None:
+        parser.error("POST_SHARD_URLS is not configured")
+    if args.command == "init-schema":
+        post_shards.create_schema()
+        return
+    owners: Dict[int, None] = {}
+    if args.all:
+        owners = dict.fromkeys(owner for owner, _ in misplaced_owners(post_shards))
+    else:
+        owners = {args.user_id: None}
+    for owner_id in owners:
+        moved = rebalance_user(post_shards, owner_id, args.batch_size)
+        print(f"user {owner_id}: moved {moved} posts to shard {post_shards.shard_for(owner_id)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Pluggable blob storage for post attachments.
+
+Blobs are content-addressed by SHA-256: uploads are streamed to a temporary
+file while the hash is computed, then moved into place, or dropped if an
+identical blob already exists. Rows in ``attachments`` reference blobs by
+hash, so several attachments can share one file. Unreferenced blobs are
+removed by ``python -m app.storage gc`` after a grace period, which avoids
+racing with an upload that is about to reference the same content.
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterable, Dict, Iterator, Optional, Set, Tuple, Type
+
+from starlette.concurrency import run_in_threadpool
+
+from .config import get_settings
+
+
+class AttachmentTooLarge(Exception):
+    """Raised when an upload exceeds the configured size limit."""
+
+
+@dataclass
+class StoredBlob:
+    sha256: str
+    size: int
+    deduplicated: bool
+
+
+class StorageBackend(ABC):
+    """Interface every attachment storage backend implements."""
+
+    @abstractmethod
+    async def save(self, chunks: AsyncIterable[bytes], *, max_size: int) -> StoredBlob:
+        """Consume ``chunks`` and store them, raising :class:`AttachmentTooLarge`."""
+
+    @abstractmethod
+    def local_path(self, sha256: str) -> Optional[Path]:
+        """Return a filesystem path for zero-copy serving, if the blob has one."""
+
+    @abstractmethod
+    def delete(self, sha256: str) -> None:
+        """Remove a blob; missing blobs are ignored."""
+
+    @abstractmethod
+    def iter_blobs(self) -> Iterator[Tuple[str, float]]:
+        """Yield ``(sha256, last_modified)`` for every stored blob."""
+
+
+class LocalDiskStorage(StorageBackend):
+    """Stores blobs under ``root/ab/cd/<sha256>``."""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+        self._tmp = self.root / "tmp"
+        self._tmp.mkdir(parents=True, exist_ok=True)
+
+    def _blob_path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    async def save(self, chunks: AsyncIterable[bytes], *, max_size: int) -> StoredBlob:
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_name = tempfile.mkstemp(dir=self._tmp)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if size > max_size:
+                        raise AttachmentTooLarge(f"Attachment exceeds {max_size} bytes")
+                    digest.update(chunk)
+                    await run_in_threadpool(f.write, chunk)
+            sha256 = digest.hexdigest()
+            path = self._blob_path(sha256)
+            if path.exists():
+                # Refresh mtime so gc's grace period restarts for this blob.
+                os.utime(path)
+                os.unlink(tmp_name)
+                return StoredBlob(sha256, size, deduplicated=True)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_name, path)
+            return StoredBlob(sha256, size, deduplicated=False)
+        except BaseException:
+            if os.path.exists(tmp_name):
+                os.unlink(tmp_name)
+            raise
+
+    def local_path(self, sha256: str) -> Optional[Path]:
+        path = self._blob_path(sha256)
+        return path if path.exists() else None
+
+    def delete(self, sha256: str) -> None:
+        try:
+            self._blob_path(sha256).unlink()
+        except FileNotFoundError:
+            pass
+
+    def iter_blobs(self) -> Iterator[Tuple[str, float]]:
+        for path in self.root.glob("??/??/*"):
+            yield path.name, path.stat().st_mtime
+
+
+STORAGE_BACKENDS: Dict[str, Type[StorageBackend]] = {"local": LocalDiskStorage}
+
+_storage: Optional[StorageBackend] = None
+
+
+def get_storage() -> StorageBackend:
+    """Return the configured storage backend (``ATTACHMENT_STORAGE_BACKEND``)."""
+    global _storage
+    if _storage is None:
+        settings = get_settings()
+        backend = STORAGE_BACKENDS[settings.ATTACHMENT_STORAGE_BACKEND]
+        _storage = backend(settings.ATTACHMENT_STORAGE_DIR)
+    return _storage
+
+
+def collect_garbage(storage: StorageBackend, referenced: Set[str], grace_seconds: float) -> int:
+    """Delete blobs no attachment references that are older than the grace period."""
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for sha256, mtime in list(storage.iter_blobs()):
+        if sha256 not in referenced and mtime < cutoff:
+            storage.delete(sha256)
+            removed += 1
+    return removed
+
+
+def main(argv: Optional[list] = None) -> None:
+    parser = argparse.ArgumentParser(description="Attachment storage maintenance")
+    sub = parser.add_subparsers(dest="command", required=True)
+    gc = sub.add_parser("gc", help="remove blobs no attachment references")
+    gc.add_argument("--grace-hours", type=float, default=1.0)
+    args = parser.parse_args(argv)
+
+    from . import crud
+    from .database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        referenced = crud.get_attachment_hashes(db)
+    finally:
+        db.close()
+    removed = collect_garbage(get_storage(), referenced, args.grace_hours * 3600)
+    print(f"removed {removed} unreferenced blobs")
+
+
+if __name__ == "__main__":
+    main()
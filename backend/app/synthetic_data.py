@@ -0,0 +1,349 @@
+"""Deterministic synthetic users and posts for load testing.
+
+Run from ``backend/``::
+
+    python -m app.synthetic_data --users 1000000 --posts 10000000 --ndjson out/
+    python -m app.synthetic_data --users 1000000 --posts 10000000 --database
+
+The same ``--seed`` and ``--until`` always produce the same data, whatever
+the number of ``--workers``. Users and posts are cut into fixed-size
+chunks, and each chunk gets its own random stream derived from the seed, so
+the chunks can be generated on all cores in any order.
+
+Distributions:
+
+* Posts per user follow Zipf's law: the owner of each post is drawn with
+  weight ``1 / rank ** --zipf-exponent``. Ranks are scattered over the user
+  ids, so the heavy posters are not simply the lowest ids.
+* Content length is log-normal around ``--content-median`` characters and
+  clipped to the 1000-character limit of ``schemas.PostCreate``. Titles
+  have 2 to 10 words. The text is cut from a seeded word corpus.
+* ``created_at`` grows with the post id, as it does in production, and
+  spans ``--days`` days up to ``--until``.
+
+Every user gets the same bcrypt hash of ``--password``. It is computed once,
+so bcrypt's cost is paid once rather than per user. This is fine for load
+tests and never for real accounts.
+
+``--ndjson DIR`` writes ``users-NNNNN.ndjson`` and ``posts-NNNNN.ndjson``
+files, one per chunk. ``--database`` bulk-inserts into
+``SQLALCHEMY_DATABASE_URL``, or into the post shards when
+``POST_SHARD_URLS`` is set. The schema must already exist and the tables
+must be empty. SQLite allows one writer at a time, so chunks are still
+generated in parallel but inserted by the main process.
+"""
+
+import argparse
+import bisect
+import json
+import math
+import os
+import random
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from itertools import accumulate
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.engine import Engine
+
+from . import models
+
+CHUNK_SIZE = 10_000
+TITLE_MAX = 100
+CONTENT_MAX = 1000
+CORPUS_WORDS = 50_000
+WORDS = (
+    "the a of to and in is it you that he was for on are with as his they be at one have this from or had "
+    "by hot word but what some we can out other were all there when up use your how said an each she which "
+    "do their time if will way about many then them write would like so these her long make thing see him "
+    "two has look more day could go come did number sound no most people my over know water than call first "
+    "who may down side been now find fastapi post user cache index query latency worker redis database "
+    "request response client server stream shard archive profile token page feed photo weekend coffee"
+).split()
+
+Row = Dict[str, Any]
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    users: int
+    posts: int
+    password_hash: str
+    until: datetime
+    seed: int = 42
+    zipf_exponent: float = 1.0
+    content_median: int = 200
+    content_sigma: float = 0.8
+    days: int = 3 * 365
+    chunk_size: int = CHUNK_SIZE
+
+    def chunks(self, total: int) -> range:
+        return range(math.ceil(total / self.chunk_size))
+
+
+def _rng(spec: DatasetSpec, kind: str, chunk: int) -> random.Random:
+    # String seeds are hashed with SHA-512, independent of PYTHONHASHSEED.
+    return random.Random(f"{spec.seed}:{kind}:{chunk}")
+
+
+@lru_cache(maxsize=1)
+def _corpus(seed: int) -> Tuple[str, List[int]]:
+    """A long seeded text and the offsets where its words start."""
+    rng = random.Random(f"{seed}:corpus")
+    words = rng.choices(WORDS, k=CORPUS_WORDS)
+    starts = list(accumulate((len(word) + 1 for word in words[:-1]), initial=0))
+    return " ".join(words), starts
+
+
+@lru_cache(maxsize=1)
+def _owner_weights(users: int, exponent: float) -> List[float]:
+    return list(accumulate(1 / rank**exponent for rank in range(1, users + 1)))
+
+
+def _rank_to_user_id(rank: int, users: int) -> int:
+    # Multiplying by a step coprime with ``users`` permutes the ranks.
+    step = _coprime_step(users)
+    return ((rank + 1) * step) % users + 1
+
+
+@lru_cache(maxsize=None)
+def _coprime_step(users: int) -> int:
+    step = int(users * 0.618) | 1
+    while math.gcd(step, users) != 1:
+        step += 2
+    return step
+
+
+def _text(rng: random.Random, corpus: str, starts: List[int], length: int) -> str:
+    start = starts[rng.randrange(len(starts) - CONTENT_MAX)]
+    return corpus[start:start + length].rstrip()
+
+
+def _title(rng: random.Random, corpus: str, starts: List[int]) -> str:
+    index = rng.randrange(len(starts) - 10)
+    return corpus[starts[index]:starts[index + rng.randint(2, 10)]].rstrip()[:TITLE_MAX]
+
+
+def generate_users(spec: DatasetSpec, chunk: int) -> List[Row]:
+    first = chunk * spec.chunk_size + 1
+    last = min(first + spec.chunk_size, spec.users + 1)
+    return [
+        {"id": user_id, "username": f"user{user_id}", "hashed_password": spec.password_hash, "role": "user"}
+        for user_id in range(first, last)
+    ]
+
+
+def generate_posts(spec: DatasetSpec, chunk: int) -> List[Row]:
+    rng = _rng(spec, "posts", chunk)
+    corpus, starts = _corpus(spec.seed)
+    weights = _owner_weights(spec.users, spec.zipf_exponent)
+    total_weight = weights[-1]
+    span = spec.days * 86400
+    mu = math.log(spec.content_median)
+    first = chunk * spec.chunk_size + 1
+    last = min(first + spec.chunk_size, spec.posts + 1)
+    rows = []
+    for post_id in range(first, last):
+        rank = min(bisect.bisect_left(weights, rng.random() * total_weight), spec.users - 1)
+        length = min(max(int(rng.lognormvariate(mu, spec.content_sigma)), 1), CONTENT_MAX)
+        # Older posts have lower ids; a minute of jitter keeps ties apart.
+        age = span * (1 - post_id / spec.posts) + rng.uniform(0, 60)
+        rows.append(
+            {
+                "id": post_id,
+                "title": _title(rng, corpus, starts),
+                "content": _text(rng, corpus, starts, length),
+                "owner_id": _rank_to_user_id(rank, spec.users),
+                "created_at": spec.until - timedelta(seconds=age),
+            }
+        )
+    return rows
+
+
+# Sinks. Each task generates one chunk in a pool process and either writes it
+# there (NDJSON, server databases) or hands the rows back (SQLite).
+
+_engines: Dict[str, Engine] = {}
+
+
+def _engine(url: str) -> Engine:
+    if url not in _engines:
+        from .database import make_engine
+
+        _engines[url] = make_engine(url)
+    return _engines[url]
+
+
+def _dispose_engines() -> None:
+    """Close the pooled connections so forked workers do not share sockets."""
+    for engine in _engines.values():
+        engine.dispose()
+    _engines.clear()
+
+
+def _write_ndjson(path: Path, rows: List[Row]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, default=datetime.isoformat, separators=(",", ":")))
+            f.write("\n")
+
+
+@dataclass(frozen=True)
+class Targets:
+    """Where rows go: an NDJSON directory or the database URLs."""
+
+    ndjson: Optional[str] = None
+    primary: Optional[str] = None
+    shards: Tuple[str, ...] = ()
+    in_worker: bool = True
+
+    def for_owner(self, owner_id: int) -> str:
+        if not self.shards:
+            return self.primary
+        return self.shards[_ring(len(self.shards)).shard_for(owner_id)]
+
+
+@lru_cache(maxsize=None)
+def _ring(size: int):
+    from .sharding import HashRing
+
+    return HashRing(size)
+
+
+def _insert(kind: str, rows: List[Row], urls: Targets) -> None:
+    if kind == "users":
+        with _engine(urls.primary).begin() as conn:
+            conn.execute(insert(models.User.__table__), rows)
+        return
+    by_engine: Dict[str, List[Row]] = {}
+    for row in rows:
+        by_engine.setdefault(urls.for_owner(row["owner_id"]), []).append(row)
+    for url, shard_rows in by_engine.items():
+        with _engine(url).begin() as conn:
+            conn.execute(insert(models.Post.__table__), shard_rows)
+
+
+def _run_task(args: Tuple[DatasetSpec, Targets, str, int]) -> Tuple[str, int, Optional[List[Row]]]:
+    spec, targets, kind, chunk = args
+    rows = generate_users(spec, chunk) if kind == "users" else generate_posts(spec, chunk)
+    if targets.ndjson is not None:
+        _write_ndjson(Path(targets.ndjson) / f"{kind}-{chunk:05d}.ndjson", rows)
+    elif targets.in_worker:
+        _insert(kind, rows, targets)
+    else:
+        return kind, len(rows), rows
+    return kind, len(rows), None
+
+
+def _tasks(spec: DatasetSpec, targets: Targets, kind: str) -> List[Tuple[DatasetSpec, Targets, str, int]]:
+    total = spec.users if kind == "users" else spec.posts
+    return [(spec, targets, kind, chunk) for chunk in spec.chunks(total)]
+
+
+def generate(spec: DatasetSpec, targets: Targets, workers: int = 1) -> Dict[str, int]:
+    """Generate the dataset into ``targets``; return the row counts."""
+    counts = {"users": 0, "posts": 0}
+    pool = None
+    if workers > 1:
+        # Pool forks: connections checked out before (``_check_empty``) must
+        # not be inherited, each worker opens its own.
+        _dispose_engines()
+        pool = Pool(workers)
+    try:
+        # Users first: posts reference them.
+        for kind in ("users", "posts"):
+            tasks = _tasks(spec, targets, kind)
+            results = pool.imap(_run_task, tasks) if pool is not None else map(_run_task, tasks)
+            for _, count, rows in results:
+                counts[kind] += count
+                if rows is not None:
+                    _insert(kind, rows, targets)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    if targets.ndjson is None:
+        _advance_ids(spec, targets)
+    return counts
+
+
+def _advance_ids(spec: DatasetSpec, targets: Targets) -> None:
+    """Make the next id handed out by the database follow the generated ones."""
+    sequences = [("users", spec.users)]
+    if targets.shards:
+        # Sharded posts take their ids from the ticket table (see app.sharding).
+        # On SQLite the explicit id moves AUTOINCREMENT along; PostgreSQL needs
+        # the setval below as well.
+        with _engine(targets.primary).begin() as conn:
+            conn.execute(insert(models.PostIdTicket.__table__).values(id=spec.posts))
+        sequences.append(("post_id_tickets", spec.posts))
+    else:
+        sequences.append(("posts", spec.posts))
+    engine = _engine(targets.primary)
+    if engine.dialect.name == "postgresql":
+        with engine.begin() as conn:
+            for table, last in sequences:
+                conn.execute(text(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), {last})"))
+
+
+def _check_empty(targets: Targets) -> None:
+    for url, table in [(targets.primary, models.User.__table__)] + [
+        (url, models.Post.__table__) for url in (targets.shards or (targets.primary,))
+    ]:
+        with _engine(url).connect() as conn:
+            if conn.execute(select(func.count()).select_from(table)).scalar():
+                raise SystemExit(f"{table.name} is not empty on {_engine(url).url!r}")
+
+
+def main(argv: Optional[list] = None) -> None:
+    today = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    parser = argparse.ArgumentParser(description="Generate synthetic users and posts")
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--posts", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--zipf-exponent", type=float, default=1.0)
+    parser.add_argument("--content-median", type=int, default=200)
+    parser.add_argument("--days", type=int, default=3 * 365)
+    parser.add_argument("--until", type=datetime.fromisoformat, default=today, help="newest created_at (ISO date)")
+    parser.add_argument("--password", default="password123", help="password of every generated user")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    out = parser.add_mutually_exclusive_group(required=True)
+    out.add_argument("--ndjson", metavar="DIR", help="write NDJSON files into DIR")
+    out.add_argument("--database", action="store_true", help="bulk-insert into SQLALCHEMY_DATABASE_URL")
+    args = parser.parse_args(argv)
+
+    from .crud import pwd_context
+
+    spec = DatasetSpec(
+        users=args.users,
+        posts=args.posts,
+        password_hash=pwd_context.hash(args.password),
+        until=args.until,
+        seed=args.seed,
+        zipf_exponent=args.zipf_exponent,
+        content_median=args.content_median,
+        days=args.days,
+    )
+    if args.ndjson:
+        os.makedirs(args.ndjson, exist_ok=True)
+        targets = Targets(ndjson=args.ndjson)
+    else:
+        from .database import POST_SHARD_URLS, SQLALCHEMY_DATABASE_URL
+
+        urls = [SQLALCHEMY_DATABASE_URL, *POST_SHARD_URLS]
+        targets = Targets(
+            primary=SQLALCHEMY_DATABASE_URL,
+            shards=tuple(POST_SHARD_URLS),
+            in_worker=not any(url.startswith("sqlite") for url in urls),
+        )
+        _check_empty(targets)
+    counts = generate(spec, targets, args.workers)
+    print(f"generated {counts['users']} users and {counts['posts']} posts")
+
+
+if __name__ == "__main__":
+    main()
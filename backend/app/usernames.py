@@ -0,0 +1,220 @@
+"""Username availability answered from a per-worker Bloom filter.
+
+At startup each worker streams ``users.username`` into a
+:class:`~app.bloom.BloomFilter`. A name the filter has never seen is
+available without touching the database; a possible hit is confirmed with
+an exact query, so false positives cost one lookup and never a wrong answer.
+
+``crud.create_user`` adds the new name locally and publishes it on the
+broker so every other worker adds it too. If a worker may have missed such
+a message (its subscription dropped, or a sequence number was skipped) it
+rebuilds its filter from the database; until the first build finishes,
+every check goes to the database.
+
+A publish that failed (or was skipped while publishing is suspended)
+consumes no sequence number, so no subscriber sees a gap. To cover that,
+every ``USERNAME_FILTER_CHECK_SECONDS`` each worker compares the number of
+users with the names its filter holds (those built plus those added since)
+and rebuilds when the database has more.
+"""
+
+import asyncio
+import threading
+from typing import Callable, Dict, List, Optional
+
+import structlog
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import models
+from .bloom import BloomFilter
+from .broker import Broker, Subscriber, try_publish
+from .config import get_settings
+from .database import SessionLocal
+
+log = structlog.get_logger()
+
+CHANNEL = "users:created"
+STREAM_BATCH_SIZE = 10_000
+
+
+class UsernameIndex:
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        *,
+        capacity: int = 1_000_000,
+        error_rate: float = 0.001,
+        check_interval: float = 60.0,
+        broker: Optional[Broker] = None,
+    ):
+        self.session_factory = session_factory
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.check_interval = check_interval
+        self._filter: Optional[BloomFilter] = None
+        # Distinct names in the filter. A name is counted only if the filter
+        # did not already hold it: a worker also receives its own publishes.
+        self._names = 0
+        self._lock = threading.Lock()
+        # One rebuild at a time: the startup build and a gap-triggered one can overlap.
+        self._rebuild_lock = threading.Lock()
+        # Per running or waiting rebuild: names added since it was requested,
+        # replayed into its filter so none is lost to the swap.
+        self._pending: List[List[str]] = []
+        self._subscriber = Subscriber(CHANNEL, self._on_message, on_gap=self._schedule_rebuild, broker=broker)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._check_task: Optional[asyncio.Task] = None
+        self._check_failing = False
+        self.filtered = 0
+        self.db_checks = 0
+        self.false_positives = 0
+        self.rebuilds = 0
+
+    @classmethod
+    def from_settings(cls, settings, session_factory: Callable[[], Session]) -> "UsernameIndex":
+        return cls(
+            session_factory,
+            capacity=settings.USERNAME_FILTER_CAPACITY,
+            error_rate=settings.USERNAME_FILTER_ERROR_RATE,
+            check_interval=settings.USERNAME_FILTER_CHECK_SECONDS,
+        )
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    async def start(self) -> None:
+        """Subscribe first, then build, so no name created in between is missed."""
+        self._loop = asyncio.get_running_loop()
+        await self._subscriber.start()
+        await run_in_threadpool(self.rebuild)
+        if self.check_interval > 0 and self._check_task is None:
+            self._check_task = asyncio.create_task(self._check_counts())
+
+    async def stop(self) -> None:
+        await self._subscriber.stop()
+        if self._check_task is not None:
+            self._check_task.cancel()
+            try:
+                await self._check_task
+            except asyncio.CancelledError:
+                pass
+            self._check_task = None
+
+    def rebuild(self) -> None:
+        """Build a fresh filter from the users table and swap it in."""
+        pending: List[str] = []
+        with self._lock:
+            self._pending.append(pending)
+        try:
+            with self._rebuild_lock:
+                bloom = self._build()
+                with self._lock:
+                    if bloom is not None:
+                        self._filter = bloom
+                        self._names = bloom.count
+                        for username in pending:
+                            self._add(username)
+        finally:
+            with self._lock:
+                self._pending.remove(pending)
+        if bloom is not None:
+            self.rebuilds += 1
+            log.info("Username filter built", **bloom.stats())
+
+    def _build(self) -> Optional[BloomFilter]:
+        db = self.session_factory()
+        try:
+            total = db.execute(select(func.count()).select_from(models.User)).scalar()
+            # Leave room to grow so the error rate holds until the next rebuild.
+            bloom = BloomFilter(max(self.capacity, 2 * total), self.error_rate)
+            names = db.execute(
+                select(models.User.username).execution_options(yield_per=STREAM_BATCH_SIZE)
+            ).scalars()
+            bloom.update(names)
+            return bloom
+        except Exception as exc:
+            log.exception("Username filter build failed", exc_info=exc)
+            return None
+        finally:
+            db.close()
+
+    def missing_names(self) -> int:
+        """How many more users the database has than the filter holds."""
+        db = self.session_factory()
+        try:
+            total = db.execute(select(func.count()).select_from(models.User)).scalar()
+        finally:
+            db.close()
+        with self._lock:
+            return total - self._names
+
+    async def _check_counts(self) -> None:
+        while True:
+            await asyncio.sleep(self.check_interval)
+            try:
+                missing = await run_in_threadpool(self.missing_names)
+            except Exception as exc:
+                if not self._check_failing:
+                    log.warning("Username filter check failed", error=str(exc))
+                self._check_failing = True
+                continue
+            self._check_failing = False
+            if missing > 0:
+                log.warning("Username filter behind the users table, rebuilding", missing=missing)
+                await run_in_threadpool(self.rebuild)
+
+    def _schedule_rebuild(self) -> None:
+        if self._loop is not None:
+            self._loop.run_in_executor(None, self.rebuild)
+
+    def _on_message(self, seq: int, username: str) -> None:
+        self.add(username)
+
+    def add(self, username: str) -> None:
+        with self._lock:
+            for pending in self._pending:
+                pending.append(username)
+            self._add(username)
+
+    def _add(self, username: str) -> None:
+        # Under self._lock. A false positive leaves the count short, which
+        # costs at most one needless rebuild.
+        if self._filter is not None and not self._filter.might_contain(username):
+            self._filter.add(username)
+            self._names += 1
+
+    def record_new_user(self, username: str) -> None:
+        """Add a just-created username here and on every other worker."""
+        self.add(username)
+        try_publish(CHANNEL, username)
+
+    def is_available(self, db: Session, username: str) -> bool:
+        bloom = self._filter
+        if bloom is not None and not bloom.might_contain(username):
+            self.filtered += 1
+            return True
+        self.db_checks += 1
+        taken = db.execute(
+            select(models.User.id).where(models.User.username == username).limit(1)
+        ).first() is not None
+        if bloom is not None and not taken:
+            self.false_positives += 1
+        return not taken
+
+    def stats(self) -> Dict[str, object]:
+        stats: Dict[str, object] = {
+            "ready": self.ready,
+            "filtered": self.filtered,
+            "db_checks": self.db_checks,
+            "false_positives": self.false_positives,
+            "rebuilds": self.rebuilds,
+        }
+        if self._filter is not None:
+            stats["filter"] = self._filter.stats()
+        return stats
+
+
+username_index = UsernameIndex.from_settings(get_settings(), SessionLocal)
@@ -2,6 +2,14 @@
 
 from .datetime_helpers import format_datetime
 from .error_helpers import format_error
-from .api_helpers import fetch_json
+from .api_helpers import HTTPClientManager, afetch_json, fetch_json, fetch_many, http_clients
 
-__all__ = ["format_datetime", "format_error", "fetch_json"]
+__all__ = [
+    "format_datetime",
+    "format_error",
+    "fetch_json",
+    "afetch_json",
+    "fetch_many",
+    "HTTPClientManager",
+    "http_clients",
+]
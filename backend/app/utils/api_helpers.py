@@ -1,11 +1,179 @@
-"""Wrapper utilities for performing HTTP API calls."""
+"""Wrapper utilities for performing HTTP API calls.
+
+Requests go through a shared :class:`HTTPClientManager`, which keeps one
+pooled ``httpx.Client`` and one ``httpx.AsyncClient`` per event loop alive
+so connections (and their TLS sessions) are reused across calls. Transient
+failures are retried with exponential backoff, and the pools are closed on
+application shutdown. The shared ``http_clients`` takes its timeouts, pool
+limits and retry policy from the ``HTTP_*`` settings.
+"""
+
+import asyncio
+import random
+import threading
+import time
+import weakref
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..config import get_settings
 
-from typing import Any, Dict
 try:
     import httpx  # type: ignore
 except ModuleNotFoundError:  # pragma: no cover - optional dependency
     httpx = None  # type: ignore
 
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class HTTPClientManager:
+    """Owns pooled sync/async HTTP clients and applies a retry policy.
+
+    ``retries`` extra attempts are made for idempotent methods when the
+    request fails at the transport level or the server answers with one of
+    :data:`RETRY_STATUSES`. The delay before attempt ``n`` is
+    ``backoff * 2 ** n`` with +/-50% jitter.
+    """
+
+    def __init__(
+        self,
+        *,
+        timeout: float = 10.0,
+        connect_timeout: float = 3.0,
+        max_connections: int = 100,
+        max_keepalive_connections: int = 20,
+        keepalive_expiry: float = 30.0,
+        retries: int = 2,
+        backoff: float = 0.1,
+        transport: Any = None,
+        async_transport: Any = None,
+    ):
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.retries = retries
+        self.backoff = backoff
+        self._transport = transport
+        self._async_transport = async_transport
+        self._client: Optional["httpx.Client"] = None
+        # Async connections belong to the loop that opened them: one pool per loop.
+        self._async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls, settings) -> "HTTPClientManager":
+        return cls(
+            timeout=settings.HTTP_TIMEOUT,
+            connect_timeout=settings.HTTP_CONNECT_TIMEOUT,
+            max_connections=settings.HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY,
+            retries=settings.HTTP_RETRIES,
+            backoff=settings.HTTP_RETRY_BACKOFF,
+        )
+
+    def _client_options(self) -> Dict[str, Any]:
+        if httpx is None:
+            raise ImportError("httpx is required to use HTTPClientManager")
+        return {
+            "timeout": httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            "limits": httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_expiry,
+            ),
+        }
+
+    def client(self) -> "httpx.Client":
+        """Return the shared sync client, creating it on first use."""
+        if self._client is None or self._client.is_closed:
+            with self._lock:
+                if self._client is None or self._client.is_closed:
+                    self._client = httpx.Client(transport=self._transport, **self._client_options())
+        return self._client
+
+    def async_client(self) -> "httpx.AsyncClient":
+        """Return the async client bound to the running event loop."""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None or client.is_closed:
+            with self._lock:
+                # Pools of loops that were closed can no longer be used or awaited.
+                for other in [other for other in self._async_clients if other.is_closed()]:
+                    del self._async_clients[other]
+                client = self._async_clients[loop] = httpx.AsyncClient(
+                    transport=self._async_transport, **self._client_options()
+                )
+        return client
+
+    def _should_retry(self, method: str, attempt: int) -> bool:
+        return method.upper() in IDEMPOTENT_METHODS and attempt < self.retries
+
+    def _delay(self, attempt: int) -> float:
+        return self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def request(self, method: str, url: str, **kwargs: Any) -> "httpx.Response":
+        """Send a request on the pooled client, retrying transient failures."""
+        attempt = 0
+        while True:
+            try:
+                response = self.client().request(method, url, **kwargs)
+            except httpx.TransportError:
+                if not self._should_retry(method, attempt):
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or not self._should_retry(method, attempt):
+                    return response
+                response.close()
+            time.sleep(self._delay(attempt))
+            attempt += 1
+
+    async def arequest(self, method: str, url: str, **kwargs: Any) -> "httpx.Response":
+        """Async counterpart of :meth:`request`."""
+        attempt = 0
+        while True:
+            try:
+                response = await self.async_client().request(method, url, **kwargs)
+            except httpx.TransportError:
+                if not self._should_retry(method, attempt):
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or not self._should_retry(method, attempt):
+                    return response
+                await response.aclose()
+            await asyncio.sleep(self._delay(attempt))
+            attempt += 1
+
+    def close(self) -> None:
+        """Close the sync pool."""
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self) -> None:
+        """Close every pool, e.g. from the application's shutdown handler.
+
+        The pool of the running loop is closed here and pools of other
+        running loops on their own loop; pools of stopped loops are dropped.
+        """
+        self.close()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            clients = list(self._async_clients.items())
+            self._async_clients.clear()
+        for other, client in clients:
+            if other is loop:
+                await client.aclose()
+            elif other.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), other)
+
+
+http_clients = HTTPClientManager.from_settings(get_settings())
+
 
 def fetch_json(url: str, *, method: str = "GET", **kwargs: Any) -> Dict[str, Any]:
     """Send an HTTP request and return the JSON payload.
@@ -17,7 +185,42 @@ def fetch_json(url: str, *, method: str = "GET", **kwargs: Any) -> Dict[str, Any
     if httpx is None:
         raise ImportError("httpx is required to use fetch_json")
 
-    with httpx.Client() as client:
-        response = client.request(method, url, **kwargs)
-        response.raise_for_status()
-        return response.json()
+    response = http_clients.request(method, url, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+async def afetch_json(url: str, *, method: str = "GET", **kwargs: Any) -> Dict[str, Any]:
+    """Async variant of :func:`fetch_json` using the pooled async client."""
+
+    if httpx is None:
+        raise ImportError("httpx is required to use afetch_json")
+
+    response = await http_clients.arequest(method, url, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+async def fetch_many(
+    urls: Iterable[str],
+    *,
+    method: str = "GET",
+    concurrency: int = 10,
+    return_exceptions: bool = False,
+    **kwargs: Any,
+) -> List[Any]:
+    """Fetch JSON from several URLs concurrently, at most ``concurrency`` at once.
+
+    Results are returned in the order of ``urls``. With ``return_exceptions``
+    a failed request yields its exception instead of aborting the batch.
+    """
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(url: str) -> Any:
+        async with semaphore:
+            return await afetch_json(url, method=method, **kwargs)
+
+    return await asyncio.gather(
+        *(fetch_one(url) for url in urls), return_exceptions=return_exceptions
+    )
@@ -0,0 +1,171 @@
+"""Worker warm-up and the readiness state behind ``/readyz``.
+
+Each worker starts serving immediately (``/livez`` answers at once), but
+reports ready only after :func:`run_warmup` has paid the first-request
+costs up front:
+
+* open ``WARMUP_DB_CONNECTIONS`` pooled connections per engine (primary
+  and post shards) and round-trip ``SELECT 1`` on each;
+* ping Redis;
+* encode and decode one JWT;
+* hash one dummy password, which also loads the bcrypt backend;
+* validate and encode a sample post in every negotiated format.
+
+The database step is required: if it fails, the worker stays not-ready and
+retries every ``WARMUP_RETRY_SECONDS``. The worker turns ready as soon as
+it passes; the other steps run afterwards and their failures are reported
+in ``/readyz`` without blocking readiness, since the affected features
+degrade on their own. Async steps (the Redis ping) give up after
+``WARMUP_STEP_TIMEOUT_SECONDS`` rather than waiting out a TCP connect
+timeout. On shutdown the worker reports not-ready again so the load
+balancer drains it first.
+"""
+
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import structlog
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+
+from . import database, negotiation, schemas
+from .auth import create_access_token, decode_access_token
+from .crud import pwd_context
+from .redis_client import get_redis
+
+log = structlog.get_logger()
+
+REQUIRED_STEPS = ("database",)
+
+
+class WarmupState:
+    def __init__(self):
+        self.ready = False
+        self.attempts = 0
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    def report(self) -> Dict[str, Any]:
+        return {"status": "ready" if self.ready else "warming", "attempts": self.attempts, "steps": self.steps}
+
+
+def _open_connections(engine: Engine, count: int) -> None:
+    # Hold them all at once so the pool really creates ``count`` connections,
+    # then return them; they stay open in the pool for the first requests.
+    connections = []
+    try:
+        for _ in range(count):
+            conn = engine.connect()
+            connections.append(conn)
+            conn.execute(text("SELECT 1"))
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+def warm_database(count: int) -> None:
+    engines: List[Engine] = [database.engine]
+    if database.post_shards is not None:
+        engines.extend(database.post_shards.engines)
+    for engine in engines:
+        _open_connections(engine, count)
+
+
+async def warm_redis() -> None:
+    await get_redis().ping()
+
+
+def warm_tokens() -> None:
+    token = create_access_token({"sub": "warmup"})
+    if decode_access_token(token) is None:
+        raise RuntimeError("JWT round trip failed")
+
+
+def warm_password_hash() -> None:
+    pwd_context.hash("warmup-password")
+
+
+def warm_serializers() -> None:
+    sample = {"id": 1, "title": "warm-up", "content": "x" * 1000, "owner_id": 1}
+    schemas.Post.model_validate(sample)
+    media_types = [negotiation.JSON_MEDIA_TYPE]
+    if negotiation.msgpack is not None:
+        media_types.append(negotiation.MSGPACK_MEDIA_TYPES[0])
+    encodings = ["gzip"] + (["br"] if negotiation.brotli is not None else [])
+    for media_type in media_types:
+        body = negotiation.encode_body([sample], media_type)
+        for encoding in encodings:
+            negotiation.compress(body, encoding)
+
+
+async def _run_step(state: WarmupState, name: str, timeout: float, step: Callable, *args) -> bool:
+    started = time.perf_counter()
+    try:
+        if asyncio.iscoroutinefunction(step):
+            await asyncio.wait_for(step(*args), timeout)
+        else:
+            await run_in_threadpool(step, *args)
+    except asyncio.TimeoutError:
+        state.steps[name] = {"ok": False, "error": f"timed out after {timeout}s"}
+        log.warning("Warm-up step timed out", step=name, timeout=timeout)
+        return False
+    except Exception as exc:
+        state.steps[name] = {"ok": False, "error": str(exc)}
+        log.warning("Warm-up step failed", step=name, error=str(exc))
+        return False
+    state.steps[name] = {"ok": True, "ms": round((time.perf_counter() - started) * 1000, 1)}
+    return True
+
+
+async def run_warmup(
+    state: WarmupState, *, db_connections: int = 5, retry_seconds: float = 5.0, step_timeout: float = 2.0
+) -> None:
+    """Warm the worker up: ready once the required steps pass, then the rest."""
+    steps: Dict[str, tuple] = {
+        "database": (warm_database, db_connections),
+        "redis": (warm_redis,),
+        "tokens": (warm_tokens,),
+        "password_hash": (warm_password_hash,),
+        "serializers": (warm_serializers,),
+    }
+    required = {name: steps.pop(name) for name in REQUIRED_STEPS}
+    while True:
+        state.attempts += 1
+        results = {name: await _run_step(state, name, step_timeout, *step) for name, step in required.items()}
+        if all(results.values()):
+            break
+        # Only the failed steps need another attempt.
+        required = {name: step for name, step in required.items() if not results[name]}
+        await asyncio.sleep(retry_seconds)
+    state.ready = True
+    for name, step in steps.items():
+        await _run_step(state, name, step_timeout, *step)
+    log.info("Worker warmed up", steps=state.steps)
+
+
+warmup_state = WarmupState()
+_warmup_task: Optional[asyncio.Task] = None
+
+
+def start_warmup(settings) -> None:
+    """Run the warm-up in the background; ``/readyz`` turns ready when it finishes."""
+    global _warmup_task
+    _warmup_task = asyncio.create_task(
+        run_warmup(
+            warmup_state,
+            db_connections=settings.WARMUP_DB_CONNECTIONS,
+            retry_seconds=settings.WARMUP_RETRY_SECONDS,
+            step_timeout=settings.WARMUP_STEP_TIMEOUT_SECONDS,
+        )
+    )
+
+
+async def stop_warmup() -> None:
+    warmup_state.ready = False
+    if _warmup_task is not None and not _warmup_task.done():
+        _warmup_task.cancel()
+        try:
+            await _warmup_task
+        except asyncio.CancelledError:
+            pass
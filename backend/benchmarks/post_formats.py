@@ -0,0 +1,68 @@
+"""Compare wire size and encode time of post-list response formats.
+
+Run from ``backend/``::
+
+    python -m benchmarks.post_formats [--posts 100] [--rounds 200]
+
+Each combination of media type (JSON, MessagePack) and content coding
+(identity, gzip, Brotli) encodes the same synthetic page of posts whose
+``content`` lengths are spread up to the 1000-character limit.
+"""
+
+import argparse
+import random
+import time
+
+from app import negotiation
+
+WORDS = (
+    "fastapi post user cache index query latency worker redis database "
+    "request response client server stream shard archive profile token"
+).split()
+
+
+def make_posts(count: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    posts = []
+    for i in range(count):
+        length = rng.randint(20, 1000)
+        words = []
+        while sum(len(w) + 1 for w in words) < length:
+            words.append(rng.choice(WORDS))
+        posts.append(
+            {
+                "id": i + 1,
+                "title": " ".join(rng.choices(WORDS, k=rng.randint(2, 8))).title(),
+                "content": " ".join(words)[:length],
+                "owner_id": rng.randint(1, 1000),
+            }
+        )
+    return posts
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    posts = make_posts(args.posts)
+    media_types = [negotiation.JSON_MEDIA_TYPE]
+    if negotiation.msgpack is not None:
+        media_types.append(negotiation.MSGPACK_MEDIA_TYPES[0])
+    encodings = [None, "gzip"] + (["br"] if negotiation.brotli is not None else [])
+
+    print(f"{'format':<22}{'encoding':<10}{'bytes':>10}{'encode us':>12}")
+    for media_type in media_types:
+        for encoding in encodings:
+            started = time.perf_counter()
+            for _ in range(args.rounds):
+                body = negotiation.encode_body(posts, media_type)
+                if encoding:
+                    body = negotiation.compress(body, encoding)
+            elapsed = (time.perf_counter() - started) / args.rounds * 1e6
+            print(f"{media_type:<22}{encoding or 'identity':<10}{len(body):>10}{elapsed:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
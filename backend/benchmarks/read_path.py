@@ -0,0 +1,82 @@
+"""Compare the ORM and the lean Core read paths for a page of posts.
+
+Run from ``backend/``::
+
+    python -m benchmarks.read_path [--posts 10000] [--rounds 20]
+
+Both paths read the same page from a temporary SQLite database and turn it
+into the list of dicts that ``GET /posts/`` serializes: ``crud.get_posts``
+plus ``negotiation.post_payload`` (ORM instances in the identity map) versus
+``crud.get_post_rows`` plus ``Row._asdict``. Time is the median per page in
+a fresh session; memory is the ``tracemalloc`` peak while building one page.
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models
+from app.negotiation import post_payload
+
+from .post_formats import make_posts
+
+
+def orm_page(db, limit):
+    return [post_payload(post) for post in crud.get_posts(db, limit=limit)]
+
+
+def lean_page(db, limit):
+    return [row._asdict() for row in crud.get_post_rows(db, limit=limit)]
+
+
+def measure(session_factory, page, limit, rounds):
+    timings = []
+    for _ in range(rounds):
+        db = session_factory()
+        try:
+            started = time.perf_counter()
+            page(db, limit)
+            timings.append(time.perf_counter() - started)
+        finally:
+            db.close()
+    db = session_factory()
+    try:
+        tracemalloc.start()
+        result = page(db, limit)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    finally:
+        db.close()
+    return statistics.median(timings), peak, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        models.Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            conn.execute(insert(models.Post.__table__), make_posts(args.posts))
+        session_factory = sessionmaker(bind=engine)
+
+        results = {}
+        print(f"{'path':<8}{'ms/page':>10}{'pages/s':>10}{'peak KiB':>12}")
+        for name, page in (("orm", orm_page), ("lean", lean_page)):
+            seconds, peak, results[name] = measure(session_factory, page, args.posts, args.rounds)
+            print(f"{name:<8}{seconds * 1000:>10.1f}{1 / seconds:>10.1f}{peak / 1024:>12.0f}")
+        assert results["orm"] == results["lean"]
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
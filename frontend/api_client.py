@@ -0,0 +1,120 @@
+"""Backend API access for the Streamlit app.
+
+Streamlit reruns the whole script on every interaction, so reads go through
+``st.cache_data`` with short TTLs and each browser session keeps a single
+pooled ``requests.Session`` (which also holds the auth cookies). Writes clear
+the affected caches so the next rerun sees fresh data.
+"""
+
+import os
+from typing import Any, Dict, List, Optional
+
+import requests
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+API_BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+REQUEST_TIMEOUT = (3.0, 10.0)  # connect, read
+POSTS_TTL_SECONDS = 30
+USER_TTL_SECONDS = 60
+CSRF_COOKIE = "fastapi-csrf-token"
+
+
+def get_session() -> requests.Session:
+    """Return this browser session's pooled HTTP session."""
+    if "api_session" not in st.session_state:
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=2,
+            pool_maxsize=4,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods=("GET",)),
+        )
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        st.session_state.api_session = session
+    return st.session_state.api_session
+
+
+def _csrf_headers(session: requests.Session) -> Dict[str, str]:
+    token = session.cookies.get(CSRF_COOKIE)
+    return {"X-CSRF-Token": token} if token else {}
+
+
+# Arguments starting with "_" are not hashed by st.cache_data, so the cache
+# key is just the page window (posts are public) or the access token.
+@st.cache_data(ttl=POSTS_TTL_SECONDS, show_spinner=False)
+def fetch_posts_page(_session: requests.Session, after_id: Optional[int], limit: int) -> List[Dict[str, Any]]:
+    """Return the ``limit`` posts following id ``after_id`` (from the start if None).
+
+    Keyset paging: every page costs the same, however deep, and the backend
+    caps ``skip`` anyway.
+    """
+    params = {"limit": limit}
+    if after_id is not None:
+        params["after_id"] = after_id
+    response = _session.get(
+        f"{API_BASE_URL}/posts/",
+        params=params,
+        headers={"Accept-Encoding": "gzip"},
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=USER_TTL_SECONDS, show_spinner=False)
+def fetch_current_user(_session: requests.Session, access_token: str) -> Optional[Dict[str, Any]]:
+    response = _session.get(f"{API_BASE_URL}/users/me", timeout=REQUEST_TIMEOUT)
+    if response.status_code in (401, 404):
+        return None
+    response.raise_for_status()
+    return response.json()
+
+
+def current_user() -> Optional[Dict[str, Any]]:
+    session = get_session()
+    token = session.cookies.get("access_token")
+    if not token:
+        return None
+    return fetch_current_user(session, token)
+
+
+def login(username: str, password: str) -> bool:
+    session = get_session()
+    response = session.post(
+        f"{API_BASE_URL}/login",
+        json={"username": username, "password": password},
+        timeout=REQUEST_TIMEOUT,
+    )
+    fetch_current_user.clear()
+    return response.ok
+
+
+def logout() -> None:
+    session = get_session()
+    session.post(f"{API_BASE_URL}/logout", headers=_csrf_headers(session), timeout=REQUEST_TIMEOUT)
+    session.cookies.clear()
+    fetch_current_user.clear()
+
+
+def create_post(user_id: int, title: str, content: str) -> Dict[str, Any]:
+    session = get_session()
+    response = session.post(
+        f"{API_BASE_URL}/users/{user_id}/posts/",
+        json={"title": title, "content": content},
+        headers=_csrf_headers(session),
+        timeout=REQUEST_TIMEOUT,
+    )
+    response.raise_for_status()
+    fetch_posts_page.clear()
+    return response.json()
+
+
+def delete_post(post_id: int) -> None:
+    session = get_session()
+    response = session.delete(
+        f"{API_BASE_URL}/posts/{post_id}", headers=_csrf_headers(session), timeout=REQUEST_TIMEOUT
+    )
+    response.raise_for_status()
+    fetch_posts_page.clear()
@@ -1,11 +1,19 @@
 import streamlit as st
-from components import render_header, render_footer, show_toast, show_modal
+from components import (
+    render_header,
+    render_footer,
+    render_login,
+    render_posts,
+    show_toast,
+    show_modal,
+)
 from theme import apply_theme
 
 def main():
     dark_mode = st.sidebar.checkbox("Dark mode", value=False)
     apply_theme(dark_mode=dark_mode)
     render_header()
+    user = render_login()
 
     st.write("Enter your name below:")
     with st.form(key="basic_form"):
@@ -17,6 +25,8 @@ def main():
     if st.button("Open Modal"):
         show_modal("Modal Title", "This is a simple modal example.")
 
+    render_posts(user)
+
     render_footer()
 
 
@@ -1,9 +1,12 @@
 from .layout import render_header, render_footer
 from .notifications import show_toast, show_modal
+from .posts import render_login, render_posts
 
 __all__ = [
     "render_header",
     "render_footer",
     "show_toast",
     "show_modal",
+    "render_login",
+    "render_posts",
 ]
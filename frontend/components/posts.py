@@ -0,0 +1,82 @@
+import requests
+import streamlit as st
+
+import api_client
+from .notifications import show_toast
+
+PAGE_SIZE = 20
+
+
+def render_login():
+    """Sidebar login/logout controls."""
+    user = api_client.current_user()
+    if user:
+        st.sidebar.write(f"Signed in as **{user['username']}**")
+        if st.sidebar.button("Log out"):
+            api_client.logout()
+            st.rerun()
+        return user
+
+    with st.sidebar.form(key="login_form"):
+        username = st.text_input("Username")
+        password = st.text_input("Password", type="password")
+        if st.form_submit_button("Log in"):
+            if api_client.login(username, password):
+                st.rerun()
+            st.error("Invalid credentials")
+    return None
+
+
+def render_posts(user=None):
+    """Show one page of posts at a time; only that page is fetched."""
+    st.subheader("Posts")
+    # The ``after_id`` cursor of every page visited so far; the last is the
+    # current page, popping it goes back one.
+    cursors = st.session_state.setdefault("posts_cursors", [None])
+    page = len(cursors) - 1
+
+    try:
+        # Ask for one extra row to learn whether a next page exists.
+        rows = api_client.fetch_posts_page(api_client.get_session(), cursors[-1], PAGE_SIZE + 1)
+    except requests.RequestException:
+        st.error("Could not load posts. Please try again.")
+        if st.button("Back to the first page"):
+            st.session_state.posts_cursors = [None]
+            st.rerun()
+        rows = []
+    for post in rows[:PAGE_SIZE]:
+        with st.container(border=True):
+            st.markdown(f"**{post['title']}**")
+            st.write(post["content"])
+            if user and post["owner_id"] == user["id"]:
+                if st.button("Delete", key=f"delete_{post['id']}"):
+                    try:
+                        api_client.delete_post(post["id"])
+                    except requests.RequestException:
+                        st.error("Could not delete the post.")
+                    else:
+                        show_toast("Post deleted")
+                        st.rerun()
+
+    prev_col, label_col, next_col = st.columns([1, 2, 1])
+    if prev_col.button("← Previous", disabled=page == 0):
+        cursors.pop()
+        st.rerun()
+    label_col.write(f"Page {page + 1}")
+    if next_col.button("Next →", disabled=len(rows) <= PAGE_SIZE):
+        cursors.append(rows[PAGE_SIZE - 1]["id"])
+        st.rerun()
+
+    if user:
+        with st.form(key="new_post_form", clear_on_submit=True):
+            title = st.text_input("Title", max_chars=100)
+            content = st.text_area("Content", max_chars=1000)
+            if st.form_submit_button("Publish") and title and content:
+                try:
+                    api_client.create_post(user["id"], title, content)
+                except requests.RequestException:
+                    st.error("Could not publish the post.")
+                else:
+                    st.session_state.posts_cursors = [None]
+                    show_toast("Post published")
+                    st.rerun()
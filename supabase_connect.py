@@ -1,32 +1,51 @@
+import argparse
 import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
 import psycopg2
+from psycopg2 import sql
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 
+# Parents before children: attachments and post_archive reference posts and
+# users. restore() truncates them all in one statement for the same reason,
+# in the transaction that loads them.
+BACKUP_TABLES = ("users", "posts", "attachments", "post_archive")
+COPY_CHUNK_SIZE = 1024 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_db_config():
+    """Return connection parameters from environment variables (.env supported)."""
+    load_dotenv()
+    return {
+        "host": os.getenv("DB_HOST"),
+        "port": os.getenv("DB_PORT"),
+        "dbname": os.getenv("DB_NAME"),
+        "user": os.getenv("DB_USER"),
+        "password": os.getenv("DB_PASSWORD")
+    }
+
+
 def connect_to_supabase():
     """
     Connect to the Supabase PostgreSQL database using environment variables.
-    
+
     Returns:
         conn: A database connection object if successful, None otherwise.
     """
     try:
-        # Load environment variables from .env file
-        load_dotenv()
-        
-        # Get database credentials from environment variables
-        db_config = {
-            "host": os.getenv("DB_HOST"),
-            "port": os.getenv("DB_PORT"),
-            "dbname": os.getenv("DB_NAME"),
-            "user": os.getenv("DB_USER"),
-            "password": os.getenv("DB_PASSWORD")
-        }
-        
         # Create a connection to the database
-        conn = psycopg2.connect(**db_config)
+        conn = psycopg2.connect(**get_db_config())
         print("✅ Successfully connected to Supabase!")
         return conn
-    
+
     except psycopg2.Error as e:
         print(f"❌ Error connecting to Supabase: {e}")
         return None
@@ -34,6 +53,220 @@ def connect_to_supabase():
         print(f"❌ An unexpected error occurred: {e}")
         return None
 
+
+def get_pool(minconn=1, maxconn=10, dsn=None):
+    """
+    Return the process-wide thread-safe connection pool, creating it on first use.
+
+    Args:
+        minconn: Connections opened up front.
+        maxconn: Upper bound on simultaneously checked-out connections.
+        dsn: Optional connection string overriding the DB_* variables.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if dsn:
+                    _pool = ThreadedConnectionPool(minconn, maxconn, dsn=dsn)
+                else:
+                    _pool = ThreadedConnectionPool(minconn, maxconn, **get_db_config())
+    return _pool
+
+
+def close_pool():
+    """Close every pooled connection."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+@contextmanager
+def pooled_connection():
+    """
+    Borrow a connection from the pool for the duration of a ``with`` block.
+
+    The transaction is committed on success and rolled back on error before
+    the connection goes back to the pool.
+    """
+    pool = get_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn)
+
+
+class ProgressReporter:
+    """Print throughput of a COPY at most once per ``interval`` seconds."""
+
+    def __init__(self, label, total_bytes=None, interval=1.0, stream=sys.stderr):
+        self.label = label
+        self.total_bytes = total_bytes
+        self.interval = interval
+        self.stream = stream
+        self.bytes = 0
+        self.started = time.monotonic()
+        self._last_report = self.started
+
+    def update(self, nbytes):
+        self.bytes += nbytes
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report()
+
+    def report(self, rows=None):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        message = f"📦 {self.label}: {self.bytes / 1e6:.1f} MB"
+        if self.total_bytes:
+            message += f" ({100 * self.bytes / self.total_bytes:.0f}%)"
+        message += f", {self.bytes / 1e6 / elapsed:.1f} MB/s"
+        if rows is not None:
+            message += f", {rows} rows ({rows / elapsed * 60:,.0f} rows/min)"
+        print(message, file=self.stream)
+
+
+class _CountingWriter:
+    """File wrapper feeding bytes written by ``COPY ... TO STDOUT`` to a reporter."""
+
+    def __init__(self, file, progress):
+        self._file = file
+        self._progress = progress
+
+    def write(self, data):
+        self._file.write(data)
+        if self._progress is not None:
+            self._progress.update(len(data))
+
+
+class _CountingReader:
+    """File wrapper feeding chunks read by ``COPY ... FROM STDIN`` to a reporter."""
+
+    def __init__(self, file, progress):
+        self._file = file
+        self._progress = progress
+
+    def read(self, size=-1):
+        data = self._file.read(size)
+        if self._progress is not None:
+            self._progress.update(len(data))
+        return data
+
+    def readline(self, size=-1):
+        data = self._file.readline(size)
+        if self._progress is not None:
+            self._progress.update(len(data))
+        return data
+
+
+def _copy_options(fmt):
+    if fmt not in ("binary", "csv"):
+        raise ValueError(f"Unsupported COPY format: {fmt}")
+    return sql.SQL("(FORMAT {})").format(sql.SQL(fmt))
+
+
+def export_table(table, path, fmt="binary", progress=True):
+    """
+    Stream a table to a file with ``COPY ... TO STDOUT``.
+
+    Rows are written as the server produces them, so memory use stays flat
+    regardless of table size.
+
+    Returns:
+        int: Number of rows exported.
+    """
+    reporter = ProgressReporter(f"export {table}") if progress else None
+    query = sql.SQL("COPY {} TO STDOUT WITH {}").format(sql.Identifier(table), _copy_options(fmt))
+    with pooled_connection() as conn, open(path, "wb") as f:
+        with conn.cursor() as cur:
+            cur.copy_expert(query, _CountingWriter(f, reporter))
+            rows = cur.rowcount
+    if reporter is not None:
+        reporter.report(rows)
+    return rows
+
+
+def _truncate(cur, tables, cascade=False):
+    query = sql.SQL("TRUNCATE {}").format(sql.SQL(", ").join(sql.Identifier(t) for t in tables))
+    cur.execute(query + sql.SQL(" CASCADE") if cascade else query)
+
+
+def _copy_in(cur, table, path, fmt, chunk_size, progress):
+    """COPY ``path`` into ``table`` on ``cur`` and move its ``id`` sequence along."""
+    total = Path(path).stat().st_size
+    reporter = ProgressReporter(f"import {table}", total_bytes=total) if progress else None
+    query = sql.SQL("COPY {} FROM STDIN WITH {}").format(sql.Identifier(table), _copy_options(fmt))
+    with open(path, "rb") as f:
+        cur.copy_expert(query, _CountingReader(f, reporter), size=chunk_size)
+    rows = cur.rowcount
+    # Tables without a serial id (post_archive keeps the post's) have no sequence.
+    cur.execute(
+        sql.SQL(
+            "SELECT setval(seq, COALESCE((SELECT MAX(id) FROM {}), 0) + 1, false) "
+            "FROM pg_get_serial_sequence(%s, 'id') AS seq WHERE seq IS NOT NULL"
+        ).format(sql.Identifier(table)),
+        (table,),
+    )
+    if reporter is not None:
+        reporter.report(rows)
+    return rows
+
+
+def import_table(table, path, fmt="binary", truncate=False, chunk_size=COPY_CHUNK_SIZE, progress=True):
+    """
+    Load a file produced by :func:`export_table` with ``COPY ... FROM STDIN``.
+
+    The file is sent in ``chunk_size`` pieces, in one transaction: a failed
+    load leaves the table as it was. With ``truncate`` the table is emptied
+    in that transaction first, ``CASCADE`` so tables referencing it (posts
+    for users, attachments and archived posts) are emptied as well. Because
+    the truncate and the COPY share a transaction, PostgreSQL can skip WAL
+    for the load when ``wal_level=minimal``. The ``id`` sequence is moved
+    past the imported rows afterwards.
+
+    Returns:
+        int: Number of rows imported.
+    """
+    with pooled_connection() as conn, conn.cursor() as cur:
+        if truncate:
+            _truncate(cur, [table], cascade=True)
+        return _copy_in(cur, table, path, fmt, chunk_size, progress)
+
+
+def backup(directory, tables=BACKUP_TABLES, fmt="binary"):
+    """Export each table to ``<directory>/<table>.<fmt>``."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    return {table: export_table(table, directory / f"{table}.{fmt}", fmt=fmt) for table in tables}
+
+
+def restore(directory, tables=BACKUP_TABLES, fmt="binary", truncate=True, chunk_size=COPY_CHUNK_SIZE, progress=True):
+    """
+    Import tables written by :func:`backup`, parents before children.
+
+    The truncate and every COPY run in one transaction, so a failed restore
+    leaves the database as it was instead of empty or half loaded, and the
+    loads can skip WAL when ``wal_level=minimal``.
+    """
+    directory = Path(directory)
+    with pooled_connection() as conn, conn.cursor() as cur:
+        if truncate:
+            # Truncate together: PostgreSQL refuses to truncate a table that
+            # another table references unless both are in the same statement.
+            _truncate(cur, tables)
+        return {
+            table: _copy_in(cur, table, directory / f"{table}.{fmt}", fmt, chunk_size, progress)
+            for table in tables
+        }
+
+
 def test_connection():
     """Test the database connection and print database version."""
     conn = connect_to_supabase()
@@ -67,6 +300,44 @@ def test_connection():
             conn.close()
             print("\n🔌 Database connection closed.")
 
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Supabase/PostgreSQL data tools")
+    parser.add_argument("--format", choices=("binary", "csv"), default="binary")
+    sub = parser.add_subparsers(dest="command")
+    sub.add_parser("check", help="test the connection (default)")
+    backup_cmd = sub.add_parser("backup", help="export users and posts")
+    backup_cmd.add_argument("directory")
+    restore_cmd = sub.add_parser("restore", help="import users and posts")
+    restore_cmd.add_argument("directory")
+    restore_cmd.add_argument("--append", action="store_true", help="keep existing rows")
+    export_cmd = sub.add_parser("export", help="export one table")
+    export_cmd.add_argument("table")
+    export_cmd.add_argument("path")
+    import_cmd = sub.add_parser("import", help="import one table")
+    import_cmd.add_argument("table")
+    import_cmd.add_argument("path")
+    import_cmd.add_argument(
+        "--truncate", action="store_true", help="empty the table first, and the tables referencing it"
+    )
+    args = parser.parse_args(argv)
+
+    if args.command in (None, "check"):
+        print("🚀 Attempting to connect to Supabase...")
+        test_connection()
+        return
+    try:
+        if args.command == "backup":
+            backup(args.directory, fmt=args.format)
+        elif args.command == "restore":
+            restore(args.directory, fmt=args.format, truncate=not args.append)
+        elif args.command == "export":
+            export_table(args.table, args.path, fmt=args.format)
+        else:
+            import_table(args.table, args.path, fmt=args.format, truncate=args.truncate)
+    finally:
+        close_pool()
+
+
 if __name__ == "__main__":
-    print("🚀 Attempting to connect to Supabase...")
-    test_connection()
+    main()
@@ -0,0 +1,118 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+httpx = pytest.importorskip("httpx")
+
+from fastapi import FastAPI
+
+from app.admission import AdmissionControlMiddleware, AdmissionController, AdmissionGroup
+
+
+def make_app(auth_limit=1, queue_size=0, queue_timeout=0.5):
+    release_login = asyncio.Event()
+    controller = AdmissionController(
+        {
+            "auth": AdmissionGroup("auth", auth_limit, queue_size, queue_timeout),
+            "read": AdmissionGroup("read", 4, 4, queue_timeout),
+            "write": AdmissionGroup("write", 4, 4, queue_timeout),
+        }
+    )
+    app = FastAPI()
+    app.add_middleware(AdmissionControlMiddleware, controller=controller)
+
+    @app.post("/login")
+    async def login():
+        await release_login.wait()
+        return {"message": "Login successful"}
+
+    @app.get("/posts/")
+    async def posts():
+        return []
+
+    return app, controller, release_login
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_auth_storm_is_shed_while_reads_are_served():
+    async def scenario():
+        app, controller, release_login = make_app()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            slow_login = asyncio.create_task(client.post("/login"))
+            await asyncio.sleep(0.01)
+
+            shed = await client.post("/login")
+            read = await client.get("/posts/")
+
+            release_login.set()
+            assert (await slow_login).status_code == 200
+        return shed, read, controller
+
+    shed, read, controller = run(scenario())
+    assert shed.status_code == 503
+    assert int(shed.headers["retry-after"]) >= 1
+    assert read.status_code == 200
+    stats = controller.stats()
+    assert stats["auth"]["shed"] == 1
+    assert stats["auth"]["in_flight"] == 0
+    assert stats["read"]["admitted"] == 1
+
+
+def test_queued_request_is_admitted_when_a_slot_frees():
+    async def scenario():
+        app, controller, release_login = make_app(queue_size=1, queue_timeout=1.0)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = asyncio.create_task(client.post("/login"))
+            await asyncio.sleep(0.01)
+            second = asyncio.create_task(client.post("/login"))
+            await asyncio.sleep(0.01)
+            depth = controller.groups["auth"].queue_depth
+            release_login.set()
+            return depth, await first, await second
+
+    depth, first, second = run(scenario())
+    assert depth == 1
+    assert first.status_code == 200
+    assert second.status_code == 200
+
+
+def test_queued_request_is_shed_at_deadline():
+    async def scenario():
+        group = AdmissionGroup("auth", limit=1, queue_size=1, queue_timeout=0.05)
+        assert await group.acquire()
+        admitted = await group.acquire()
+        group.release(0.01)
+        return admitted, group
+
+    admitted, group = run(scenario())
+    assert admitted is False
+    assert group.shed == 1
+    assert group.queue_depth == 0
+    assert group.in_flight == 0
+
+
+def test_slot_handed_over_at_the_deadline_is_not_leaked(monkeypatch):
+    group = AdmissionGroup("auth", limit=1, queue_size=1, queue_timeout=0.05)
+
+    async def handed_over_then_timed_out(waiter, timeout):
+        group.release(0.01)
+        assert waiter.done()
+        raise asyncio.TimeoutError
+
+    async def scenario():
+        assert await group.acquire()
+        monkeypatch.setattr(asyncio, "wait_for", handed_over_then_timed_out)
+        try:
+            return await group.acquire()
+        finally:
+            monkeypatch.undo()
+
+    assert run(scenario()) is False
+    assert group.shed == 1
+    assert group.in_flight == 0
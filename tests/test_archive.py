@@ -0,0 +1,100 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import archive, crud, models, schemas
+
+
+OLD = datetime(2020, 1, 1)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'archive.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def add_posts(db, count, created_at=None):
+    user = models.User(username=f"owner{count}", hashed_password="x")
+    db.add(user)
+    db.flush()
+    posts = [
+        models.Post(title=f"post {i}", content="archived words " * 40, owner_id=user.id, created_at=created_at)
+        for i in range(count)
+    ]
+    db.add_all(posts)
+    db.commit()
+    return [(post.id, post.owner_id) for post in posts]
+
+
+def count(engine, table):
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(table)).scalar()
+
+
+def test_old_posts_move_in_batches_and_read_through(engine, db):
+    old = add_posts(db, 7, created_at=OLD)
+    recent = add_posts(db, 3)
+    db.add(models.Attachment(post_id=old[0][0], filename="a.txt", content_type="text/plain", size=1, sha256="0" * 64))
+    db.commit()
+
+    result = archive.archive_posts(engine, datetime.utcnow() - timedelta(days=30), batch_size=4)
+
+    assert (result.archived, result.batches) == (6, 2)
+    assert 0 < result.stored_bytes < result.raw_bytes
+    assert count(engine, models.Post.__table__) == 4  # three recent, one with an attachment
+    assert [row.id for row in crud.get_post_rows(db)] == sorted([old[0][0]] + [post_id for post_id, _ in recent])
+
+    post_id, owner_id = old[1]
+    row = crud.get_post_row(db, post_id)
+    assert row._asdict() == {
+        "id": post_id,
+        "title": "post 1",
+        "content": "archived words " * 40,
+        "owner_id": owner_id,
+    }
+    post = crud.get_post(db, post_id)
+    assert (post.id, post.owner_id, post.created_at) == (post_id, owner_id, OLD)
+    assert crud.get_post_row(db, 10_000) is None
+
+
+def test_delete_and_attach_on_archived_posts(engine, db):
+    (first, _), (second, _) = add_posts(db, 2, created_at=OLD)
+    archive.archive_posts(engine, datetime.utcnow())
+    db.expunge_all()
+
+    assert crud.delete_post(db, first)
+    assert crud.get_post(db, first) is None
+
+    post = crud.get_post(db, second)
+    crud.create_attachment(db, post, filename="a.txt", content_type="text/plain", size=1, sha256="0" * 64)
+    assert count(engine, models.PostArchive.__table__) == 0
+    assert db.get(models.Post, second).created_at == OLD
+
+
+def test_new_posts_never_reuse_archived_ids(engine, db):
+    ((archived_id, owner_id),) = add_posts(db, 1, created_at=OLD)
+    archive.archive_posts(engine, datetime.utcnow())
+
+    post = crud.create_user_post(db, schemas.PostCreate(title="new", content="fresh"), owner_id)
+    assert post.id > archived_id
+    assert crud.get_post_row(db, archived_id).title == "post 0"
+
+    crud.create_attachment(db, post, filename="a.txt", content_type="text/plain", size=1, sha256="0" * 64)
+    assert count(engine, models.PostArchive.__table__) == 1
@@ -0,0 +1,168 @@
+import asyncio
+import hashlib
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("sqlalchemy")
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, schemas
+from app.attachments import attachment_response, content_disposition, parse_range
+from app.storage import AttachmentTooLarge, LocalDiskStorage, collect_garbage
+
+
+async def chunked(data, size=7):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def test_parse_range():
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    with pytest.raises(ValueError):
+        parse_range("bytes=100-", 100)
+
+
+def test_local_storage_deduplicates_and_enforces_limit(tmp_path):
+    storage = LocalDiskStorage(str(tmp_path))
+    data = b"attachment body" * 10
+
+    first = asyncio.run(storage.save(chunked(data), max_size=1000))
+    second = asyncio.run(storage.save(chunked(data), max_size=1000))
+    assert first.sha256 == second.sha256 == hashlib.sha256(data).hexdigest()
+    assert (first.deduplicated, second.deduplicated) == (False, True)
+    assert storage.local_path(first.sha256).read_bytes() == data
+
+    with pytest.raises(AttachmentTooLarge):
+        asyncio.run(storage.save(chunked(data), max_size=10))
+    assert list((tmp_path / "tmp").iterdir()) == []
+
+    assert collect_garbage(storage, {first.sha256}, grace_seconds=0) == 0
+    assert collect_garbage(storage, set(), grace_seconds=3600) == 0
+    assert collect_garbage(storage, set(), grace_seconds=-1) == 1
+    assert storage.local_path(first.sha256) is None
+
+
+def test_attachment_response_ranges_and_etag(tmp_path):
+    data = bytes(range(256)) * 4
+    sha256 = hashlib.sha256(data).hexdigest()
+    path = tmp_path / "blob"
+    path.write_bytes(data)
+
+    app = FastAPI()
+
+    @app.get("/blob")
+    def blob(request: Request):
+        return attachment_response(request, path, sha256=sha256, media_type="application/octet-stream", filename="b.bin")
+
+    client = TestClient(app)
+    full = client.get("/blob")
+    assert full.status_code == 200 and full.content == data
+    assert full.headers["etag"] == f'"{sha256}"'
+    assert full.headers["accept-ranges"] == "bytes"
+    assert full.headers["content-disposition"] == 'attachment; filename="b.bin"'
+    assert full.headers["x-content-type-options"] == "nosniff"
+
+    part = client.get("/blob", headers={"Range": "bytes=10-19"})
+    assert part.status_code == 206
+    assert part.content == data[10:20]
+    assert part.headers["content-range"] == f"bytes 10-19/{len(data)}"
+    assert part.headers["content-disposition"] == 'attachment; filename="b.bin"'
+    assert part.headers["x-content-type-options"] == "nosniff"
+
+    assert client.get("/blob", headers={"Range": "bytes=-4"}).content == data[-4:]
+    assert client.get("/blob", headers={"Range": "bytes=0-1", "If-Range": '"stale"'}).status_code == 200
+    assert client.get("/blob", headers={"Range": f"bytes={len(data)}-"}).status_code == 416
+    assert client.get("/blob", headers={"If-None-Match": f'"{sha256}"'}).status_code == 304
+
+
+def test_content_disposition_escapes_unsafe_names():
+    assert content_disposition("report.pdf") == 'attachment; filename="report.pdf"'
+    assert content_disposition('a"b.html') == "attachment; filename*=utf-8''a%22b.html"
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    from fastapi_csrf_protect import CsrfProtect
+
+    from app import storage
+    from app.auth import create_access_token
+    from app.config import get_settings
+    from app.database import Base, engine
+    from app.main import app
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    monkeypatch.setattr(storage, "_storage", LocalDiskStorage(str(tmp_path)))
+    monkeypatch.setattr(get_settings(), "ATTACHMENT_MAX_BYTES", 64)
+    db = sessionmaker(bind=engine)()
+    try:
+        owner = crud.create_user(db, schemas.UserCreate(username="owner", password="password1"))
+        crud.create_user(db, schemas.UserCreate(username="other", password="password1"))
+        post_id = crud.create_user_post(db, schemas.PostCreate(title="t", content="c"), owner.id).id
+    finally:
+        db.close()
+
+    def client_for(username):
+        # No lifespan: uploads need neither Redis nor the background tasks.
+        client = TestClient(app)
+        token, signed = CsrfProtect().generate_csrf_tokens()
+        client.cookies.set("access_token", create_access_token({"sub": username}))
+        client.cookies.set("fastapi-csrf-token", signed)
+        client.headers["X-CSRF-Token"] = token
+        return client
+
+    return client_for, post_id
+
+
+def test_upload_and_download_attachment(api):
+    client_for, post_id = api
+    client = client_for("owner")
+    data = b"<script>alert(1)</script>"
+    resp = client.post(
+        f"/posts/{post_id}/attachments", params={"filename": "../x.html"}, content=data, headers={"Content-Type": "text/html"}
+    )
+    assert resp.status_code == 200
+    attachment = resp.json()
+    assert (attachment["filename"], attachment["size"]) == ("x.html", len(data))
+
+    download = client.get(f"/posts/{post_id}/attachments/{attachment['id']}")
+    assert download.content == data
+    assert download.headers["content-disposition"] == 'attachment; filename="x.html"'
+    assert download.headers["x-content-type-options"] == "nosniff"
+
+
+def test_upload_limits_and_ownership(api):
+    client_for, post_id = api
+    url = f"/posts/{post_id}/attachments"
+    assert client_for("owner").post(url, params={"filename": "big"}, content=b"x" * 65).status_code == 413
+    assert client_for("other").post(url, params={"filename": "a"}, content=b"x").status_code == 403
+
+
+def test_deleting_a_post_removes_its_attachments(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    try:
+        post = crud.create_user_post(db, schemas.PostCreate(title="t", content="c"), 1)
+        attachment = crud.create_attachment(
+            db, post, filename="a.txt", content_type="text/plain", size=3, sha256="a" * 64
+        )
+        assert [a.id for a in crud.get_attachments(db, post)] == [attachment.id]
+        assert crud.get_attachment_hashes(db) == {"a" * 64}
+
+        assert crud.delete_post(db, post.id)
+        assert db.query(models.Attachment).count() == 0
+        assert crud.get_attachment_hashes(db) == set()
+    finally:
+        db.close()
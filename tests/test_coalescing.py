@@ -0,0 +1,120 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models
+from app.coalescing import BatchLoader, OrmSingleFlight, SingleFlight
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'coalescing.db'}", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+
+def test_single_flight_shares_one_run_between_concurrent_callers():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def lookup():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return "post"
+
+    with ThreadPoolExecutor(8) as pool:
+        leader = pool.submit(flight.do, 1, lookup)
+        started.wait(5)
+        followers = [pool.submit(flight.do, 1, lookup) for _ in range(7)]
+        while flight.stats["shared"] < 7:
+            time.sleep(0.001)
+        release.set()
+        assert leader.result() == ("post", False)
+        assert [f.result() for f in followers] == [("post", True)] * 7
+    assert runs == [1]
+    assert flight.snapshot() == {"calls": 8, "queries": 1, "shared": 7, "in_flight": 0}
+
+    def failing():
+        raise RuntimeError("db down")
+
+    with pytest.raises(RuntimeError):
+        flight.do(1, failing)
+    assert flight.do(1, lambda: "again") == ("again", False)
+
+
+def test_followers_get_their_own_orm_instance(session_factory):
+    setup = session_factory()
+    setup.add(models.User(username="shared", hashed_password="x"))
+    setup.commit()
+    setup.close()
+
+    flight = OrmSingleFlight(SingleFlight())
+    leader_db, follower_db = session_factory(), session_factory()
+    follower_result = []
+
+    def leader_lookup():
+        # The follower joins while the leader's query is in flight.
+        follower = threading.Thread(
+            target=lambda: follower_result.append(flight.load(follower_db, "shared", lambda: None))
+        )
+        follower.start()
+        while flight.flight.stats["shared"] == 0:
+            time.sleep(0.001)
+        follower_result.append(follower)
+        return leader_db.query(models.User).filter_by(username="shared").first()
+
+    user = flight.load(leader_db, "shared", leader_lookup)
+    follower_result[0].join(5)
+    copy = follower_result[1]
+    assert copy is not user and copy.username == user.username
+    assert copy in follower_db and user in leader_db
+    copy.role = "admin"
+    follower_db.commit()
+    leader_db.refresh(user)
+    assert user.role == "admin"
+
+
+def test_batch_loader_collapses_concurrent_ids_into_one_query(session_factory):
+    db = session_factory()
+    owner = models.User(username="owner", hashed_password="x")
+    db.add(owner)
+    db.flush()
+    db.add_all(models.Post(title=f"t{i}", content="c", owner_id=owner.id) for i in range(10))
+    db.commit()
+    ids = [post.id for post in db.query(models.Post)]
+    db.close()
+
+    fetched = []
+
+    def fetch(session, post_ids):
+        fetched.append(sorted(post_ids))
+        return crud._get_post_rows_by_id(session, post_ids)
+
+    loader = BatchLoader(fetch, window=0.2, max_batch=100)
+    barrier = threading.Barrier(len(ids) + 1)
+
+    def load(post_id):
+        session = session_factory()
+        try:
+            barrier.wait()
+            return loader.load(session, post_id)
+        finally:
+            session.close()
+
+    with ThreadPoolExecutor(len(ids) + 1) as pool:
+        rows = list(pool.map(load, ids + [10_000]))
+    assert fetched == [sorted(ids + [10_000])]
+    assert [row.title for row in rows[:-1]] == [f"t{i}" for i in range(10)]
+    assert rows[-1] is None
+    assert loader.snapshot() == {"calls": 11, "queries": 1, "max_batch": 11}
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import broker, crud, models, schemas
+from app.broker import InMemoryBroker, set_broker
+from app.feed import CHANNEL, FeedHub
+
+
+def publish(broker, n, start=0):
+    for i in range(start, start + n):
+        broker.publish(CHANNEL, json.dumps({"type": "post_created", "data": {"id": i}}))
+
+
+async def take(events, n):
+    out = []
+    async for event in events:
+        if event is not None:
+            out.append(event)
+        if len(out) == n:
+            break
+    return out
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_events_fan_out_to_every_client():
+    async def scenario():
+        broker = InMemoryBroker()
+        hub = FeedHub(broker)
+        await hub.start()
+        first, second = hub.events(), hub.events()
+        readers = [asyncio.create_task(take(first, 3)), asyncio.create_task(take(second, 3))]
+        await settle()
+        # crud publishes from threadpool threads.
+        thread = threading.Thread(target=publish, args=(broker, 3))
+        thread.start()
+        thread.join()
+        results = await asyncio.wait_for(asyncio.gather(*readers), 1)
+        await hub.stop()
+        return results, hub.stats()
+
+    results, stats = asyncio.run(scenario())
+    for events in results:
+        assert [e.id for e in events] == [1, 2, 3]
+        assert [e.data["id"] for e in events] == [0, 1, 2]
+    assert stats["events_received"] == 3
+
+
+def test_slow_consumer_is_disconnected():
+    async def scenario():
+        broker = InMemoryBroker()
+        hub = FeedHub(broker, queue_size=2)
+        await hub.start()
+        events = hub.events()
+        first = asyncio.ensure_future(events.__anext__())
+        await settle()
+        publish(broker, 1)
+        await settle()
+        assert (await first).id == 1
+        publish(broker, 5)
+        await settle()
+        # The backlog was dropped and the stream ends.
+        remaining = [e async for e in events]
+        stats = hub.stats()
+        await hub.stop()
+        return remaining, stats
+
+    remaining, stats = asyncio.run(scenario())
+    assert remaining == []
+    assert stats["slow_disconnects"] == 1
+    assert stats["clients"] == 0
+
+
+def test_resume_replays_history_or_resets():
+    async def scenario():
+        broker = InMemoryBroker()
+        hub = FeedHub(broker, history_size=3)
+        await hub.start()
+        publish(broker, 5)
+        await settle()
+        resumed = await take(hub.events(last_event_id=3), 2)
+        too_old = await take(hub.events(last_event_id=1), 1)
+        await hub.stop()
+        return resumed, too_old
+
+    resumed, too_old = asyncio.run(scenario())
+    assert [e.id for e in resumed] == [4, 5]
+    assert [(e.type, e.id) for e in too_old] == [("reset", 5)]
+
+
+def test_sse_format():
+    async def scenario():
+        broker = InMemoryBroker()
+        hub = FeedHub(broker, heartbeat=0.01)
+        await hub.start()
+        stream = hub.sse()
+        chunks = [await stream.__anext__(), await stream.__anext__()]
+        publish(broker, 1)
+        while True:
+            chunk = await stream.__anext__()
+            if not chunk.startswith(":"):
+                chunks.append(chunk)
+                break
+        await stream.aclose()
+        await hub.stop()
+        return chunks
+
+    retry, ping, event = asyncio.run(scenario())
+    assert retry == "retry: 10\n\n"
+    assert ping == ": ping\n\n"
+    assert event == 'id: 1\nevent: post_created\ndata: {"id": 0}\n\n'
+
+
+def test_crud_publishes_post_events(tmp_path, monkeypatch):
+    monkeypatch.setattr(broker, "_publish_suspended_until", 0.0)
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    set_broker(InMemoryBroker())
+
+    async def scenario():
+        hub = FeedHub()
+        await hub.start()
+        reader = asyncio.create_task(take(hub.events(), 2))
+        await settle()
+        post = crud.create_user_post(db, schemas.PostCreate(title="hello", content="c"), 7)
+        crud.delete_post(db, post.id)
+        events = await asyncio.wait_for(reader, 1)
+        await hub.stop()
+        return post.id, events
+
+    try:
+        post_id, events = asyncio.run(scenario())
+    finally:
+        set_broker(None)
+        db.close()
+    assert [e.type for e in events] == ["post_created", "post_deleted"]
+    assert events[0].data == {"id": post_id, "title": "hello", "content": "c", "owner_id": 7}
+    assert events[1].data == {"id": post_id}
@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import anyio
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from app.idempotency import IdempotencyMiddleware, InMemoryIdempotencyStore
+
+
+def make_client(**options):
+    calls = []
+    app = FastAPI()
+    app.add_middleware(IdempotencyMiddleware, store=InMemoryIdempotencyStore(), **options)
+
+    @app.post("/items")
+    async def create_item(request: Request, response: Response):
+        payload = await request.json()
+        calls.append(payload)
+        await anyio.sleep(0.05)
+        response.set_cookie("session", "secret")
+        return {"n": len(calls), **payload}
+
+    @app.post("/fail")
+    async def fail():
+        calls.append("fail")
+        return Response(status_code=503)
+
+    @app.post("/login")
+    async def login():
+        calls.append("login")
+        return {"ok": True}
+
+    return TestClient(app), calls
+
+
+def test_retry_replays_stored_response():
+    client, calls = make_client()
+    headers = {"Idempotency-Key": "abc"}
+    first = client.post("/items", json={"x": 1}, headers=headers)
+    second = client.post("/items", json={"x": 1}, headers=headers)
+    assert first.json() == second.json() == {"n": 1, "x": 1}
+    assert len(calls) == 1
+    assert second.headers["idempotent-replayed"] == "true"
+    assert "set-cookie" in first.headers and "set-cookie" not in second.headers
+
+    # Other keys, other callers and key-less requests run normally.
+    client.post("/items", json={"x": 1}, headers={"Idempotency-Key": "other"})
+    client.post("/items", json={"x": 1}, headers={**headers, "Authorization": "Bearer someone-else"})
+    client.post("/items", json={"x": 1})
+    assert len(calls) == 4
+
+
+def test_reused_key_with_different_body_is_rejected():
+    client, calls = make_client()
+    client.post("/items", json={"x": 1}, headers={"Idempotency-Key": "abc"})
+    resp = client.post("/items", json={"x": 2}, headers={"Idempotency-Key": "abc"})
+    assert resp.status_code == 422
+    assert len(calls) == 1
+
+
+def test_concurrent_duplicates_wait_for_the_first_request():
+    client, calls = make_client()
+    results = []
+
+    def send():
+        results.append(client.post("/items", json={"x": 1}, headers={"Idempotency-Key": "same"}))
+
+    with client:
+        threads = [threading.Thread(target=send) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert len(calls) == 1
+    assert {r.status_code for r in results} == {200}
+    assert sum(r.headers.get("idempotent-replayed") == "true" for r in results) == 4
+
+
+def test_failures_large_bodies_and_session_routes_are_not_stored():
+    client, calls = make_client(max_body=100)
+    headers = {"Idempotency-Key": "k"}
+    assert client.post("/fail", headers=headers).status_code == 503
+    assert client.post("/fail", headers=headers).status_code == 503
+    client.post("/items", json={"x": "y" * 200}, headers=headers)
+    client.post("/items", json={"x": "y" * 200}, headers=headers)
+    client.post("/login", headers=headers)
+    client.post("/login", headers=headers)
+    assert calls.count("fail") == 2
+    assert len([c for c in calls if isinstance(c, dict)]) == 2
+    assert calls.count("login") == 2
@@ -0,0 +1,96 @@
+import gzip
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app import negotiation
+
+
+def make_client():
+    app = FastAPI()
+    posts = [{"id": i, "title": f"Post {i}", "content": "x" * 500, "owner_id": 1} for i in range(10)]
+
+    @app.get("/posts/")
+    def read_posts(request: Request):
+        return negotiation.negotiated_response(request, posts, cacheable=True)
+
+    @app.get("/small")
+    def small(request: Request):
+        return negotiation.negotiated_response(request, {"ok": True})
+
+    return TestClient(app), posts
+
+
+def test_json_is_default_and_gzip_applied_above_threshold():
+    client, posts = make_client()
+    resp = client.get("/posts/", headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/json"
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.json() == posts
+
+    small = client.get("/small", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in small.headers
+    assert small.json() == {"ok": True}
+
+
+def test_msgpack_when_preferred():
+    msgpack = pytest.importorskip("msgpack")
+    client, posts = make_client()
+    resp = client.get("/posts/", headers={"Accept": "application/msgpack, application/json;q=0.5", "Accept-Encoding": "identity"})
+    assert resp.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(resp.content) == posts
+
+
+def test_cached_compression_and_etag():
+    client, _ = make_client()
+    negotiation._compressed_cache.clear()
+    hits = negotiation.cache_stats["hits"]
+    first = client.get("/posts/", headers={"Accept-Encoding": "gzip"})
+    second = client.get("/posts/", headers={"Accept-Encoding": "gzip"})
+    assert negotiation.cache_stats["hits"] == hits + 1
+    assert first.headers["etag"] == second.headers["etag"]
+
+    not_modified = client.get("/posts/", headers={"If-None-Match": first.headers["etag"]})
+    assert not_modified.status_code == 304
+
+
+def test_choose_encoding_prefers_brotli_when_available():
+    expected = "br" if negotiation.brotli is not None else "gzip"
+    assert negotiation.choose_encoding("gzip, deflate, br") == expected
+    assert negotiation.choose_encoding("gzip;q=0") is None
+    assert gzip.decompress(negotiation.compress(b"abc" * 10, "gzip")) == b"abc" * 10
+
+
+@pytest.mark.parametrize(
+    "header, with_brotli, without_brotli",
+    [
+        ("br;q=0, gzip", "gzip", "gzip"),
+        ("br;q = 0, gzip", "gzip", "gzip"),
+        ("BR;Q=0", None, None),
+        ("gzip;q=1, br;q=0.5", "gzip", "gzip"),
+        ("gzip;q=0.5, br", "br", "gzip"),
+        ("*", "br", "gzip"),
+        ("gzip;q=0, *", "br", None),
+        ("identity", None, None),
+    ],
+)
+def test_choose_encoding_honours_q_values(header, with_brotli, without_brotli):
+    expected = with_brotli if negotiation.brotli is not None else without_brotli
+    assert negotiation.choose_encoding(header) == expected
+
+
+def test_if_none_match_compares_whole_tags():
+    client, _ = make_client()
+    etag = client.get("/posts/").headers["etag"]
+    opaque = etag[2:]
+
+    for header in (f'"other", {etag}', opaque, "*"):
+        assert client.get("/posts/", headers={"If-None-Match": header}).status_code == 304
+    # A prefix of the tag, or the tag inside a longer one, is not a match.
+    for header in (etag[:-3] + '"', f'W/"x{opaque[1:]}', f"x{etag}"):
+        assert client.get("/posts/", headers={"If-None-Match": header}).status_code == 200
@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("passlib")
+
+from passlib.context import CryptContext
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from unittest.mock import patch
+
+from app import crud, models, passwords
+
+
+def test_calibrate_rounds_picks_highest_cost_within_budget():
+    # 10 rounds take 50 ms on this imaginary machine, each round doubles it.
+    measure = lambda rounds: 0.05 * 2 ** (rounds - 10)
+    assert passwords.calibrate_rounds(250, measure=measure) == 12
+    assert passwords.calibrate_rounds(100, measure=measure) == 11
+    assert passwords.calibrate_rounds(10, measure=measure) == 10
+    assert passwords.calibrate_rounds(10_000, measure=measure, max_rounds=14) == 14
+
+
+def test_calibrate_rounds_steps_down_when_prediction_overshoots():
+    timings = {10: 0.05, 11: 0.1, 12: 0.4}
+    assert passwords.calibrate_rounds(250, measure=timings.__getitem__) == 11
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'passwords.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def test_rehash_moves_hash_to_configured_cost(db):
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4).hash("hunter22")
+    user = models.User(username="carol", hashed_password=old_hash, role="user")
+    db.add(user)
+    db.commit()
+
+    with patch.object(crud, "pwd_context", CryptContext(schemes=["bcrypt"], bcrypt__rounds=5)):
+        assert crud.password_needs_rehash(old_hash)
+        assert crud.rehash_user_password(db, user.id, "hunter22", old_hash)
+        db.refresh(user)
+        assert user.hashed_password.startswith("$2b$05$")
+        assert not crud.password_needs_rehash(user.hashed_password)
+        assert crud.verify_password("hunter22", user.hashed_password)
+
+        # A stale old_hash (password changed meanwhile) is left alone.
+        assert not crud.rehash_user_password(db, user.id, "hunter22", old_hash)
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from app import broker
+from app.broker import InMemoryBroker
+from app.negotiation import JSON_MEDIA_TYPE, encode_payload
+from app.postcache import CHANNEL, ENTRY_OVERHEAD, PostCache
+
+JSON = (JSON_MEDIA_TYPE, None)
+GZIP = (JSON_MEDIA_TYPE, "gzip")
+
+
+def payload(post_id, size=100, variant=JSON):
+    return encode_payload(
+        {"id": post_id, "title": "t", "content": "x" * size, "owner_id": 1}, *variant, etag=True
+    )
+
+
+def entry_size(post_id, size=100):
+    encoded = payload(post_id, size)
+    return len(encoded.content) + len(encoded.etag) + ENTRY_OVERHEAD
+
+
+def test_lru_is_bounded_by_bytes():
+    cache = PostCache(max_bytes=3 * entry_size(1))
+    for post_id in (1, 2, 3):
+        cache.put(post_id, JSON, payload(post_id), cache.generation)
+    assert cache.get(1, JSON) is not None  # 1 is now most recently used
+    cache.put(4, JSON, payload(4), cache.generation)
+    assert cache.get(2, JSON) is None
+    assert [cache.get(i, JSON) is not None for i in (1, 3, 4)] == [True, True, True]
+    snapshot = cache.snapshot()
+    assert snapshot["evictions"] == 1 and snapshot["bytes"] <= cache.max_bytes
+
+    cache.put(5, JSON, payload(5, size=10_000), cache.generation)  # larger than the whole budget
+    assert cache.get(5, JSON) is None
+
+
+def test_stale_fill_and_expired_entries_are_rejected():
+    cache = PostCache(ttl=0.0)
+    generation = cache.generation
+    cache.invalidate(1)  # a delete raced with the read
+    cache.put(1, JSON, payload(1), generation)
+    assert cache.snapshot()["entries"] == 0
+
+    cache.put(1, JSON, payload(1), cache.generation)
+    assert cache.get(1, JSON) is None
+    assert cache.stats["expired"] == 1
+
+
+def test_invalidation_reaches_every_worker(monkeypatch):
+    memory = InMemoryBroker()
+    monkeypatch.setattr(broker, "_broker", memory)
+    monkeypatch.setattr(broker, "_publish_suspended_until", 0.0)
+
+    async def scenario():
+        workers = [PostCache(broker=memory, version_check_interval=60) for _ in range(2)]
+        for worker in workers:
+            await worker.start()
+            worker.put(7, JSON, payload(7), worker.generation)
+        workers[0].invalidate_everywhere(7)
+        await asyncio.sleep(0.01)
+        result = [worker.get(7, JSON) for worker in workers]
+        for worker in workers:
+            await worker.stop()
+        return result
+
+    assert asyncio.run(scenario()) == [None, None]
+
+
+def test_version_check_clears_after_missed_messages():
+    memory = InMemoryBroker()
+
+    async def scenario():
+        cache = PostCache(broker=memory, version_check_interval=0.01)
+        await cache.start()
+        cache.put(1, JSON, payload(1), cache.generation)
+        # An invalidation this worker never received.
+        memory._sequences[CHANNEL] = 5
+        await asyncio.sleep(0.05)
+        hit = cache.get(1, JSON)
+        await cache.stop()
+        return hit, cache.stats["clears"]
+
+    hit, clears = asyncio.run(scenario())
+    assert hit is None
+    assert clears == 1
+
+
+def test_variants_are_cached_encoded_and_invalidated_together():
+    cache = PostCache()
+    plain, compressed = payload(1, 5000), payload(1, 5000, GZIP)
+    assert compressed.encoding == "gzip" and len(compressed.content) < len(plain.content)
+    cache.put(1, JSON, plain, cache.generation)
+    cache.put(1, GZIP, compressed, cache.generation)
+    assert cache.get(1, GZIP) is compressed and cache.get(1, JSON) is plain
+    assert cache.snapshot()["bytes"] == sum(
+        len(encoded.content) + len(encoded.etag) + ENTRY_OVERHEAD for encoded in (plain, compressed)
+    )
+
+    cache.invalidate(1)
+    assert cache.get(1, JSON) is None and cache.get(1, GZIP) is None
+    assert cache.snapshot()["bytes"] == 0
@@ -6,12 +6,15 @@ from fastapi.testclient import TestClient
 from app.database import Base, engine
 from app.main import app
 from app import crud
+from app.postcache import post_cache
 
 
 @pytest.fixture
 def client():
     Base.metadata.drop_all(bind=engine)
     Base.metadata.create_all(bind=engine)
+    # Post ids restart with the database; drop payloads cached by earlier tests.
+    post_cache.clear()
     with TestClient(app) as c:
         yield c
 
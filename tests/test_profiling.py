@@ -0,0 +1,100 @@
+import threading
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.coalescing import SingleFlight
+from app.profiling import ProfileTarget, ProfilingMiddleware, SamplingProfiler
+
+
+def busy_work(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def make_client():
+    profiler = SamplingProfiler()
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware, profiler=profiler)
+
+    @app.get("/slow")
+    async def slow():
+        # Runs on the event loop thread under the middleware frame.
+        busy_work(0.05)
+        return {"ok": True}
+
+    @app.get("/sync")
+    def sync_slow():
+        # Runs in a threadpool thread, outside the middleware frame.
+        busy_work(0.05)
+        return {"ok": True}
+
+    @app.get("/fast")
+    async def fast():
+        return {"ok": True}
+
+    return TestClient(app), profiler
+
+
+def profiler_threads():
+    return [t for t in threading.enumerate() if t.name == "profiler"]
+
+
+def test_idle_profiler_does_nothing():
+    client, profiler = make_client()
+    client.get("/slow")
+    assert profiler.status()["profiled_requests"] == 0
+    assert profiler.collapsed() == ""
+    assert not profiler_threads()
+
+
+def test_armed_profiler_samples_matching_requests_only():
+    client, profiler = make_client()
+    profiler.arm(ProfileTarget(requests=2, path_prefix="/slow", interval=0.001))
+
+    client.get("/fast")
+    client.get("/slow")
+    assert profiler.armed
+    client.get("/slow")
+    assert not profiler.armed
+    client.get("/slow")
+
+    status = profiler.status()
+    assert status["profiled_requests"] == 2
+    assert status["samples"] > 0
+    lines = profiler.collapsed().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("busy_work" in line for line in lines)
+    assert any(entry["function"].startswith("busy_work") for entry in status["top_functions"])
+
+    time.sleep(0.05)
+    assert not profiler_threads()
+
+
+def test_header_target():
+    target = ProfileTarget(requests=1, header_name="X-Profile", header_value="1")
+    assert target.matches({"path": "/posts/", "headers": [(b"x-profile", b"1")]})
+    assert not target.matches({"path": "/posts/", "headers": [(b"x-profile", b"0")]})
+    assert not target.matches({"path": "/posts/", "headers": []})
+
+
+def test_only_claimed_requests_are_sampled():
+    client, profiler = make_client()
+    profiler.arm(ProfileTarget(requests=1, path_prefix="/sync", interval=0.001))
+
+    # Unprofiled work passing through app code in another thread at the same time.
+    other = threading.Thread(target=SingleFlight().do, args=("k", lambda: busy_work(0.2)))
+    other.start()
+    client.get("/sync")
+    other.join()
+
+    lines = profiler.collapsed().splitlines()
+    assert any("sync_slow" in line for line in lines)
+    assert all("sync_slow" in line for line in lines if "busy_work" in line)
+    assert not any("coalescing.py" in line for line in lines)
@@ -0,0 +1,100 @@
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, schemas
+from app.auth import create_access_token
+from app.database import Base, engine
+from app.main import app, query_monitor
+from app.postcache import post_cache
+from app.querybudget import ENDPOINT_BUDGETS, QueryMonitor
+
+
+@pytest.fixture
+def client():
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    # Post ids restart with the database; drop payloads cached by earlier tests.
+    post_cache.clear()
+    # No lifespan: the budgets only concern request handling.
+    return TestClient(app)
+
+
+@pytest.fixture
+def user():
+    db = sessionmaker(bind=engine)()
+    try:
+        db_user = crud.create_user(db, schemas.UserCreate(username="budget", password="password1"))
+        for n in range(5):
+            crud.create_user_post(db, schemas.PostCreate(title=f"t{n}", content="c"), db_user.id)
+        return db_user.username
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize(
+    "path",
+    ["/users/me", "/posts/", "/posts/?after_id=2", "/posts/1"],
+)
+def test_endpoints_stay_within_query_budget(client, user, path):
+    client.cookies.set("access_token", create_access_token({"sub": user}))
+    with query_monitor.capture() as requests:
+        assert client.get(path).status_code == 200
+    (result,) = requests
+    assert result.budget == ENDPOINT_BUDGETS[result.endpoint]
+    assert result.count <= result.budget, [q.statement for q in result.recorder.queries]
+    assert not result.recorder.repeated(2)
+
+
+def test_deep_offsets_are_refused_in_favor_of_the_cursor(client, user):
+    from app.config import get_settings
+
+    assert client.get("/posts/", params={"skip": get_settings().POSTS_MAX_SKIP + 1}).status_code == 422
+    assert client.get("/posts/", params={"limit": get_settings().POSTS_MAX_LIMIT + 1}).status_code == 422
+    assert client.get("/posts/", params={"limit": 0}).status_code == 422
+    assert [post["id"] for post in client.get("/posts/", params={"after_id": 3}).json()] == [4, 5]
+
+
+def test_repeated_statements_are_detected_with_locations(tmp_path):
+    test_engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    models.Base.metadata.create_all(bind=test_engine)
+    monitor = QueryMonitor(repeat_threshold=3)
+    monitor.install(test_engine)
+    db = sessionmaker(bind=test_engine)()
+    try:
+        owner = crud.create_user(db, schemas.UserCreate(username="nplus1", password="password1"))
+        post_ids = [crud.create_user_post(db, schemas.PostCreate(title="t", content="c"), owner.id).id for _ in range(4)]
+        db.expire_all()
+        with monitor.record(capture_stacks=True) as recorder:
+            for post_id in post_ids:
+                crud.get_post(db, post_id)
+        repeated = recorder.repeated(monitor.repeat_threshold)
+        assert list(repeated.values()) == [4]
+        assert any("crud.py" in frame for frame in recorder.queries[0].location)
+
+        # Outside a recording block nothing is collected.
+        crud.get_post(db, post_ids[0])
+        assert recorder.count == 4
+    finally:
+        db.close()
+
+
+def test_unrouted_paths_are_named_by_path_and_not_cached(client):
+    with query_monitor.capture() as results:
+        client.get("/no/such/path/1")
+        client.get("/no/such/path/2")
+    assert [result.endpoint for result in results] == ["GET /no/such/path/1", "GET /no/such/path/2"]
+    assert None not in query_monitor._endpoints
+
+
+def test_cached_post_is_served_without_queries(client, user):
+    first = client.get("/posts/1", headers={"Accept-Encoding": "gzip"})
+    with query_monitor.capture() as results:
+        second = client.get("/posts/1", headers={"Accept-Encoding": "gzip"})
+    assert second.content == first.content and second.headers["etag"] == first.headers["etag"]
+    assert results[0].count == 0
+    assert client.get("/posts/1", headers={"If-None-Match": first.headers["etag"]}).status_code == 304
@@ -0,0 +1,29 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, schemas
+from app.negotiation import post_payload
+
+
+def test_lean_rows_match_orm_payloads_without_tracking(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    for n in range(5):
+        crud.create_user_post(db, schemas.PostCreate(title=f"t{n}", content="c"), 1)
+    db.close()
+
+    db = factory()
+    try:
+        rows = crud.get_post_rows(db, skip=1, limit=3)
+        assert len(db.identity_map) == 0
+        assert [row._asdict() for row in rows] == [post_payload(p) for p in crud.get_posts(db, skip=1, limit=3)]
+        assert crud.get_post_row(db, rows[0].id)._asdict() == rows[0]._asdict()
+        assert crud.get_post_row(db, 999) is None
+    finally:
+        db.close()
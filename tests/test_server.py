@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("gunicorn")
+
+from unittest.mock import patch
+
+from app import server
+
+
+def test_resolve_workers_uses_cpu_count_when_auto():
+    with patch("app.server.available_cpus", return_value=6):
+        assert server.resolve_workers(0) == 6
+    assert server.resolve_workers(3) == 3
+
+
+def test_build_options_overrides_settings():
+    options = server.build_options(bind="127.0.0.1:9000", workers=2, preload=True)
+    assert options["bind"] == "127.0.0.1:9000"
+    assert options["workers"] == 2
+    assert options["preload_app"] is True
+    assert options["worker_class"] == server.WORKER_CLASS
+    assert options["post_fork"] is server.post_fork
+
+    app = server.Server(options)
+    assert app.cfg.workers == 2
+    assert app.cfg.preload_app is True
+
+
+def test_post_fork_resets_process_resources():
+    class Worker:
+        pid = 1234
+
+    with patch("app.database.engine.dispose") as dispose, patch(
+        "app.redis_client.reset_redis"
+    ) as reset_redis:
+        server.post_fork(None, Worker())
+    dispose.assert_called_once_with(close=False)
+    reset_redis.assert_called_once_with()
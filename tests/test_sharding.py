@@ -0,0 +1,126 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, database, models, schemas
+from app.sharding import HashRing, ShardSet, misplaced_owners, rebalance_user
+
+
+def make_shards(tmp_path, count, start=0):
+    engines = [create_engine(f"sqlite:///{tmp_path / f'shard{i}.db'}") for i in range(start, start + count)]
+    shards = ShardSet(engines)
+    shards.create_schema()
+    return shards
+
+
+def count_posts(engine, owner_id=None):
+    query = select(func.count()).select_from(models.Post.__table__)
+    if owner_id is not None:
+        query = query.where(models.Post.__table__.c.owner_id == owner_id)
+    with engine.connect() as conn:
+        return conn.execute(query).scalar()
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'primary.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def test_ring_moves_few_keys_when_a_shard_is_added():
+    before, after = HashRing(4), HashRing(5)
+    keys = range(10_000)
+    assert {before.shard_for(k) for k in keys} == {0, 1, 2, 3}
+    moved = sum(before.shard_for(k) != after.shard_for(k) for k in keys)
+    # Ideal is 1/5 of the keys; a naive modulo scheme would move ~4/5.
+    assert moved < 0.3 * len(keys)
+    assert all(after.shard_for(k) == 4 for k in keys if before.shard_for(k) != after.shard_for(k))
+
+
+def test_posts_are_routed_and_gathered_in_id_order(db, tmp_path, monkeypatch):
+    shards = make_shards(tmp_path, 3)
+    monkeypatch.setattr(database, "post_shards", shards)
+
+    created = []
+    for owner_id in range(1, 7):
+        for n in range(3):
+            post = crud.create_user_post(db, schemas.PostCreate(title=f"{owner_id}-{n}", content="c"), owner_id)
+            created.append(post.id)
+    assert created == sorted(created) and len(set(created)) == 18
+
+    for owner_id in range(1, 7):
+        assert count_posts(shards.engines[shards.shard_for(owner_id)], owner_id) == 3
+
+    page = crud.get_posts(db, skip=4, limit=5)
+    assert [p.id for p in page] == created[4:9]
+    assert crud.get_post(db, created[7]).title == "3-1"
+    assert [row.id for row in crud.get_post_rows(db, skip=4, limit=5)] == created[4:9]
+    assert crud.get_post_row(db, created[7]).title == "3-1"
+    assert [p.id for p in crud.get_posts(db, limit=5, after_id=created[3])] == created[4:9]
+    assert [row.id for row in crud.get_post_rows(db, limit=5, after_id=created[3])] == created[4:9]
+    assert [row.id for row in crud.get_post_rows(db, limit=5, after_id=created[-1])] == []
+
+    assert crud.delete_post(db, created[7])
+    assert crud.get_post(db, created[7]) is None
+    assert not crud.delete_post(db, created[7])
+
+
+def test_rebalance_moves_user_posts_to_new_ring_shard(db, tmp_path, monkeypatch):
+    old = make_shards(tmp_path, 2)
+    monkeypatch.setattr(database, "post_shards", old)
+    owners = range(1, 21)
+    for owner_id in owners:
+        for n in range(4):
+            post = crud.create_user_post(db, schemas.PostCreate(title=f"t{n}", content="c"), owner_id)
+            crud.create_attachment(db, post, filename="f", content_type="text/plain", size=1, sha256="0" * 64)
+
+    extra = make_shards(tmp_path, 1, start=2)
+    grown = ShardSet(old.engines + extra.engines)
+    monkeypatch.setattr(database, "post_shards", grown)
+    movers = [o for o in owners if grown.shard_for(o) == 2]
+    assert movers
+
+    for owner_id in owners:
+        rebalance_user(grown, owner_id, batch_size=3)
+
+    for owner_id in owners:
+        target = grown.shard_for(owner_id)
+        assert count_posts(grown.engines[target], owner_id) == 4
+    assert sum(count_posts(engine) for engine in grown.engines) == 80
+    assert len(crud.get_posts(db, limit=1000)) == 80
+    for post in crud.get_posts(db, limit=1000):
+        assert len(crud.get_attachments(db, post)) == 1
+
+
+def test_rebalance_moves_archived_posts(db, tmp_path, monkeypatch):
+    from datetime import datetime
+
+    from app import archive
+
+    old = make_shards(tmp_path, 2)
+    monkeypatch.setattr(database, "post_shards", old)
+    grown = ShardSet(old.engines + make_shards(tmp_path, 1, start=2).engines)
+    owner_id = next(o for o in range(1, 100) if grown.shard_for(o) == 2)
+    post_ids = [
+        crud.create_user_post(db, schemas.PostCreate(title=f"t{n}", content="c"), owner_id).id for n in range(3)
+    ]
+    for engine in old.engines:
+        archive.archive_posts(engine, datetime(2100, 1, 1))
+
+    monkeypatch.setattr(database, "post_shards", grown)
+    assert dict(misplaced_owners(grown)) == {owner_id: old.shard_for(owner_id)}
+    rebalance_user(grown, owner_id, batch_size=2)
+    assert list(misplaced_owners(grown)) == []
+
+    post = crud.get_post(db, post_ids[0])
+    crud.create_attachment(db, post, filename="f", content_type="text/plain", size=1, sha256="0" * 64)
+    assert count_posts(grown.engines[2], owner_id) == 1
+    assert crud.get_post_row(db, post_ids[1]).title == "t1"
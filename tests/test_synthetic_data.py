@@ -0,0 +1,98 @@
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy import create_engine, func, select
+
+from app import models, schemas
+from app.synthetic_data import DatasetSpec, Targets, generate, generate_posts
+
+
+def make_spec(**overrides):
+    values = dict(users=500, posts=3000, password_hash="hash", until=datetime(2026, 1, 1), chunk_size=700)
+    values.update(overrides)
+    return DatasetSpec(**values)
+
+
+def read_dir(path):
+    return {child.name: child.read_text() for child in sorted(path.iterdir())}
+
+
+def test_output_is_deterministic_across_worker_counts(tmp_path):
+    spec = make_spec()
+    (tmp_path / "one").mkdir()
+    (tmp_path / "two").mkdir()
+    assert generate(spec, Targets(ndjson=str(tmp_path / "one")), workers=1) == {"users": 500, "posts": 3000}
+    generate(spec, Targets(ndjson=str(tmp_path / "two")), workers=2)
+
+    files = read_dir(tmp_path / "one")
+    assert files == read_dir(tmp_path / "two")
+    assert sorted(files) == [f"posts-0000{i}.ndjson" for i in range(5)] + ["users-00000.ndjson"]
+    assert generate_posts(make_spec(seed=7), 0) != generate_posts(spec, 0)
+
+
+def test_posts_follow_zipf_and_schema_limits():
+    spec = make_spec(posts=20_000, chunk_size=20_000)
+    posts = generate_posts(spec, 0)
+
+    per_owner = Counter(post["owner_id"] for post in posts).most_common()
+    assert per_owner[0][1] > 10 * per_owner[len(per_owner) // 2][1]
+    assert per_owner[0][0] != 1  # heavy posters are scattered over the ids
+    for post in posts:
+        schemas.PostCreate(title=post["title"], content=post["content"])
+    lengths = sorted(len(post["content"]) for post in posts)
+    assert 100 < lengths[len(lengths) // 2] < 300
+    assert posts[0]["created_at"] < posts[-1]["created_at"] <= spec.until
+
+
+def test_bulk_insert_into_database(tmp_path):
+    url = f"sqlite:///{tmp_path / 'synthetic.db'}"
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+
+    generate(make_spec(), Targets(primary=url, in_worker=False), workers=2)
+
+    with engine.connect() as conn:
+        assert conn.execute(select(func.count()).select_from(models.User.__table__)).scalar() == 500
+        assert conn.execute(select(func.max(models.Post.__table__.c.id))).scalar() == 3000
+
+
+def test_sharded_load_moves_the_post_id_ticket_past_generated_ids(tmp_path):
+    from sqlalchemy.orm import Session
+
+    from app import crud
+
+    primary = f"sqlite:///{tmp_path / 'primary.db'}"
+    shards = tuple(f"sqlite:///{tmp_path / f'shard{i}.db'}" for i in range(2))
+    models.Base.metadata.create_all(bind=create_engine(primary))
+    for url in shards:
+        models.Base.metadata.create_all(bind=create_engine(url))
+
+    generate(make_spec(), Targets(primary=primary, shards=shards, in_worker=False))
+
+    with Session(create_engine(primary)) as db:
+        assert crud._allocate_id(db) == 3001
+
+
+def test_pooled_connections_are_not_inherited_by_workers(tmp_path, monkeypatch):
+    from app import synthetic_data
+
+    url = f"sqlite:///{tmp_path / 'app.db'}"
+    models.Base.metadata.create_all(bind=create_engine(url))
+    engine = synthetic_data._engine(url)
+    with engine.connect():
+        pass
+    forked_with = []
+
+    real_pool = synthetic_data.Pool
+
+    def recording_pool(*args, **kwargs):
+        forked_with.append((dict(synthetic_data._engines), engine.pool.checkedin()))
+        return real_pool(*args, **kwargs)
+
+    monkeypatch.setattr(synthetic_data, "Pool", recording_pool)
+    generate(make_spec(), Targets(primary=url, in_worker=False), workers=2)
+    assert forked_with == [({}, 0)]
@@ -0,0 +1,133 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("sqlalchemy")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import broker, models
+from app.bloom import BloomFilter
+from app.broker import InMemoryBroker
+from app.usernames import UsernameIndex
+
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add_all(models.User(username=f"user{i}", hashed_password="x") for i in range(500))
+    db.commit()
+    db.close()
+    return factory
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    bloom = BloomFilter(10_000, 0.01)
+    bloom.update(f"member{i}" for i in range(10_000))
+    assert all(f"member{i}" in bloom for i in range(10_000))
+    false_positives = sum(f"other{i}" in bloom for i in range(20_000))
+    assert false_positives / 20_000 < 0.02
+    # About 9.6 bits per item at 1%.
+    assert 11_000 < bloom.stats()["bytes"] < 13_000
+
+
+def test_available_names_skip_the_database(session_factory):
+    index = UsernameIndex(session_factory, capacity=1000, error_rate=0.001)
+    db = session_factory()
+    try:
+        assert index.is_available(db, "newname")
+        assert index.db_checks == 1  # not built yet: exact check
+
+        index.rebuild()
+        assert not index.is_available(db, "user42")
+        assert all(index.is_available(db, f"free{i}") for i in range(200))
+        assert index.filtered >= 195
+        assert index.stats()["filter"]["items"] == 500
+    finally:
+        db.close()
+
+
+def test_new_names_reach_every_worker(session_factory, monkeypatch):
+    # record_new_user publishes through the process broker.
+    monkeypatch.setattr(broker, "_broker", InMemoryBroker())
+    monkeypatch.setattr(broker, "_publish_suspended_until", 0.0)
+
+    async def scenario():
+        workers = [UsernameIndex(session_factory, capacity=1000) for _ in range(2)]
+        for worker in workers:
+            await worker.start()
+        workers[0].record_new_user("fresh")
+        for _ in range(5):
+            await asyncio.sleep(0)
+        results = [worker._filter.might_contain("fresh") for worker in workers]
+        for worker in workers:
+            await worker.stop()
+        return results
+
+    assert asyncio.run(scenario()) == [True, True]
+
+
+def test_overlapping_rebuilds_keep_names_added_meanwhile(session_factory):
+    import threading
+    import time
+
+    index = UsernameIndex(session_factory, capacity=1000)
+    scanning = threading.Event()
+    resume = threading.Event()
+
+    def slow_factory():
+        session = session_factory()
+        if not scanning.is_set():
+            scanning.set()
+            resume.wait(5)
+        return session
+
+    index.session_factory = slow_factory
+    first = threading.Thread(target=index.rebuild)
+    second = threading.Thread(target=index.rebuild)
+    first.start()
+    scanning.wait(5)
+    second.start()
+    while len(index._pending) < 2:  # the second rebuild is queued behind the first
+        time.sleep(0.001)
+    index.add("during-first")
+    resume.set()
+    first.join(5)
+    second.join(5)
+    index.add("after-both")
+
+    assert index.rebuilds == 2
+    assert "during-first" in index._filter and "after-both" in index._filter
+
+
+def test_names_whose_publish_was_lost_are_picked_up_by_the_count_check(session_factory, monkeypatch):
+    memory = InMemoryBroker()
+    monkeypatch.setattr(broker, "_broker", memory)
+    monkeypatch.setattr(broker, "_publish_suspended_until", 0.0)
+
+    async def scenario():
+        worker = UsernameIndex(session_factory, capacity=1000, check_interval=0.01, broker=memory)
+        await worker.start()
+        worker.record_new_user("user0")  # a duplicate echo must not count twice
+        # Created on another worker whose publish failed: no message, no gap.
+        db = session_factory()
+        db.add(models.User(username="unannounced", hashed_password="x"))
+        db.commit()
+        db.close()
+        assert not worker._filter.might_contain("unannounced")
+        for _ in range(100):
+            if worker._filter.might_contain("unannounced"):
+                break
+            await asyncio.sleep(0.01)
+        rebuilds = worker.rebuilds
+        await asyncio.sleep(0.05)
+        await worker.stop()
+        return worker._filter.might_contain("unannounced"), worker.rebuilds - rebuilds, worker.missing_names()
+
+    found, later_rebuilds, missing = asyncio.run(scenario())
+    assert found
+    assert (later_rebuilds, missing) == (0, 0)
@@ -28,3 +28,109 @@ def test_fetch_json():
     with patch("app.utils.api_helpers.httpx.Client.request", return_value=mock_response):
         data = fetch_json("http://example.com")
         assert data == {"ok": True}
+
+
+@pytest.mark.skipif(fetch_json is None, reason="httpx not installed")
+def test_client_manager_reuses_pool_and_retries():
+    from app.utils import HTTPClientManager
+
+    calls = []
+
+    def handler(request):
+        calls.append(request.url.path)
+        if len(calls) == 1 or request.method == "POST":
+            return httpx.Response(503)
+        return httpx.Response(200, json={"path": request.url.path})
+
+    manager = HTTPClientManager(transport=httpx.MockTransport(handler), backoff=0)
+    first = manager.client()
+    assert manager.request("GET", "http://example.com/a").json() == {"path": "/a"}
+    assert manager.client() is first
+    assert calls == ["/a", "/a"]
+
+    # Non-idempotent requests are not retried.
+    calls.clear()
+    assert manager.request("POST", "http://example.com/b").status_code == 503
+    assert calls == ["/b"]
+    manager.close()
+    assert first.is_closed
+
+
+@pytest.mark.skipif(fetch_json is None, reason="httpx not installed")
+def test_fetch_many_caps_concurrency_and_keeps_order():
+    import asyncio
+    from app.utils import HTTPClientManager, fetch_many
+
+    active = {"now": 0, "max": 0}
+
+    async def handler(request):
+        active["now"] += 1
+        active["max"] = max(active["max"], active["now"])
+        await asyncio.sleep(0.01)
+        active["now"] -= 1
+        return httpx.Response(200, json={"n": int(request.url.path.strip("/"))})
+
+    manager = HTTPClientManager(async_transport=httpx.MockTransport(handler))
+    urls = [f"http://example.com/{i}" for i in range(8)]
+
+    async def run():
+        with patch("app.utils.api_helpers.http_clients", manager):
+            try:
+                return await fetch_many(urls, concurrency=3)
+            finally:
+                await manager.aclose()
+
+    results = asyncio.run(run())
+    assert results == [{"n": i} for i in range(8)]
+    assert active["max"] == 3
+
+
+@pytest.mark.skipif(fetch_json is None, reason="httpx not installed")
+def test_async_clients_are_kept_per_event_loop():
+    import asyncio
+    import threading
+    from app.utils import HTTPClientManager
+
+    manager = HTTPClientManager(async_transport=httpx.MockTransport(lambda request: httpx.Response(200)))
+
+    async def first_use():
+        return manager.async_client()
+
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever)
+    thread.start()
+    try:
+        other = asyncio.run_coroutine_threadsafe(first_use(), other_loop).result()
+
+        async def run():
+            client = manager.async_client()
+            assert manager.async_client() is client
+            assert client is not other and not other.is_closed
+            await manager.aclose()
+            return client
+
+        client = asyncio.run(run())
+        assert client.is_closed
+        # The other loop's pool is closed on that loop.
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.01), other_loop).result()
+        assert other.is_closed
+    finally:
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join()
+        other_loop.close()
+
+    stale = asyncio.run(first_use())
+    # The loop of ``stale`` is closed now: a new loop gets a new pool, and
+    # the old pool is dropped with its loop.
+    assert asyncio.run(first_use()) is not stale
+    assert len(manager._async_clients) <= 1
+
+
+def test_shared_clients_follow_settings():
+    from app.config import get_settings
+    from app.utils import http_clients
+
+    settings = get_settings()
+    assert http_clients.timeout == settings.HTTP_TIMEOUT
+    assert http_clients.max_connections == settings.HTTP_MAX_CONNECTIONS
+    assert http_clients.retries == settings.HTTP_RETRIES
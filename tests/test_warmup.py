@@ -0,0 +1,75 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from app import warmup
+from app.warmup import WarmupState, run_warmup
+
+
+def test_ready_once_required_steps_pass(monkeypatch):
+    async def no_redis():
+        raise ConnectionError("redis down")
+
+    monkeypatch.setattr(warmup, "warm_redis", no_redis)
+    state = WarmupState()
+    asyncio.run(run_warmup(state, db_connections=2, retry_seconds=0))
+
+    assert state.ready
+    assert state.report()["status"] == "ready"
+    assert state.steps["database"]["ok"]
+    assert state.steps["password_hash"]["ok"] and state.steps["serializers"]["ok"]
+    assert state.steps["redis"] == {"ok": False, "error": "redis down"}
+
+
+def test_database_failure_keeps_worker_not_ready_and_retries(monkeypatch):
+    attempts = []
+
+    def flaky_database(count):
+        attempts.append(count)
+        if len(attempts) < 3:
+            raise OSError("connection refused")
+
+    monkeypatch.setattr(warmup, "warm_database", flaky_database)
+    monkeypatch.setattr(warmup, "warm_password_hash", lambda: None)
+    state = WarmupState()
+
+    async def scenario():
+        task = asyncio.create_task(run_warmup(state, db_connections=3, retry_seconds=0.01))
+        await asyncio.sleep(0)
+        assert not state.ready
+        await asyncio.wait_for(task, 1)
+
+    asyncio.run(scenario())
+    assert state.ready
+    assert attempts == [3, 3, 3]
+    assert state.attempts == 3
+
+
+def test_unreachable_redis_times_out_and_does_not_delay_readiness(monkeypatch):
+    async def hanging_redis():
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(warmup, "warm_redis", hanging_redis)
+    monkeypatch.setattr(warmup, "warm_password_hash", lambda: None)
+    state = WarmupState()
+
+    async def scenario():
+        task = asyncio.create_task(run_warmup(state, db_connections=1, retry_seconds=0, step_timeout=0.05))
+        while not state.ready:
+            await asyncio.sleep(0.001)
+        # Ready while the Redis ping is still pending.
+        assert "redis" not in state.steps
+        await asyncio.wait_for(task, 1)
+
+    asyncio.run(scenario())
+    assert state.steps["redis"] == {"ok": False, "error": "timed out after 0.05s"}
+
+
+def test_health_checks_run_on_the_event_loop():
+    from app import main
+
+    # Not queued behind a saturated threadpool.
+    assert asyncio.iscoroutinefunction(main.livez)
+    assert asyncio.iscoroutinefunction(main.readyz)